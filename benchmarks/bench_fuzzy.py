@@ -0,0 +1,30 @@
+"""
+Micro-benchmark: FuzzyIndex lookup time as the corrections table grows.
+
+    python -m benchmarks.bench_fuzzy [-n LOOKUPS]
+"""
+import argparse
+import random
+import timeit
+
+from migrator.fuzzy import FuzzyIndex
+
+LETTERS = "aeioubdgkmnprstvy"
+
+def word(rng, low=5, high=14):
+    return "".join(rng.choice(LETTERS) for _ in range(rng.randint(low, high)))
+
+def main():
+    argpar = argparse.ArgumentParser(description="Benchmark fuzzy correction lookups.")
+    argpar.add_argument('-n', '--number', type=int, default=1000, help='Lookups per table size')
+    args = argpar.parse_args()
+
+    rng = random.Random(1)
+    queries = [word(rng) for _ in range(args.number)]
+    for size in (100, 1000, 5000, 20000):
+        index = FuzzyIndex((word(rng), "v{}".format(i)) for i in range(size))
+        elapsed = timeit.timeit(lambda: [index.lookup(q) for q in queries], number=1)
+        print("{:>6} entries: {:8.1f} us/lookup".format(size, elapsed / args.number * 1e6))
+
+if __name__ == '__main__':
+    main()
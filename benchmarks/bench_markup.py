@@ -0,0 +1,49 @@
+"""
+Micro-benchmark: precompiled single-pass markup rewriters vs. the old
+replace_sup() + chained str.replace() path.
+
+    python -m benchmarks.bench_markup [-n NUMBER]
+"""
+import argparse
+import timeit
+
+import migrator.parser as wikiparser
+
+
+def chained_sahityam(text):
+    return wikiparser.replace_sup(text).replace('\n', '   \n')
+
+def chained_words(text):
+    text = wikiparser.replace_sup(text)
+    return text.replace('((', '![').replace('))', ')').replace(' "', '](means "').replace('\n', '   \n') if text else ""
+
+def chained_prose(text):
+    return text.replace('<sup>', '{{<sup ').replace('</sup>', '>}}').replace('**', '  * ') \
+        .replace('<lipi>', '{{<lipi>}}').replace('</lipi>', '{{</lipi>}}').replace('\\t', ' ')
+
+def sample():
+    song = wikiparser.parse_song(wikiparser.data_song)
+    stanzas = [s for sec in song.lyrics_area.sections for s in sec.stanza_list.stanzas]
+    prose = [p for sec in song.prose_area.sections for p in sec.content]
+    return [s.sahityam for s in stanzas], [s.words for s in stanzas], prose
+
+def bench(name, old, new, texts, number):
+    for text in texts:
+        assert old(text) == new(text), "Rewriters disagree on {!r}".format(text)
+    t_old = timeit.timeit(lambda: [old(t) for t in texts], number=number)
+    t_new = timeit.timeit(lambda: [new(t) for t in texts], number=number)
+    print("{:<10} old {:8.2f} us  new {:8.2f} us  speedup {:6.1f}x".format(
+        name, t_old / number * 1e6, t_new / number * 1e6, t_old / t_new))
+
+def main():
+    argpar = argparse.ArgumentParser(description="Benchmark the stanza/prose markup rewriters.")
+    argpar.add_argument('-n', '--number', type=int, default=1000, help='Iterations per measurement')
+    args = argpar.parse_args()
+
+    sahityam, words, prose = sample()
+    bench("sahityam", chained_sahityam, wikiparser.rewrite_sahityam, sahityam, args.number)
+    bench("words", chained_words, wikiparser.rewrite_words, words, args.number)
+    bench("prose", chained_prose, wikiparser.rewrite_prose, prose, args.number)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Per-song memory footprint of a parsed corpus held in memory: the parser's
+objects (either engine) against the compact migrator.model songs.
+
+    python -m benchmarks.bench_memory [-n SONGS] [--sections N ...]
+
+Footprints are what tracemalloc still sees allocated once the whole corpus
+is parsed and kept, divided by the number of songs; the wiki texts themselves
+are allocated beforehand and not counted.
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+import migrator.model as model
+import migrator.parser as wikiparser
+from benchmarks.corpus import add_shape_arguments, make_corpus, shape
+
+
+def parsed(corpus, engine):
+    songs = []
+    for filename, text in corpus:
+        song = wikiparser.parse_song(text, engine)
+        song.set_old_filename(filename)
+        songs.append(song)
+    return songs
+
+
+def compacted(corpus, engine):
+    songs = []
+    for filename, text in corpus:
+        song = model.parse_song(text, engine)
+        song.set_old_filename(filename)
+        songs.append(song)
+    return songs
+
+
+def footprint(build, corpus, engine):
+    """(bytes kept per song, seconds to build the corpus)."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    songs = build(corpus, engine)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    kept, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del songs
+    return kept / len(corpus), elapsed
+
+
+def main():
+    argpar = argparse.ArgumentParser(description="Benchmark the memory footprint of parsed songs.")
+    argpar.add_argument('-n', '--number', type=int, default=500, help='Songs in the corpus (default 500)')
+    argpar.add_argument('--seed', type=int, default=1)
+    argpar.add_argument('-e', '--engine', choices=wikiparser.ENGINES, default="scanner", help='Parser engine (default scanner)')
+    add_shape_arguments(argpar)
+    args = argpar.parse_args()
+
+    corpus = make_corpus(args.number, args.seed, **shape(args))
+    text_size = sum(len(text) for _, text in corpus) / len(corpus)
+    print("{} songs, {:.1f} KiB of wikitext per song".format(len(corpus), text_size / 1024))
+    before, before_time = footprint(parsed, corpus, args.engine)
+    after, after_time = footprint(compacted, corpus, args.engine)
+    print("{:<16} {:>10.1f} KiB/song {:>10.1f} songs/s".format("parser objects", before / 1024, len(corpus) / before_time))
+    print("{:<16} {:>10.1f} KiB/song {:>10.1f} songs/s  ({:.0%} of the memory)".format(
+        "compact model", after / 1024, len(corpus) / after_time, after / before))
+
+if __name__ == '__main__':
+    main()
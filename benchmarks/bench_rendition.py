@@ -0,0 +1,81 @@
+"""
+Load test of the rendition manager against the replay backend: songs/sec
+with and without --prefetch, for a given search latency and error rate.
+No network or API quota is used; the operator always picks the first video.
+
+    python -m benchmarks.bench_rendition [-n SONGS] [--latency MS] [--error-rate RATE]
+"""
+import argparse
+import builtins
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import rendition.manager as manager
+import rendition.youtube as youtube
+from migrator.output import OutputStats
+from rendition.backends import ReplayBackend
+
+SONG = """---
+title: "song {idx}"
+rAga: bEgaDa
+---
+
+## Sahityam
+
+song {idx} sahityam
+
+## Commentary
+
+Notes.
+
+## Renditions
+"""
+
+class Songs:
+    def __init__(self):
+        self.names = []
+
+    def __contains__(self, song):
+        return False
+
+    def append(self, song, **details):
+        self.names.append(song)
+
+def run(songs, prefetch, args):
+    backend = ReplayBackend(latency=args.latency / 1000, error_rate=args.error_rate, seed=1)
+    client = youtube.YouTubeClient("", backend=backend, backoff=0.01)
+    completed, failed = Songs(), Songs()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        manager.process(songs, completed, failed, client, OutputStats(), prefetch)
+    elapsed = time.perf_counter() - start
+    print("prefetch {:>2}: {:7.1f} songs/s, {} completed, {} failed, {} retried; {}".format(
+        prefetch, len(songs) / elapsed, len(completed.names), len(failed.names), client.retried, client.report()))
+
+def main():
+    argpar = argparse.ArgumentParser(description="Load-test the rendition manager offline.")
+    argpar.add_argument('-n', '--number', type=int, default=100, help='Songs in the queue')
+    argpar.add_argument('--latency', type=float, default=100, metavar='MS', help='Search latency (default 100)')
+    argpar.add_argument('--error-rate', type=float, default=0.05, help='Fraction of failing searches (default 0.05)')
+    args = argpar.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "input"))
+        os.makedirs(os.path.join(tmp, "output"))
+        songs = []
+        for idx in range(args.number):
+            name = "song-{}.md".format(idx)
+            with open(os.path.join(tmp, "input", name), "w") as f:
+                f.write(SONG.format(idx=idx))
+            songs.append(name)
+        manager.PATH_INPUT = os.path.join(tmp, "input") + "/"
+        manager.PATH_CONVERTED = os.path.join(tmp, "output")
+        builtins.input = lambda prompt: "0"
+        for prefetch in (0, 2, 8):
+            run(songs, prefetch, args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Micro-benchmark: transliteration throughput over the sahityam lines of a
+synthetic corpus (see benchmarks.corpus), from HK to every other scheme and
+back, and the compiled trie against a plain longest-match dictionary lookup.
+"uncached" converts every word; "cached" is the steady state of a run, with
+the words already seen remembered (the synthetic corpus has a far smaller
+vocabulary than the wiki, so the real hit rate is lower).
+
+    python -m benchmarks.bench_translit [-n SONGS] [-r REPEAT]
+"""
+import argparse
+import timeit
+
+import migrator.parser as wikiparser
+from benchmarks.corpus import make_corpus
+from migrator.translit import SCHEMES, OTHER, re_sup_marker, transliterate, transliterator
+
+
+def sahityam_lines(songs):
+    lines = []
+    for _, text in make_corpus(songs):
+        song = wikiparser.parse_song(text, "scanner")
+        for section in song.lyrics_area.sections:
+            for stanza in section.stanza_list.stanzas:
+                lines += re_sup_marker.sub("", stanza.sahityam).splitlines()
+    return lines
+
+
+def dictionary_read(text, letters, longest):
+    """What the trie replaces: try every length from the longest letter down, at every position."""
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        for size in range(min(longest, len(text) - pos), 0, -1):
+            found = text[pos:pos + size]
+            if found in letters:
+                tokens.append(letters[found])
+                break
+        else:
+            tokens.append((OTHER, text[pos]))
+            size = 1
+        pos += size
+    return tokens
+
+
+def rate(fn, lines, repeat):
+    """Characters per second."""
+    elapsed = min(timeit.repeat(lambda: [fn(line) for line in lines], number=1, repeat=repeat))
+    return sum(len(line) for line in lines) / elapsed
+
+
+def main():
+    argpar = argparse.ArgumentParser(description="Benchmark transliteration throughput.")
+    argpar.add_argument('-n', '--number', type=int, default=200, help='Songs in the corpus (default 200)')
+    argpar.add_argument('-r', '--repeat', type=int, default=3, help='Timed runs; the best counts (default 3)')
+    args = argpar.parse_args()
+
+    lines = sahityam_lines(args.number)
+    words = [word for line in lines for word in line.split()]
+    print("{} sahityam lines, {} characters, {} words ({} distinct)".format(
+        len(lines), sum(len(line) for line in lines), len(words), len(set(words))))
+    print("{:<22} {:>16} {:>16}".format("conversion", "uncached chars/s", "cached chars/s"))
+    for target in SCHEMES:
+        if target == "hk":
+            continue
+        converted = [transliterate(line, "hk", target) for line in lines]
+        for label, source, texts in (("hk -> " + target, "hk", lines), (target + " -> hk", target, converted)):
+            convert = transliterator(source, "hk" if source != "hk" else target)
+            uncached = rate(convert.convert, texts, args.repeat)
+            cached = rate(convert, texts, args.repeat)
+            print("{:<22} {:>16.0f} {:>16.0f}".format(label, uncached, cached))
+
+    hk = transliterator("hk", "telugu")
+    letters = SCHEMES["hk"].letters()
+    longest = max(len(text) for text in letters)
+    print()
+    for label, read in (("read hk (trie)", lambda line: list(hk.read(line))),
+                        ("read hk (dictionary)", lambda line: dictionary_read(line, letters, longest))):
+        per_char = rate(read, lines, args.repeat)
+        print("{:<22} {:>16.0f}".format(label, per_char))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Synthetic song corpus for the benchmarks: wiki songs in the format of
+migrator.parser.data_song, built from the words, glosses and meanings of the
+data_song and data_combined fixtures, in whatever size and shape is asked for.
+
+    python -m benchmarks.corpus -n 50 --out /tmp/songs
+"""
+import argparse
+import os
+import random
+import re
+
+import migrator.parser as wikiparser
+
+re_gloss = re.compile(r'\(\(([^ "()]+) "([^"]+)"\)\)')
+re_word = re.compile(r"[A-Za-z]{3,}")
+re_stanza_parts = re.compile(r"<stanza>\n(.*?)\n-details-\n.*?\n-meaning-\n(.*?)\n</stanza>", re.S)
+
+SECTIONS = ["Pallavi", "Anupallavi", "Charanam"]
+RAGAS = ["Begada", "Todi", "Kalyani", "Sri Ranjani", "Kambhoji", "Saveri"]
+TALAS = ["Adi", "Rupakam", "Chapu"]
+COMPOSERS = ["Tyagaraja", "Dikshitar", "Syama Sastri"]
+LANGUAGES = ["Telugu", "Sanskrit", "Tamil"]
+FORMATS = ["Kriti", "Kirtana", "Divyanama Kirtana"]
+
+
+class Vocabulary:
+    """Sahityam words, glosses and meaning sentences harvested from the fixtures."""
+
+    def __init__(self, templates=(wikiparser.data_song, wikiparser.data_combined)):
+        self.words = []
+        self.glosses = []
+        self.sentences = []
+        for text in templates:
+            self.glosses += re_gloss.findall(text)
+            for sahityam, meaning in re_stanza_parts.findall(text):
+                self.words += re_word.findall(re.sub(r"<sup>\d+</sup>", "", sahityam))
+                self.sentences += [s.strip() for s in meaning.splitlines() if s.strip()]
+
+
+def make_stanza(rng, vocabulary, lines, sups, glosses, footnote):
+    sahityam = [" ".join(rng.choice(vocabulary.words) for _ in range(4)) for _ in range(lines)]
+    details = [" ".join(rng.choice(vocabulary.words) for _ in range(2)) for _ in range(lines)]
+    for idx in range(glosses):
+        word, meaning = rng.choice(vocabulary.glosses)
+        details[idx % lines] += ' (({} "{}"))'.format(word, meaning)
+    for idx in range(sups):
+        sup = "<sup>{}</sup>".format(footnote + idx)
+        sahityam[idx % lines] += sup
+        details[idx % lines] += sup
+    meaning = "\n".join(rng.choice(vocabulary.sentences) for _ in range(max(1, lines // 2)))
+    return "<stanza>\n{}\n-details-\n{}\n-meaning-\n{}\n</stanza>\n".format(
+        "\n".join(sahityam), "\n".join(details), meaning)
+
+
+def make_song(rng, vocabulary, sections=3, stanzas=1, lines=4, sups=1, glosses=4, categories=5):
+    """One wiki song. The parser needs at least one stanza in the first section and five categories."""
+    lyrics = []
+    footnote = 1
+    for idx in range(sections):
+        name = SECTIONS[idx] if idx < len(SECTIONS) else "Charanam {}".format(idx - len(SECTIONS) + 2)
+        body = ""
+        for _ in range(stanzas):
+            body += make_stanza(rng, vocabulary, lines, sups, glosses, footnote)
+            footnote += sups
+        lyrics.append("==={}===\n{}".format(name, body))
+
+    variations = "".join("* <sup>{}</sup><lipi>{} – {}</lipi>\n".format(
+        n, rng.choice(vocabulary.words), rng.choice(vocabulary.words)) for n in range(1, footnote))
+    commentary = "* <lipi>{}</lipi> - {}\n".format(rng.choice(vocabulary.words), rng.choice(vocabulary.sentences))
+    prose = "==Variations==\n{}==Commentary==\n{}==Renditions==\n\n".format(variations, commentary)
+
+    values = [rng.choice(RAGAS), rng.choice(TALAS), rng.choice(COMPOSERS), rng.choice(LANGUAGES), rng.choice(FORMATS)]
+    values += ["Extra {}".format(n) for n in range(1, categories - 4)]
+    footer = "".join("[[Category:{}]]\n".format(v) for v in values[:categories])
+    return "\n==Lyrics==\n{}\n{}{}__NOTOC__\n".format("\n".join(lyrics), prose, footer)
+
+
+def make_corpus(number, seed=1, **shape):
+    """[(filename, wikitext)] of number songs; shape is passed on to make_song."""
+    rng = random.Random(seed)
+    vocabulary = Vocabulary()
+    corpus = []
+    for idx in range(number):
+        text = make_song(rng, vocabulary, **shape)
+        corpus.append(("{}_{}.txt".format(rng.choice(vocabulary.words), idx), text))
+    return corpus
+
+
+def add_shape_arguments(argpar):
+    argpar.add_argument('--sections', type=int, default=3, help='Lyric sections per song (default 3)')
+    argpar.add_argument('--stanzas', type=int, default=1, help='Stanzas per section (default 1)')
+    argpar.add_argument('--lines', type=int, default=4, help='Lines per stanza (default 4)')
+    argpar.add_argument('--sups', type=int, default=1, help='<sup> footnotes per stanza (default 1)')
+    argpar.add_argument('--glosses', type=int, default=4, help='((word "meaning")) glosses per stanza (default 4)')
+    argpar.add_argument('--categories', type=int, default=5, help='Categories per song, at least 5 (default 5)')
+
+
+def shape(args):
+    return {k: getattr(args, k) for k in ("sections", "stanzas", "lines", "sups", "glosses", "categories")}
+
+
+def main():
+    argpar = argparse.ArgumentParser(description="Write a synthetic song corpus.")
+    argpar.add_argument('-n', '--number', type=int, default=100, help='Songs to generate')
+    argpar.add_argument('--seed', type=int, default=1)
+    argpar.add_argument('--out', required=True, help='Directory to write the songs to')
+    add_shape_arguments(argpar)
+    args = argpar.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for filename, text in make_corpus(args.number, args.seed, **shape(args)):
+        with open(os.path.join(args.out, filename), "w") as f:
+            f.write(text)
+
+if __name__ == '__main__':
+    main()
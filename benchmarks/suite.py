@@ -0,0 +1,149 @@
+"""
+Throughput benchmarks of the parsers and renderers over a synthetic corpus
+(see benchmarks.corpus), with songs/sec and peak traced memory per stage,
+compared against the stored baselines in benchmarks/baselines.json.
+
+    python -m benchmarks.suite [-n SONGS] [--sections N ...] [--save] [--check]
+
+Each stage is timed as the best of --repeat runs over the whole corpus, and
+run once more under tracemalloc for its peak memory. Baselines only compare
+when the corpus (size, seed and shape) is the same, and are only meaningful
+on the machine that saved them.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import migrator.parser as wikiparser
+import rendition.parser as renditionparser
+from benchmarks.corpus import add_shape_arguments, make_corpus, shape
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+
+def stages(corpus, pages):
+    """(name, setup, run) per stage: run(setup()) is what gets timed."""
+    parsed = [wikiparser.parse_song(text, "scanner") for _, text in corpus]
+    for (filename, _), song in zip(corpus, parsed):
+        song.set_old_filename(filename)
+    scripted = [wikiparser.parse_song(text, "scanner") for _, text in corpus]
+    for (filename, _), song in zip(corpus, scripted):
+        song.set_old_filename(filename)
+        song.set_scripts(["telugu", "devanagari", "tamil"])
+    markup = [t for song in parsed for sec in song.lyrics_area.sections
+              for s in sec.stanza_list.stanzas for t in (s.sahityam, s.words)]
+
+    def nothing():
+        return None
+
+    return [
+        ("song.parse_string", nothing, lambda _: [wikiparser.song.parse_string(text) for _, text in corpus]),
+        ("scanner.parse_song", nothing, lambda _: [wikiparser.parse_song(text, "scanner") for _, text in corpus]),
+        ("Song.to_new", lambda: parsed, lambda songs: [song.to_new() for song in songs]),
+        ("Song.to_new (3 scripts)", lambda: scripted, lambda songs: [song.to_new() for song in songs]),
+        ("replace_sup", nothing, lambda _: [wikiparser.replace_sup(text) for text in markup]),
+    ] + [
+        ("rendition.parse ({})".format(engine), nothing,
+         lambda _, engine=engine: [renditionparser.parse(p, engine)[0].renditions for p in pages])
+        for engine in ("pyparsing", "splitter")
+    ]
+
+
+def measure(setup, run, repeat):
+    best = None
+    for _ in range(repeat):
+        prepared = setup()
+        start = time.perf_counter()
+        run(prepared)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    prepared = setup()
+    tracemalloc.start()
+    run(prepared)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def write_pages(corpus, directory):
+    """The rendition pages the migrator would make of the corpus, as files."""
+    pages = []
+    for filename, text in corpus:
+        song = wikiparser.parse_song(text, "scanner")
+        song.set_old_filename(filename)
+        song.set_date("2024-01-01")
+        path = os.path.join(directory, song.new_file + ".md")
+        with open(path, "w") as f:
+            f.write(song.to_new())
+        pages.append(path)
+    return pages
+
+
+def load_baselines(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def main():
+    argpar = argparse.ArgumentParser(description="Benchmark parsing and rendering throughput.")
+    argpar.add_argument('-n', '--number', type=int, default=100, help='Songs in the corpus (default 100)')
+    argpar.add_argument('--seed', type=int, default=1)
+    argpar.add_argument('-r', '--repeat', type=int, default=3, help='Timed runs per stage; the best counts (default 3)')
+    argpar.add_argument('--baselines', default=BASELINES, help='Baselines file (default benchmarks/baselines.json)')
+    argpar.add_argument('--save', action='store_true', help='Store these results as the baselines for this corpus')
+    argpar.add_argument('--check', action='store_true', help='Exit with 1 when a stage is slower than its baseline by more than --tolerance')
+    argpar.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown for --check (default 0.25)')
+    argpar.add_argument('--only', help='Run only stages whose name contains this')
+    add_shape_arguments(argpar)
+    args = argpar.parse_args()
+
+    corpus = make_corpus(args.number, args.seed, **shape(args))
+    corpus_key = "n={} seed={} {}".format(args.number, args.seed, " ".join(
+        "{}={}".format(k, v) for k, v in sorted(shape(args).items())))
+    baselines = load_baselines(args.baselines)
+    baseline = baselines.get(corpus_key, {})
+    if not baseline:
+        print("No baseline for this corpus ({})".format(corpus_key))
+
+    results = {}
+    regressions = []
+    with tempfile.TemporaryDirectory() as directory:
+        pages = write_pages(corpus, directory)
+        print("{:<28} {:>12} {:>11} {:>12} {:>8}".format("stage", "songs/s", "peak KiB", "baseline", "change"))
+        for name, setup, run in stages(corpus, pages):
+            if args.only and args.only not in name:
+                continue
+            elapsed, peak = measure(setup, run, args.repeat)
+            rate = len(corpus) / elapsed
+            results[name] = {"songs_per_sec": round(rate, 1), "peak_kib": round(peak / 1024)}
+            old = baseline.get(name)
+            if old:
+                change = rate / old["songs_per_sec"] - 1
+                if change < -args.tolerance:
+                    regressions.append(name)
+                print("{:<28} {:>12.1f} {:>11} {:>12.1f} {:>+7.0%}".format(
+                    name, rate, round(peak / 1024), old["songs_per_sec"], change))
+            else:
+                print("{:<28} {:>12.1f} {:>11}".format(name, rate, round(peak / 1024)))
+
+    if args.save:
+        baselines[corpus_key] = dict(baseline, **results)
+        with open(args.baselines, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("Saved baselines to {}".format(args.baselines))
+    if regressions:
+        print("Slower than baseline: {}".format(", ".join(regressions)))
+        if args.check:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+On-disk cache of parsed songs, so re-runs skip parsing wiki files that have not changed.
+
+Entries are pickled Song objects, as they come out of the parser (before
+set_old_filename or to_new touch them). An entry's name is the SHA-256 of the
+source text, and entries live under a directory per parser engine together
+with a STAMP file. The stamp hashes what decides the parsed objects: the
+grammar, the scanner, the constructors the grammar's parse actions build
+(their attribute layout) and the pyparsing version. When it no longer
+matches, the directory is emptied, so a grammar change invalidates everything
+without having to remember to bump a version, while changes to rendering
+(templates, rewriters, render/to_new) keep the cache. Size bounds and
+eviction are those of migrator.dircache.
+"""
+import hashlib
+import inspect
+import os
+import pickle
+
+import pyparsing
+
+import migrator.parser as wikiparser
+import migrator.scanner as scanner
+from migrator.dircache import DirectoryCache
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+# The classes the parse actions build; their constructors decide what a cached entry holds
+PARSED_CLASSES = (
+    wikiparser.Stanza, wikiparser.StanzaList, wikiparser.LyricSection, wikiparser.LyricSectionList,
+    wikiparser.ProseSection, wikiparser.ProseSectionList, wikiparser.CategoryList, wikiparser.Song,
+)
+
+
+def grammar_stamp(engine):
+    digest = hashlib.sha256()
+    digest.update("{} pyparsing-{}\n".format(engine, pyparsing.__version__).encode())
+    # The description pyparsing gives of the grammar spells out every element
+    digest.update(str(wikiparser.song).encode())
+    with open(scanner.__file__, "rb") as f:
+        digest.update(f.read())
+    for cls in PARSED_CLASSES:
+        digest.update(inspect.getsource(cls.__init__).encode())
+    return digest.hexdigest()
+
+
+class ParseCache(DirectoryCache):
+    SUFFIX = ".pickle"
+
+    def __init__(self, path, engine, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(os.path.join(path, engine), max_bytes)
+        self.stamp = grammar_stamp(engine)
+
+        stamp_file = os.path.join(self.path, "STAMP")
+        try:
+            with open(stamp_file) as f:
+                valid = f.read() == self.stamp
+        except FileNotFoundError:
+            valid = False
+        if not valid:
+            self.clear()
+            with open(stamp_file, "w") as f:
+                f.write(self.stamp)
+        self.evict()
+
+    def entry(self, text):
+        return os.path.join(self.path, hashlib.sha256(text.encode()).hexdigest() + self.SUFFIX)
+
+    def get(self, text):
+        """The cached Song for this source text, or None."""
+        path = self.entry(text)
+        try:
+            with open(path, "rb") as f:
+                song = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Truncated or unreadable entry: drop it and parse again
+            self.remove(path)
+            return None
+        os.utime(path)
+        return song
+
+    def put(self, text, song):
+        self.write(self.entry(text), lambda f: pickle.dump(song, f, protocol=pickle.HIGHEST_PROTOCOL), "wb")
+
+    def record(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def report(self):
+        return "Parse cache: {} hits, {} misses ({:.0%} hit rate), {} evicted".format(
+            self.hits, self.misses, self.hit_rate(), self.evicted)
@@ -0,0 +1,62 @@
+"""
+A directory of cache entries bounded in size, shared by the parse cache
+(migrator.cache) and the search cache (rendition.cache).
+
+Entries are files ending in the subclass's SUFFIX, written to a temporary
+file and renamed into place so a reader never sees half an entry. Eviction
+is least-recently-used by mtime (hits touch their entry) and runs when the
+cache is opened and closed, which keeps worker processes free of any shared
+bookkeeping; a run can overshoot max_bytes by what it adds itself.
+"""
+import os
+import tempfile
+
+
+class DirectoryCache:
+    SUFFIX = ""
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        os.makedirs(self.path, exist_ok=True)
+
+    def entries(self):
+        return [e for e in os.scandir(self.path) if e.name.endswith(self.SUFFIX)]
+
+    def write(self, path, dump, mode="w"):
+        """Atomically replace the entry at path with what dump(file) writes."""
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, mode) as f:
+            dump(f)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for e in os.scandir(self.path):
+            if e.name.endswith(self.SUFFIX) or e.name.endswith(".tmp"):
+                self.remove(e.path)
+
+    def evict(self):
+        entries = sorted(self.entries(), key=lambda e: e.stat().st_mtime)
+        total = sum(e.stat().st_size for e in entries)
+        while entries and total > self.max_bytes:
+            oldest = entries.pop(0)
+            total -= oldest.stat().st_size
+            self.remove(oldest.path)
+            self.evicted += 1
+
+    def close(self):
+        self.evict()
+
+    def hit_rate(self):
+        looked_up = self.hits + self.misses
+        return self.hits / looked_up if looked_up else 0
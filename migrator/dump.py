@@ -0,0 +1,72 @@
+"""
+Stream song pages straight out of a MediaWiki XML export (Special:Export or
+dumpBackup.php), optionally bz2 or gzip compressed, without exploding it into
+one file per song first.
+
+The dump is read with iterparse and each page is cleared from the tree once
+it has been yielded, so memory stays at roughly one page however large the
+dump is.
+"""
+import bz2
+import gzip
+import xml.etree.ElementTree as ET
+
+
+def open_dump(path):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def local_name(tag):
+    # Tags carry the export schema namespace, e.g. {http://www.mediawiki.org/xml/export-0.10/}page
+    return tag.rsplit("}", 1)[-1]
+
+
+def iter_pages(path, namespaces=("0",)):
+    """
+    Yield (title, wikitext, timestamp) of the last revision of every page in
+    the given namespaces (default: articles only; None for all), skipping
+    redirects. The timestamp is ISO 8601 as in the dump, e.g. 2024-03-01T10:00:00Z.
+    """
+    with open_dump(path) as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        title = ns = text = timestamp = None
+        redirect = False
+        for event, elem in context:
+            if event != "end":
+                continue
+            tag = local_name(elem.tag)
+            if tag == "title":
+                title = elem.text
+            elif tag == "ns":
+                ns = elem.text
+            elif tag == "redirect":
+                redirect = True
+            elif tag == "timestamp":
+                timestamp = elem.text
+            elif tag == "text":
+                text = elem.text or ""
+            elif tag == "revision":
+                # Full-history dumps have many revisions per page; only the last one is kept
+                elem.clear()
+            elif tag == "page":
+                if text is not None and not redirect and (namespaces is None or ns in namespaces):
+                    yield title, text, timestamp
+                title = ns = text = timestamp = None
+                redirect = False
+                root.clear()
+
+
+def title_to_filename(title):
+    """The name the page would have in PATH_WIKISONGS, as Song.set_old_filename expects."""
+    return title.replace(" ", "_").replace("/", "_") + ".txt"
+
+
+def iter_songs(path):
+    """Yield (song filename, wikitext, revision date) for each page, ready for the managers' queues."""
+    for title, text, timestamp in iter_pages(path):
+        yield title_to_filename(title), text, timestamp[:10] if timestamp else None
@@ -0,0 +1,191 @@
+"""
+Fuzzy lookup of category values against known corrections.
+
+Values are normalized first (case, spaces and punctuation, aspirated
+consonants, doubled letters, a final anusvara "m"), so "Begada", "BEGADA",
+"Begadha" and "Beg ada" are the same key, and so are "Rupakam" and "Rupaka".
+Anything that still differs is looked up through a trigram index: each
+candidate sharing a trigram with the query is scored with the Dice
+coefficient of the two trigram sets, which the postings give us directly, so
+a lookup only touches entries that share at least one trigram.
+
+The normalization also makes some distinct values alike. Across fields
+("Kanada" the raga, "Kannada" the language) that is kept apart by
+FuzzyFieldMap, which has an index per field and only resolves a value from
+the corrections of its own field. Within one (two ragas "Sama" and "Shama"),
+equal scores are told apart by the Dice coefficient of the case-folded
+spellings, and a tie that remains is never resolved without asking.
+"""
+import re
+from collections import namedtuple
+
+re_non_letters = re.compile(r"[^a-z]")
+re_aspirate = re.compile(r"([bcdgjkpst])h")
+re_doubled = re.compile(r"(.)\1+")
+re_final_m = re.compile(r"(?<=[aeiou])m$")
+
+Match = namedtuple("Match", ["score", "key", "value"])
+
+
+def normalize(value):
+    value = re_non_letters.sub("", value.lower())
+    value = re_aspirate.sub(r"\1", value)
+    value = re_doubled.sub(r"\1", value)
+    return re_final_m.sub("", value)
+
+
+def dice(a, b):
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def trigrams(normalized):
+    padded = "  " + normalized + " "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyIndex:
+    def __init__(self, pairs=()):
+        # normalized key -> [(key, value), ...]
+        self.entries = {}
+        # normalized key -> number of trigrams
+        self.sizes = {}
+        # trigram -> normalized keys containing it
+        self.postings = {}
+        for key, value in pairs:
+            self.add(key, value)
+
+    def add(self, key, value):
+        normalized = normalize(key)
+        if not normalized:
+            return
+        if normalized in self.entries:
+            if (key, value) not in self.entries[normalized]:
+                self.entries[normalized].append((key, value))
+            return
+        self.entries[normalized] = [(key, value)]
+        grams = trigrams(normalized)
+        self.sizes[normalized] = len(grams)
+        for gram in grams:
+            self.postings.setdefault(gram, []).append(normalized)
+
+    def ranked(self, query, limit):
+        """[(score, closeness, Match)] for query, best first, at most one per corrected value."""
+        normalized = normalize(query)
+        if not normalized:
+            return []
+        grams = trigrams(normalized)
+        shared = {}
+        for gram in grams:
+            for candidate in self.postings.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        candidates = sorted(shared.items(), key=lambda kv: 2 * kv[1] / (len(grams) + self.sizes[kv[0]]), reverse=True)
+
+        spelled = trigrams(query.casefold())
+        scored = []
+        for candidate, count in candidates[:4 * limit]:
+            score = 2 * count / (len(grams) + self.sizes[candidate])
+            for key, value in self.entries[candidate]:
+                scored.append((score, dice(spelled, trigrams(key.casefold())), Match(score, key, value)))
+        scored.sort(key=lambda s: s[:2], reverse=True)
+
+        ranked = []
+        seen = set()
+        for entry in scored:
+            if entry[2].value in seen:
+                continue
+            seen.add(entry[2].value)
+            ranked.append(entry)
+            if len(ranked) == limit:
+                break
+        return ranked
+
+    def lookup(self, query, limit=5):
+        """Best matches for query, highest score first, at most one per corrected value."""
+        return [match for _, _, match in self.ranked(query, limit)]
+
+    def resolve(self, query, threshold):
+        """The best match for query if it scores threshold and is not tied with another value, else None."""
+        ranked = self.ranked(query, 2)
+        if not ranked or ranked[0][0] < threshold:
+            return None
+        if len(ranked) > 1 and ranked[1][:2] == ranked[0][:2]:
+            return None
+        return ranked[0][2]
+
+
+class FuzzyFieldMap:
+    """
+    Wraps a FieldMap (or StoredFieldMap) with a FuzzyIndex per field over its
+    entries and any extra known (field, key, value) triples, such as those of
+    migrator.parser.map_hk. Corrected values index as keys of themselves, so a
+    wiki page that already uses the corrected spelling matches too.
+
+    The corrections files do not record the field a correction was made for.
+    Until the manager sees a song use one in a field (learn), it is only
+    offered as a suggestion, never resolved automatically.
+    """
+
+    def __init__(self, field_map, known=(), threshold=0.85):
+        self.field_map = field_map
+        self.threshold = threshold
+        # field -> FuzzyIndex of the corrections made in it
+        self.indexes = {}
+        # corrected value -> fields it was filed under
+        self.value_fields = {}
+        self.unfiled = FuzzyIndex()
+        for key, value in field_map.items():
+            self.unfiled.add(key, value)
+            self.unfiled.add(value, value)
+        for field, key, value in known:
+            if field:
+                self.file(field, key, value)
+            else:
+                self.unfiled.add(key, value)
+                self.unfiled.add(value, value)
+
+    def __contains__(self, key):
+        return key in self.field_map
+
+    def get(self, key):
+        return self.field_map.get(key)
+
+    def items(self):
+        return self.field_map.items()
+
+    def file(self, field, key, value):
+        index = self.indexes.setdefault(field, FuzzyIndex())
+        index.add(key, value)
+        index.add(value, value)
+        self.value_fields.setdefault(value, set()).add(field)
+
+    def learn(self, field, key):
+        """Note that key, which has a correction, is a value of field."""
+        value = self.field_map.get(key)
+        if value is not None and field not in self.value_fields.get(value, ()):
+            self.file(field, key, value)
+
+    def append(self, key, value, field=None):
+        self.field_map.append(key, value)
+        if field:
+            self.file(field, key, value)
+        else:
+            self.unfiled.add(key, value)
+            self.unfiled.add(value, value)
+
+    def resolve(self, field, value):
+        """The correction of field to use for value without asking, or None."""
+        index = self.indexes.get(field)
+        return index.resolve(value, self.threshold) if index else None
+
+    def suggest(self, field, value, limit=5):
+        """Corrections to offer for value: those of field, then those not filed under another field."""
+        index = self.indexes.get(field)
+        matches = index.lookup(value, limit) if index else []
+        seen = {m.value for m in matches}
+        for match in self.unfiled.lookup(value, limit):
+            fields = self.value_fields.get(match.value)
+            if match.value not in seen and (not fields or field in fields):
+                seen.add(match.value)
+                matches.append(match)
+        matches.sort(key=lambda m: m.score, reverse=True)
+        return matches[:limit]
@@ -0,0 +1,364 @@
+"""
+Structural check of wiki songs before they are parsed.
+
+A malformed page (an unbalanced <stanza>, no ==Lyrics==, too few
+[[Category:]] entries, no __NOTOC__) fails deep in the grammar, or only in
+CategoryList, and all failed.txt learns is one ParseException. validate()
+instead finds every structural token in one regular expression scan, walks
+the tokens once, and returns every problem it sees with its line number and
+a kind, such as "unclosed-stanza" or "too-few-categories". The walk follows
+the grammar where it is lenient (a stanza ends at the first </stanza> its
+SkipTo finds, however far ahead), so it flags what the parser rejects.
+
+Problems of a FATAL kind are ones the migrator cannot get past: the parse
+or the conversion fails on them. migrator.manager.load_song checks for
+those before parsing and fails the song with a MalformedSong error, which
+is recorded with the kinds of problem as its error type. The others are
+only reported here.
+
+    python -m migrator.lint [-j N] [--summary] [--dump FILE | PATH ...]
+
+PATH is a song file or a directory of them (default PATH_WIKISONGS). The
+songs are checked on N processes; the exit status is 1 if any song has a
+fatal problem.
+"""
+import argparse
+import os
+import re
+import sys
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+# Whitespace as pyparsing skips it
+WS = " \n\t\r"
+
+# Songs sent to a worker at once
+CHUNK_SIZE = 64
+
+# The lookahead lets the scan skip all text that cannot start a token
+re_token = re.compile("(?=[<=\\[_])(?:" + "|".join([
+    r'(?P<open><stanza>|<stanza[ \n\t\r]*num=(?:[ \n\t\r]*")?(?:[ \n\t\r]*[0-9]+)?(?:[ \n\t\r]*")?[ \n\t\r]*>)',
+    r"(?P<close></stanza>)",
+    r"(?P<lyrics>==Lyrics==)",
+    r"(?P<section>===[ \n\t\r]*[A-Za-z0-9][A-Za-z0-9 ]*[ \n\t\r]*===)",
+    r"(?P<prose>==[ \n\t\r]*[A-Za-z0-9]+[ \n\t\r]*==)",
+    # A name, like the grammar's Word, never runs onto another line
+    r"(?P<category>\[\[Category:(?P<name>[^\]\n]*)\]\])",
+    r"(?P<notoc>__NOTOC__)",
+]) + ")")
+# What migrator.parser.category accepts as a category name
+re_category_name = re.compile(r"[ \n\t\r]*[A-Za-z0-9][A-Za-z0-9 ]*[ \n\t\r]*")
+
+MISSING_LYRICS = "missing-lyrics"
+TEXT_BEFORE_LYRICS = "text-before-lyrics"
+NO_SECTIONS = "no-sections"
+EMPTY_FIRST_SECTION = "empty-first-section"
+UNCLOSED_STANZA = "unclosed-stanza"
+STANZA_RUNS_ON = "stanza-runs-on"
+STRAY_STANZA_END = "stray-stanza-end"
+STRAY_TEXT = "stray-text"
+NO_PROSE = "no-prose"
+BAD_CATEGORY = "bad-category"
+TOO_FEW_CATEGORIES = "too-few-categories"
+MISSING_NOTOC = "missing-notoc"
+
+# Everything but STANZA_RUNS_ON: the grammar looks for the end of a stanza
+# anywhere ahead, so a stanza that takes in the next ones or a section
+# header still converts, only not as meant
+FATAL = frozenset([
+    MISSING_LYRICS, TEXT_BEFORE_LYRICS, NO_SECTIONS, EMPTY_FIRST_SECTION, UNCLOSED_STANZA, STRAY_STANZA_END,
+    STRAY_TEXT, NO_PROSE, BAD_CATEGORY, TOO_FEW_CATEGORIES, MISSING_NOTOC,
+])
+
+Problem = namedtuple("Problem", "line kind message")
+Token = namedtuple("Token", "kind start end line match")
+
+
+class MalformedSong(ValueError):
+    def __init__(self, problems):
+        self.problems = problems
+        super().__init__("; ".join("{} (line {})".format(p.kind, p.line) for p in problems))
+
+    def __reduce__(self):
+        # Raised in the managers' worker processes
+        return MalformedSong, (self.problems,)
+
+    def kind(self):
+        """The kinds of problem, as the error type recorded for the failed song."""
+        return ",".join(sorted(set(p.kind for p in self.problems)))
+
+    def details(self):
+        return "".join("  line {}: {}: {}\n".format(p.line, p.kind, p.message) for p in self.problems)
+
+
+def tokens(text):
+    """The structural tokens of text in order, with their line numbers."""
+    result = []
+    line, counted = 1, 0
+    for m in re_token.finditer(text):
+        line += text.count("\n", counted, m.start())
+        counted = m.start()
+        result.append(Token(m.lastgroup if m.lastgroup != "name" else "category", m.start(), m.end(), line, m))
+    return result
+
+
+def shown(token):
+    return " ".join(token.match.group().split())
+
+
+class Validator:
+    def __init__(self, text):
+        # pyparsing (and so the scanner) expands tabs before parsing, which
+        # turns a tab in a header or category name into the spaces they allow
+        text = text.expandtabs()
+        self.text = text
+        self.tokens = tokens(text)
+        self.problems = []
+        # needle -> (searched_from, position), as in Scanner.find
+        self.found = {}
+
+    def report(self, line, kind, message):
+        self.problems.append(Problem(line, kind, message))
+
+    def line_at(self, pos):
+        return self.text.count("\n", 0, pos) + 1
+
+    def skip_ws(self, pos):
+        while pos < len(self.text) and self.text[pos] in WS:
+            pos += 1
+        return pos
+
+    def find(self, needle, pos):
+        cached = self.found.get(needle)
+        if cached is not None and cached[0] <= pos and (cached[1] < 0 or cached[1] >= pos):
+            return cached[1]
+        found = self.text.find(needle, pos)
+        self.found[needle] = (pos, found)
+        return found
+
+    def skip_to(self, pos, *needles):
+        for needle in needles:
+            found = self.find(needle, pos)
+            if found >= 0:
+                return found
+        return -1
+
+    def stanza_end(self, pos):
+        """
+        Where the grammar's stanza starting at pos ends, or -1 if it fails.
+        Every part of a stanza is a SkipTo, which searches the whole rest of
+        the page rather than stopping at the next </stanza>.
+        """
+        pos = self.skip_to(pos, "-details-", "-meaning-", "</stanza>")
+        if pos < 0:
+            return -1
+        pos = self.skip_ws(pos)
+        if self.text.startswith("-details-", pos):
+            found = self.skip_to(pos + 9, "-meaning-", "</stanza>")
+            pos = self.skip_ws(found) if found >= 0 else pos
+        if self.text.startswith("-meaning-", pos):
+            found = self.find("</stanza>", pos + 9)
+            pos = self.skip_ws(found) if found >= 0 else pos
+        return pos + 9 if self.text.startswith("</stanza>", pos) else -1
+
+    def stray(self, start, end, previous):
+        """Report text other than whitespace in text[start:end], which follows the token previous."""
+        gap = self.text[start:end]
+        stripped = gap.lstrip(WS)
+        if stripped:
+            self.report(self.line_at(end - len(stripped)), STRAY_TEXT,
+                        "Unexpected text after {}: {!r}".format(shown(previous), stripped.rstrip(WS)[:40]))
+
+    def run(self):
+        lyrics = self.check_start()
+        if lyrics is not None:
+            prose = self.check_lyrics(lyrics)
+            if prose is not None:
+                self.check_footer(prose)
+        return sorted(self.problems)
+
+    def check_start(self):
+        """Index of the ==Lyrics== token, if the song starts with it."""
+        lyrics = next((idx for idx, t in enumerate(self.tokens) if t.kind == "lyrics"), None)
+        if lyrics is None:
+            self.report(1, MISSING_LYRICS, "No ==Lyrics== header")
+            return None
+        head = self.text[:self.tokens[lyrics].start].strip(WS)
+        if head.startswith("{{draft}}"):
+            head = head[len("{{draft}}"):].strip(WS)
+        if head:
+            self.report(self.tokens[lyrics].line, TEXT_BEFORE_LYRICS,
+                        "==Lyrics== is not the first thing on the page (after an optional {{draft}})")
+            return None
+        return lyrics
+
+    def check_lyrics(self, lyrics):
+        """Walk the lyric sections; returns the index of the first prose header, if any."""
+        idx = lyrics + 1
+        if idx == len(self.tokens) or self.tokens[idx].kind != "section":
+            self.report(self.tokens[lyrics].line, NO_SECTIONS, "No ===Section=== header after ==Lyrics==")
+            return None
+        previous = self.tokens[lyrics]
+        sections = stanzas_in_first = 0
+        while idx < len(self.tokens):
+            token = self.tokens[idx]
+            self.stray(previous.end, token.start, previous)
+            if token.kind in ("prose", "lyrics"):
+                break
+            idx += 1
+            if token.kind == "section":
+                sections += 1
+            elif token.kind == "open":
+                end = self.stanza_end(token.end)
+                if end < 0:
+                    self.report(token.line, UNCLOSED_STANZA, "<stanza> has no </stanza>")
+                    return None
+                stanzas_in_first += sections == 1
+                taken = []
+                while self.tokens[idx].end < end:
+                    taken.append(self.tokens[idx])
+                    idx += 1
+                if taken:
+                    self.report(token.line, STANZA_RUNS_ON, "<stanza> runs on to line {}, taking in {}".format(
+                        self.tokens[idx].line, ", ".join("{} (line {})".format(shown(t), t.line) for t in taken)))
+                token = self.tokens[idx]
+                idx += 1
+            elif token.kind == "close":
+                self.report(token.line, STRAY_STANZA_END, "</stanza> without a <stanza>")
+            else:
+                self.report(token.line, NO_PROSE, "{} follows the lyrics without a ==Section== before it".format(
+                    shown(token)))
+                return self.check_first_section(lyrics, stanzas_in_first)
+            previous = token
+        self.check_first_section(lyrics, stanzas_in_first)
+        if idx == len(self.tokens):
+            self.stray(previous.end, len(self.text), previous)
+            self.report(self.line_at(len(self.text)), NO_PROSE, "No ==Section== between the lyrics and the categories")
+            return None
+        return idx
+
+    def check_first_section(self, lyrics, stanzas):
+        if not stanzas:
+            self.report(self.tokens[lyrics + 1].line, EMPTY_FIRST_SECTION,
+                        "The first section has no stanza to take the title from")
+
+    def check_footer(self, prose):
+        # Prose sections also SkipTo the next ==Header== anywhere ahead, so the
+        # last of them is the last header on the page (===X=== holds one too)
+        last = max(idx for idx in range(prose, len(self.tokens)) if self.tokens[idx].kind in ("prose", "lyrics", "section"))
+        footer = self.tokens[last + 1:]
+        # whose content runs up to the first valid category
+        first = next((idx for idx, t in enumerate(footer)
+                      if t.kind == "category" and re_category_name.fullmatch(t.match.group("name"))), None)
+        if first is None:
+            self.report(self.tokens[last].line, TOO_FEW_CATEGORIES,
+                        "No [[Category:]] after the last section, {}".format(shown(self.tokens[last])))
+            return
+        categories = 0
+        previous = None
+        for token in footer[first:]:
+            if previous is not None:
+                self.stray(previous.end, token.start, previous)
+            previous = token
+            if token.kind == "notoc":
+                break
+            if token.kind != "category":
+                self.report(token.line, STRAY_TEXT, "{} between the categories".format(shown(token)))
+                break
+            if not re_category_name.fullmatch(token.match.group("name")):
+                self.report(token.line, BAD_CATEGORY,
+                            "Category names are letters, digits and spaces: {}".format(shown(token)))
+                break
+            categories += 1
+        else:
+            self.stray(previous.end, len(self.text), previous)
+            self.report(self.line_at(len(self.text)), MISSING_NOTOC, "No __NOTOC__ after the categories")
+        if categories < 5:
+            self.report(footer[first].line, TOO_FEW_CATEGORIES,
+                        "{} categories; raga, tala, composer, language and format are needed".format(categories))
+
+
+def validate(text):
+    """Every structural problem of a wiki song, as Problems sorted by line."""
+    return Validator(text).run()
+
+
+def fatal(problems):
+    return [p for p in problems if p.kind in FATAL]
+
+
+def check(text):
+    """Raise MalformedSong if text has problems the migrator cannot get past."""
+    problems = fatal(validate(text))
+    if problems:
+        raise MalformedSong(problems)
+
+
+def lint_file(path):
+    with open(path) as f:
+        return path, validate(f.read())
+
+
+def lint_text(item):
+    name, text = item
+    return name, validate(text)
+
+
+def song_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".txt"):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def lint_all(pool, work, items, window):
+    """(name, problems) of each item, from the pool; only window items are read ahead at a time."""
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, window))
+        if not chunk:
+            return
+        yield from pool.map(work, chunk, chunksize=CHUNK_SIZE)
+
+
+def main():
+    from migrator.dump import iter_songs
+    from migrator.manager import PATH_WIKISONGS
+
+    argpar = argparse.ArgumentParser(description="Check wiki songs for structural problems.")
+    argpar.add_argument('paths', nargs='*', metavar='PATH', help='Song files or directories (default PATH_WIKISONGS)')
+    argpar.add_argument('--dump', metavar='FILE', help='Check the songs in a MediaWiki XML export instead')
+    argpar.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Worker processes (default: one per CPU)')
+    argpar.add_argument('--summary', action='store_true', help='Only print the count of songs per kind of problem')
+    args = argpar.parse_args()
+    if args.dump and args.paths:
+        argpar.error("--dump replaces PATH")
+
+    if args.dump:
+        work, items = lint_text, ((name, text) for name, text, _ in iter_songs(args.dump))
+    else:
+        work, items = lint_file, song_files(args.paths or [PATH_WIKISONGS])
+
+    songs = failed = 0
+    kinds = Counter()
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        # pool.map on its own would read a whole --dump into memory before the first result
+        for name, problems in lint_all(pool, work, items, CHUNK_SIZE * 4 * (args.jobs or 1)):
+            songs += 1
+            failed += bool(fatal(problems))
+            kinds.update(set(p.kind for p in problems))
+            if not args.summary:
+                for p in problems:
+                    print("{}:{}: {}{}: {}".format(name, p.line, p.kind, "" if p.kind in FATAL else " (warning)", p.message))
+
+    print("{} songs checked, {} with fatal problems".format(songs, failed))
+    for kind, count in kinds.most_common():
+        print("  {:<22} {:>6}".format(kind, count))
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
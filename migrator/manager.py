@@ -1,9 +1,25 @@
 import argparse
 import csv
+import datetime
 import os.path
 import sys
 import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import migrator.lint as lint
+import migrator.model as model
 import migrator.parser as wikiparser
+import migrator.translit as translit
+from migrator.cache import ParseCache
+from migrator.dump import iter_songs
+from migrator.fuzzy import FuzzyFieldMap
+from migrator.metrics import Metrics, timed
+from migrator.output import SKIPPED, OutputStats, write_if_changed
+from migrator.profiler import GrammarProfiler, enable_packrat, packrat_size
+from migrator.state import COMPLETED, FAILED, StateStore
+from migrator.sync import Sync, file_revision, text_hash
+from migrator.taxonomy import TaxonomyIndex, completed_sources
 
 FILE_COMPLETED = "/Users/srikanth/Code/sahityam/completed.txt"
 FILE_FAILED = "/Users/srikanth/Code/sahityam/failed.txt"
@@ -23,7 +39,8 @@ class SongList:
     def __contains__(self, song):
         return song in self.songs
 
-    def append(self, song):
+    def append(self, song, **details):
+        # details (error, output path, ...) are only kept by the StateStore lists
         if song in self.songs: return
         with open(self.file, 'a') as f:
             f.write(song + "\n")
@@ -50,6 +67,9 @@ class FieldMap:
     def get(self, key):
         return self.map.get(key)
 
+    def items(self):
+        return self.map.items()
+
     def append(self, key, value):
         if key in self.map: return
         with open(self.file, 'a', newline='') as file:
@@ -57,6 +77,10 @@ class FieldMap:
             writer.writerow([key, value])
         self.map[key] = value
 
+def wiki_songs():
+    """Every song in PATH_WIKISONGS, for a sync over the whole corpus."""
+    return sorted(entry.name for entry in os.scandir(PATH_WIKISONGS) if entry.is_file() and entry.name.endswith(".txt"))
+
 def get_queue(args):
     queue = []
 
@@ -77,86 +101,530 @@ def get_queue(args):
     return queue
 
 
-def write_file(name, content):
-    with open(os.path.join(PATH_CONVERTED, "{}.md".format(name)), "w") as f:
-        f.write(content)
+def write_file(name, content, stats=None):
+    path = os.path.join(PATH_CONVERTED, "{}.md".format(name))
+    outcome = write_if_changed(path, content)
+    if stats:
+        stats.record(outcome)
+    return path
 
-def main():
-    argpar = argparse.ArgumentParser(description="Process a file path.")
-    argpar.add_argument('-f', '--file', required=False, help='Path to the input file')
-    argpar.add_argument('-s', '--song', required=False, help='The song file to process')
-    argpar.add_argument('-d', '--skip-drafts', action='store_true', help='Skip draft stage songs')
-    args = argpar.parse_args()
+# (attribute of CategoryList, prompt label)
+CORRECTED_FIELDS = [
+    ("raga", "Raga"),
+    ("tala", "Tala"),
+    ("composer", "composer"),
+    ("language", "language"),
+    ("format", "format"),
+]
+
+# The field of each value in migrator.parser.map_hk, for --fuzzy
+MAP_HK_FIELDS = {"Tyagaraja": "composer", "Kriti": "format", "Telugu": "language", "Adi": "tala", "Rupakam": "tala"}
+
+def as_source(item):
+    """Queue items are song filenames, or (filename, wikitext, revision date) when reading a dump."""
+    return (item, None, None) if isinstance(item, str) else item
+
+def song_date(song, date, args):
+    """The front matter date: pinned with --date, else the dump revision's, else the wiki file's mtime."""
+    if args.date:
+        return args.date
+    if date:
+        return date
+    if os.path.exists(PATH_WIKISONGS + song):
+        return datetime.date.fromtimestamp(os.path.getmtime(PATH_WIKISONGS + song)).isoformat()
+    return None
+
+def source_details(song, text):
+    """What the state store records about where a song came from."""
+    if text is None:
+        return {"source": PATH_WIKISONGS + song, "source_revision": file_revision(PATH_WIKISONGS + song)}
+    return {"source_hash": text_hash(text)}
+
+def load_song(song, engine, cache=None, text=None):
+    """
+    Parse a song from PATH_WIKISONGS, or from text if given, through cache if
+    given. Returns (parsed song, whether it came from the cache).
+    """
+    if text is None:
+        with open(PATH_WIKISONGS + song) as f:
+            text = f.read()
+    parsed_song = cache.get(text) if cache else None
+    hit = parsed_song is not None
+    if not hit:
+        # Malformed songs fail here with what is wrong, not deep in the grammar
+        lint.check(text)
+        parsed_song = wikiparser.parse_song(text, engine)
+        if cache:
+            cache.put(text, parsed_song)
+    parsed_song.set_old_filename(song.rsplit("/")[-1])
+    return parsed_song, hit
+
+def load_compact(song, engine, cache=None, text=None):
+    """load_song, keeping only the compact model of the song (see migrator.model)."""
+    parsed_song, hit = load_song(song, engine, cache, text)
+    return model.compact(parsed_song), hit
+
+def unindex(song, taxonomy):
+    """Drop a song that is no longer migrated (a draft now, say) from the taxonomy index."""
+    if taxonomy and taxonomy.remove(source=song):
+        print("Removed {} from the taxonomy index".format(song))
+
+def render_song(parsed_song):
+    return parsed_song.to_new()
+
+def is_skipped(parsed_song, args):
+    return args.skip_drafts and (parsed_song.is_draft or not parsed_song.is_translated())
 
-    completed = SongList("Completed", FILE_COMPLETED)
-    failed = SongList("Failed", FILE_FAILED)
-    corrections = FieldMap("Corrections", FILE_CORRECTIONS)
-    queue = get_queue(args)
-    for song in queue:
+def fuzzy_corrections(corrections, threshold):
+    known = [(MAP_HK_FIELDS.get(key), key, value) for key, value in wikiparser.map_hk.items()]
+    return FuzzyFieldMap(corrections, known, threshold)
+
+def needs_correction(field, value, corrections):
+    """Whether value has no correction yet. With --fuzzy, a known one is filed under field."""
+    if value not in corrections:
+        return True
+    if isinstance(corrections, FuzzyFieldMap):
+        corrections.learn(field, value)
+    return False
+
+def prompt_correction(field, label, value, corrections):
+    suggestions = []
+    if isinstance(corrections, FuzzyFieldMap):
+        best = corrections.resolve(field, value)
+        if best:
+            print("{} [{}]: {} ({:.0%} match with {})".format(label, value, best.value, best.score, best.key))
+            corrections.append(value, best.value, field)
+            return
+        suggestions = corrections.suggest(field, value)
+
+    for idx, match in enumerate(suggestions, 1):
+        print("  {}. {} ({:.0%} match with {})".format(idx, match.value, match.score, match.key))
+    corrected = input("{} [{}]: ".format(label, value))
+    if corrected.isdigit() and 1 <= int(corrected) <= len(suggestions):
+        corrected = suggestions[int(corrected) - 1].value
+    if corrected:
+        corrected = translit.normalize(corrected)
+        if isinstance(corrections, FuzzyFieldMap):
+            corrections.append(value, corrected, field)
+        else:
+            corrections.append(value, corrected)
+
+def apply_corrections(parsed_song, corrections):
+    header = parsed_song.header_area
+    for field, _ in CORRECTED_FIELDS:
+        # Corrections typed in IAST or an Indic script before they were normalized
+        corrected = corrections.get(getattr(header, field))
+        setattr(header, field, translit.normalize(corrected) if corrected else corrected)
+
+def correct_song(parsed_song, corrections):
+    """Prompt for unknown category values, the title and the filename. Returns the filename."""
+    header = parsed_song.header_area
+    for field, label in CORRECTED_FIELDS:
+        value = getattr(header, field)
+        if needs_correction(field, value, corrections):
+            prompt_correction(field, label, value, corrections)
+    apply_corrections(parsed_song, corrections)
+
+    title = parsed_song.title
+    corrected_title = input("Title [{}]: ".format(title))
+    if corrected_title:
+        parsed_song.title = corrected_title
+
+    filename = parsed_song.new_file
+    corrected_filename = input("Filename [{}]: ".format(filename))
+    if corrected_filename:
+        filename = corrected_filename
+    return filename
+
+def report_failure(song, e, failed):
+    print("Failed converting or writing song {} due to {}".format(song, e))
+    failed.append(song, error_type=error_type(e), error=str(e))
+    if isinstance(e, lint.MalformedSong):
+        print(e.details(), end="")
+    else:
+        traceback.print_exc()
+
+def error_type(e):
+    """What a failed song is recorded as: the kinds of structural problem if lint found them."""
+    return e.kind() if isinstance(e, lint.MalformedSong) else type(e).__name__
+
+def attempt(fn, *args):
+    """Run fn, returning (result, None), or (None, (error type, message, traceback)) if it raised."""
+    try:
+        return fn(*args), None
+    except lint.MalformedSong as e:
+        return None, (error_type(e), str(e), e.details())
+    except Exception as e:
+        return None, (type(e).__name__, str(e), traceback.format_exc())
+
+def migrate(queue, args, completed, failed, corrections, cache=None, grammar_profile=None, stats=None, metrics=None,
+            taxonomy=None):
+    stats = stats or OutputStats()
+    metrics = metrics or Metrics("migrator")
+    for song, text, date in map(as_source, queue):
         if song in completed:
             print("Skipping {} since it's already migrated.".format(song))
+            stats.record(SKIPPED)
             continue
 
         try:
             print("\nProcessing", song)
-            parsed_song = wikiparser.parse_and_convert(PATH_WIKISONGS + song)
+            try:
+                with metrics.stage(song, "parse"):
+                    parsed_song, hit = load_song(song, args.engine, cache, text)
+            finally:
+                if grammar_profile:
+                    print(grammar_profile.report_file(song))
+            if cache:
+                cache.record(hit)
 
-            if args.skip_drafts and (parsed_song.is_draft or not parsed_song.is_translated()):
+            if is_skipped(parsed_song, args):
                 print("Skipping {} since it's a draft or not translated".format(song))
+                stats.record(SKIPPED)
+                unindex(song, taxonomy)
                 continue
 
-            raga = parsed_song.header_area.raga
-            if raga not in corrections:
-                corrected_raga = input("Raga [{}]: ".format(raga))
-                if corrected_raga:
-                    corrections.append(parsed_song.header_area.raga, corrected_raga)
-            parsed_song.header_area.raga = corrections.get(raga)
-
-            tala = parsed_song.header_area.tala
-            if tala not in corrections:
-                corrected_tala = input("Tala [{}]: ".format(tala))
-                if corrected_tala:
-                    corrections.append(parsed_song.header_area.tala, corrected_tala)
-            parsed_song.header_area.tala = corrections.get(tala)
-
-            composer = parsed_song.header_area.composer
-            if composer not in corrections:
-                corrected_composer = input("composer [{}]: ".format(composer))
-                if corrected_composer:
-                    corrections.append(parsed_song.header_area.composer, corrected_composer)
-            parsed_song.header_area.composer = corrections.get(composer)
-
-            language = parsed_song.header_area.language
-            if language not in corrections:
-                corrected_language = input("language [{}]: ".format(language))
-                if corrected_language:
-                    corrections.append(parsed_song.header_area.language, corrected_language)
-            parsed_song.header_area.language = corrections.get(language)
-
-            format = parsed_song.header_area.format
-            if format not in corrections:
-                corrected_format = input("format [{}]: ".format(format))
-                if corrected_format:
-                    corrections.append(parsed_song.header_area.format, corrected_format)
-            parsed_song.header_area.format = corrections.get(format)
-
-            title = parsed_song.title
-            corrected_title = input("Title [{}]: ".format(title))
-            if corrected_title:
-                parsed_song.title = corrected_title
-
-            filename = parsed_song.new_file
-            corrected_filename = input("Filename [{}]: ".format(filename))
-            if corrected_filename:
-                filename = corrected_filename
-
-            write_file(filename, parsed_song.to_new())
-            completed.append(song)
+            with metrics.stage(song, "correct"):
+                filename = correct_song(parsed_song, corrections)
+            parsed_song.set_date(song_date(song, date, args))
+            parsed_song.set_scripts(args.scripts)
+            # Rendered straight into the file, a chunk at a time
+            with metrics.stage(song, "write"):
+                path = write_file(filename, metrics.stream(song, "render", parsed_song.render()), stats)
+            if taxonomy:
+                taxonomy.add(filename, parsed_song, song)
+            completed.append(song, output_path=path, **source_details(song, text))
+            metrics.count("completed")
         except Exception as e:
-            print("Failed converting or writing song {} due to {}".format(song, e))
-            failed.append(song)
-            traceback.print_exc()
+            report_failure(song, e, failed)
+            metrics.count("failed")
+
+# Songs parsed ahead per worker process in migrate_batch
+PARSE_AHEAD = 4
+
+def make_pool(args):
+    initializer, initargs = (enable_packrat, (args.packrat,)) if args.packrat is not None else (None, ())
+    return ProcessPoolExecutor(max_workers=args.jobs, initializer=initializer, initargs=initargs)
+
+def migrate_batch(queue, args, completed, failed, corrections, cache=None, stats=None, metrics=None, taxonomy=None):
+    """
+    Like migrate(), but parsing and rendering run on a pool of args.jobs
+    processes. Results are consumed in queue order, and prompts, writes and
+    the completed/failed/corrections files are only touched here in the
+    parent, so the output is the same as a sequential run.
+
+    At most PARSE_AHEAD songs per process are parsed ahead of the one being
+    corrected, so a queue streamed from a dump is never read in full.
+    """
+    stats = stats or OutputStats()
+    metrics = metrics or Metrics("migrator")
+    window = args.jobs * PARSE_AHEAD
+    with make_pool(args) as pool:
+        # (song, text, date, future) of songs being parsed, in queue order
+        parsing = deque()
+        # (song, text, parsed song, filename, future) of songs being rendered, in queue order
+        rendering = deque()
+
+        def finish_rendered(block):
+            while rendering and (block or rendering[0][4].done()):
+                song, text, parsed_song, filename, future = rendering.popleft()
+                try:
+                    content, seconds = future.result()
+                    metrics.observe(song, "render", seconds)
+                    with metrics.stage(song, "write"):
+                        path = write_file(filename, content, stats)
+                    if taxonomy:
+                        taxonomy.add(filename, parsed_song, song)
+                    completed.append(song, output_path=path, **source_details(song, text))
+                    metrics.count("completed")
+                except Exception as e:
+                    report_failure(song, e, failed)
+                    metrics.count("failed")
+
+        def finish_parsed():
+            song, text, date, future = parsing.popleft()
+            try:
+                print("\nProcessing", song)
+                (parsed_song, hit), seconds = future.result()
+                metrics.observe(song, "parse", seconds)
+                if cache:
+                    cache.record(hit)
+                if is_skipped(parsed_song, args):
+                    print("Skipping {} since it's a draft or not translated".format(song))
+                    stats.record(SKIPPED)
+                    unindex(song, taxonomy)
+                    return
+
+                with metrics.stage(song, "correct"):
+                    filename = correct_song(parsed_song, corrections)
+                parsed_song.set_date(song_date(song, date, args))
+                parsed_song.set_scripts(args.scripts)
+                rendering.append((song, text, parsed_song, filename, pool.submit(timed, render_song, parsed_song)))
+            except Exception as e:
+                report_failure(song, e, failed)
+                metrics.count("failed")
+            finally:
+                finish_rendered(block=False)
+
+        for song, text, date in map(as_source, queue):
+            if song in completed:
+                print("Skipping {} since it's already migrated.".format(song))
+                stats.record(SKIPPED)
+                continue
+            parsing.append((song, text, date, pool.submit(timed, load_song, song, args.engine, cache, text)))
+            if len(parsing) >= window:
+                finish_parsed()
+        while parsing:
+            finish_parsed()
+        finish_rendered(block=True)
+
+def pipeline_queue(queue, completed, stats):
+    """The songs of queue not migrated yet, with {song: text} and {song: date} of their sources."""
+    songs, texts, dates = [], {}, {}
+    for song, text, date in map(as_source, queue):
+        if song in completed:
+            print("Skipping {} since it's already migrated.".format(song))
+            stats.record(SKIPPED)
+        else:
+            songs.append(song)
+            texts[song] = text
+            dates[song] = date
+    return songs, texts, dates
+
+def pipeline_parse(songs, texts, mapper, args, cache, stats, metrics, taxonomy, fail):
+    """Phase one: [(song, compact song)] of the songs that parse and are not skipped."""
+    print("Parsing {} songs".format(len(songs)))
+    parsed = []
+    loading = mapper(partial(attempt, partial(timed, load_compact)), songs, [args.engine] * len(songs), [cache] * len(songs),
+                     [texts[song] for song in songs])
+    for song, (loaded, error) in zip(songs, loading):
+        if error:
+            fail(song, error)
+            continue
+        (parsed_song, hit), seconds = loaded
+        metrics.observe(song, "parse", seconds)
+        if cache:
+            cache.record(hit)
+        if is_skipped(parsed_song, args):
+            print("Skipping {} since it's a draft or not translated".format(song))
+            stats.record(SKIPPED)
+            unindex(song, taxonomy)
+        else:
+            parsed.append((song, parsed_song))
+    return parsed
+
+def pipeline_correct(parsed, args, corrections):
+    """Phase two: one prompt per distinct category value that has no correction."""
+    if args.answers:
+        for key, value in FieldMap("Answers", args.answers).map.items():
+            corrections.append(key, value)
+    missing = {}
+    for _, parsed_song in parsed:
+        for field, label in CORRECTED_FIELDS:
+            value = getattr(parsed_song.header_area, field)
+            if needs_correction(field, value, corrections):
+                missing.setdefault(value, (field, label))
+    print("{} distinct values need corrections".format(len(missing)))
+    for value, (field, label) in missing.items():
+        prompt_correction(field, label, value, corrections)
+
+def pipeline_render(parsed, texts, dates, mapper, args, completed, failed, corrections, stats, metrics, taxonomy, fail):
+    """Phase three: render every parsed song and write it, without prompting."""
+    print("Rendering {} songs".format(len(parsed)))
+    for song, parsed_song in parsed:
+        apply_corrections(parsed_song, corrections)
+        parsed_song.set_date(song_date(song, dates[song], args))
+        parsed_song.set_scripts(args.scripts)
+    rendered = mapper(partial(attempt, partial(timed, render_song)), [parsed_song for _, parsed_song in parsed])
+    for (song, parsed_song), (result, error) in zip(parsed, rendered):
+        if error:
+            fail(song, error)
+            continue
+        content, seconds = result
+        metrics.observe(song, "render", seconds)
+        try:
+            with metrics.stage(song, "write"):
+                path = write_file(parsed_song.new_file, content, stats)
+            if taxonomy:
+                taxonomy.add(parsed_song.new_file, parsed_song, song)
+            completed.append(song, output_path=path, **source_details(song, texts[song]))
+            metrics.count("completed")
+        except Exception as e:
+            report_failure(song, e, failed)
+            metrics.count("failed")
+
+def migrate_pipeline(queue, args, completed, failed, corrections, cache=None, stats=None, metrics=None,
+                     taxonomy=None):
+    """
+    Migrate in three phases so the operator is only needed in the middle one:
+    parse the whole queue, ask once per distinct category value missing from
+    corrections (after loading args.answers, if given), then render and write
+    every song without prompting, keeping the parsed title and filename.
+    Parsing and rendering use args.jobs processes, and the parsed queue is
+    held as compact migrator.model songs in between. The prompts are per value,
+    not per song, so no song gets a "correct" stage timing here.
+    """
+    def fail(song, error):
+        error_type, message, trace = error
+        print("Failed converting or writing song {} due to {}".format(song, message))
+        failed.append(song, error_type=error_type, error=message)
+        metrics.count("failed")
+        print(trace, end="")
+
+    stats = stats or OutputStats()
+    metrics = metrics or Metrics("migrator")
+    songs, texts, dates = pipeline_queue(queue, completed, stats)
+
+    pool = make_pool(args) if args.jobs > 1 else None
+    mapper = pool.map if pool else map
+    try:
+        parsed = pipeline_parse(songs, texts, mapper, args, cache, stats, metrics, taxonomy, fail)
+        pipeline_correct(parsed, args, corrections)
+        pipeline_render(parsed, texts, dates, mapper, args, completed, failed, corrections, stats, metrics, taxonomy,
+                        fail)
+    finally:
+        if pool:
+            pool.shutdown()
+
+def make_argparser():
+    argpar = argparse.ArgumentParser(description="Process a file path.")
+    argpar.add_argument('-f', '--file', required=False, help='Path to the input file')
+    argpar.add_argument('-s', '--song', required=False, help='The song file to process')
+    argpar.add_argument('--dump', metavar='FILE', help='Read songs from a MediaWiki XML export (.xml, .xml.bz2 or .xml.gz) instead of PATH_WIKISONGS')
+    argpar.add_argument('-d', '--skip-drafts', action='store_true', help='Skip draft stage songs')
+    argpar.add_argument('-e', '--engine', choices=wikiparser.ENGINES, default="pyparsing", help='Parser engine to use')
+    argpar.add_argument('-p', '--profile', action='store_true', help='Report per-rule grammar timings per song and per run (pyparsing engine)')
+    argpar.add_argument('--packrat', type=packrat_size, metavar='SIZE', help='Enable packrat memoization with a cache of SIZE entries')
+    argpar.add_argument('-j', '--jobs', type=int, default=1, help='Parse and render songs on N worker processes')
+    argpar.add_argument('--pipeline', action='store_true', help='Parse everything, ask for corrections once per value, then write without prompting')
+    argpar.add_argument('-a', '--answers', help='CSV of corrections to load before prompting (with --pipeline)')
+    argpar.add_argument('-c', '--cache', metavar='DIR', help='Reuse parse results for unchanged wiki files, cached in DIR')
+    argpar.add_argument('--cache-size', type=int, default=256, metavar='MB', help='Size cap of the parse cache (default 256)')
+    argpar.add_argument('--fuzzy', action='store_true', help='Resolve close spellings of known values automatically and suggest the rest')
+    argpar.add_argument('--fuzzy-threshold', type=float, default=0.85, help='Match score from which --fuzzy resolves without asking (default 0.85)')
+    argpar.add_argument('--scripts', nargs='+', choices=translit.SCRIPTS, default=[], metavar='SCRIPT', help='Also write each stanza\'s sahityam in these scripts ({})'.format(", ".join(translit.SCRIPTS)))
+    argpar.add_argument('--date', metavar='YYYY-MM-DD', help='Front matter date for every song (default: the source revision or wiki file date)')
+    argpar.add_argument('--state', metavar='DB', help='Keep completed/failed songs and corrections in this SQLite database instead of the text files')
+    argpar.add_argument('--sync', action='store_true', help='Migrate only new songs and songs changed since their last conversion, and report removed ones (needs --state)')
+    argpar.add_argument('--taxonomy', metavar='DIR', help='Keep raga/tala/composer/language/composition indexes of the migrated songs as JSON in DIR (the Hugo data directory)')
+    argpar.add_argument('--metrics', metavar='FILE', help='Write per-song stage timings, counters and histograms of the run to FILE as JSON')
+    argpar.add_argument('--prometheus', metavar='FILE', help='Write the run metrics to FILE in the Prometheus textfile format')
+    return argpar
+
+def check_args(argpar, args):
+    if args.jobs < 1:
+        argpar.error("--jobs must be at least 1")
+    if args.profile and (args.jobs > 1 or args.pipeline):
+        argpar.error("--profile only works in the default sequential mode")
+    if args.answers and not args.pipeline:
+        argpar.error("--answers needs --pipeline")
+    if args.dump and (args.file or args.song):
+        argpar.error("--dump replaces --file and --song")
+    if args.sync and not args.state:
+        argpar.error("--sync needs --state")
+    if args.date:
+        try:
+            datetime.date.fromisoformat(args.date)
+        except ValueError:
+            argpar.error("--date must be YYYY-MM-DD")
+
+def open_state(args):
+    """(store, completed, failed, corrections): the --state database's, or else the text files'."""
+    store = StateStore(args.state) if args.state else None
+    if store:
+        completed = store.song_list("migrator", COMPLETED)
+        failed = store.song_list("migrator", FAILED)
+        corrections = store.field_map()
+    else:
+        completed = SongList("Completed", FILE_COMPLETED)
+        failed = SongList("Failed", FILE_FAILED)
+        corrections = FieldMap("Corrections", FILE_CORRECTIONS)
+    if args.fuzzy:
+        corrections = fuzzy_corrections(corrections, args.fuzzy_threshold)
+    return store, completed, failed, corrections
+
+def open_taxonomy(args, store, completed):
+    if not args.taxonomy:
+        return None
+    taxonomy = TaxonomyIndex(args.taxonomy)
+    if taxonomy.new and os.path.isdir(PATH_CONVERTED):
+        # The songs migrated before there was an index
+        sources = completed_sources(store) if store else completed_sources(songs=completed.songs)
+        taxonomy.rebuild(PATH_CONVERTED, sources)
+        print("Indexed {} pages already in {}".format(len(taxonomy.songs), PATH_CONVERTED))
+    return taxonomy
+
+def make_queue(args, store):
+    """(queue, sync): the songs to migrate, and the Sync filtering them with --sync."""
+    queue = iter_songs(args.dump) if args.dump else get_queue(args)
+    if not args.sync:
+        return queue, None
+    sync = Sync(store, PATH_WIKISONGS)
+    if not (args.dump or args.file or args.song):
+        queue = wiki_songs()
+    return sync.filter(map(as_source, queue)), sync
+
+def run(queue, args, completed, failed, corrections, cache, stats, metrics, taxonomy, grammar_profile):
+    """Migrate the queue in the mode args ask for."""
+    if args.pipeline:
+        migrate_pipeline(queue, args, completed, failed, corrections, cache, stats, metrics, taxonomy)
+    elif args.jobs > 1:
+        migrate_batch(queue, args, completed, failed, corrections, cache, stats, metrics, taxonomy)
+    elif grammar_profile:
+        with grammar_profile:
+            migrate(queue, args, completed, failed, corrections, cache, grammar_profile, stats, metrics, taxonomy)
+        print(grammar_profile.report_run())
+    else:
+        migrate(queue, args, completed, failed, corrections, cache, stats=stats, metrics=metrics, taxonomy=taxonomy)
+
+def finish_sync(sync, args, taxonomy):
+    # Only a sync over the whole source knows what is gone from it
+    if not (args.file or args.song):
+        for song in sync.finish():
+            if taxonomy:
+                taxonomy.remove(source=song)
+    print(sync.report())
+
+def report_run(args, stats, metrics, cache):
+    if cache:
+        cache.close()
+        print(cache.report())
+        metrics.add_counts({"cache_hits": cache.hits, "cache_misses": cache.misses})
+    metrics.add_counts(stats.counts)
+    print(stats.report())
+    print(metrics.report())
+    if args.metrics:
+        metrics.write_json(args.metrics)
+    if args.prometheus:
+        metrics.write_prometheus(args.prometheus)
+
+def main():
+    argpar = make_argparser()
+    args = argpar.parse_args()
+    check_args(argpar, args)
+
+    if args.packrat is not None:
+        enable_packrat(args.packrat)
+    grammar_profile = GrammarProfiler(wikiparser.song, vars(wikiparser)) if args.profile else None
 
+    store, completed, failed, corrections = open_state(args)
+    cache = ParseCache(args.cache, args.engine, args.cache_size * 1024 * 1024) if args.cache else None
+    stats = OutputStats()
+    metrics = Metrics("migrator")
+    taxonomy = open_taxonomy(args, store, completed)
+    queue, sync = make_queue(args, store)
+    try:
+        run(queue, args, completed, failed, corrections, cache, stats, metrics, taxonomy, grammar_profile)
+        if sync:
+            finish_sync(sync, args, taxonomy)
+    finally:
+        # Also after Ctrl-C, so the index matches the pages written so far
+        if taxonomy:
+            taxonomy.save()
+            print(taxonomy.report())
+        if store:
+            store.close()
+        report_run(args, stats, metrics, cache)
 
 
 if __name__ == '__main__':
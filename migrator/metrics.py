@@ -0,0 +1,232 @@
+"""
+Run metrics for the migrator and rendition managers: per-song stage timings
+(parse, correct, render, write, search), counters and histograms of the
+stages and of the API requests made (each search may take several),
+written at the end of a run as a JSON summary and, for the dashboards, as a
+Prometheus textfile for node_exporter's textfile collector.
+
+    metrics = Metrics("migrator")
+    with metrics.stage(song, "parse"):
+        parsed_song = load_song(song, engine)
+    metrics.count("completed")
+    metrics.write_json("run.json")
+    metrics.write_prometheus("/var/lib/node_exporter/sahityam.prom")
+"""
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from a cached parse to a prompt the operator sat on
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+PREFIX = "sahityam"
+
+
+def timed(fn, *args):
+    """Run fn, returning (result, seconds it took); picklable for worker processes."""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # counts[i] is the observations in (buckets[i-1], buckets[i]], the last one above every bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.samples = []
+
+    def observe(self, value):
+        idx = 0
+        while idx < len(self.buckets) and value > self.buckets[idx]:
+            idx += 1
+        self.counts[idx] += 1
+        self.total += value
+        self.samples.append(value)
+
+    def cumulative(self):
+        """[(upper bound, observations at or below it)], ending with "+Inf"."""
+        result, running = [], 0
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            running += count
+            result.append((bound, running))
+        return result
+
+    def quantile(self, q):
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(len(samples) * q))] if samples else 0.0
+
+    def summary(self):
+        count = len(self.samples)
+        return {
+            "count": count,
+            "total": round(self.total, 6),
+            "mean": round(self.total / count, 6) if count else 0.0,
+            "p50": round(self.quantile(0.5), 6),
+            "p95": round(self.quantile(0.95), 6),
+            "max": round(max(self.samples), 6) if count else 0.0,
+            "buckets": {str(bound): n for bound, n in self.cumulative()},
+        }
+
+
+class Metrics:
+    """
+    Stage timings are recorded both per song and into one histogram per
+    stage; counters are plain names. Only the thread running the manager
+    records, so there is no locking: time worker-side work with timed() and
+    pass the seconds to observe().
+
+    Request latencies are kept apart from the stages, per API, since a
+    stage may make any number of requests (or none, from a cache).
+
+    Chunks rendered straight into a file are timed with stream(), and that
+    time is left out of any stage() the chunks are consumed in.
+    """
+
+    def __init__(self, manager, clock=time.time):
+        self.manager = manager
+        self.clock = clock
+        self.started = clock()
+        self.songs = {}
+        self.histograms = {}
+        # API -> Histogram of its request latencies
+        self.requests = {}
+        self.counters = {}
+        # seconds spent inside stream() so far
+        self.streamed = 0.0
+
+    def observe(self, song, stage, seconds):
+        stages = self.songs.setdefault(song, {})
+        stages[stage] = stages.get(stage, 0.0) + seconds
+        self.histograms.setdefault(stage, Histogram()).observe(seconds)
+
+    @contextmanager
+    def stage(self, song, stage):
+        start = time.perf_counter()
+        streamed = self.streamed
+        try:
+            yield
+        finally:
+            self.observe(song, stage, time.perf_counter() - start - (self.streamed - streamed))
+
+    def stream(self, song, stage, chunks):
+        """Yield from chunks, timing how long producing them takes as stage."""
+        elapsed = 0.0
+        chunks = iter(chunks)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    chunk = next(chunks)
+                finally:
+                    spent = time.perf_counter() - start
+                    elapsed += spent
+                    self.streamed += spent
+                yield chunk
+        except StopIteration:
+            pass
+        finally:
+            self.observe(song, stage, elapsed)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_counts(self, counts):
+        for name, n in counts.items():
+            self.count(name, n)
+
+    def add_latencies(self, api, latencies):
+        histogram = self.requests.setdefault(api, Histogram())
+        for seconds in latencies:
+            histogram.observe(seconds)
+
+    def summary(self):
+        return {
+            "manager": self.manager,
+            "started": self.started,
+            "duration": round(self.clock() - self.started, 3),
+            "counters": dict(sorted(self.counters.items())),
+            "stages": {name: h.summary() for name, h in sorted(self.histograms.items())},
+            "requests": {api: h.summary() for api, h in sorted(self.requests.items())},
+            "songs": [dict(song=song, **{k: round(v, 6) for k, v in stages.items()})
+                      for song, stages in self.songs.items()],
+        }
+
+    def report(self):
+        lines = ["Stages:"] + report_lines(self.histograms)
+        if self.requests:
+            lines += ["Requests:"] + report_lines(self.requests)
+        return "\n".join(lines)
+
+    def prometheus(self):
+        """The metrics in the Prometheus text exposition format."""
+        label = 'manager="{}"'.format(self.manager)
+        lines = [
+            "# HELP {}_events_total Songs and lookups by outcome in the last run.".format(PREFIX),
+            "# TYPE {}_events_total counter".format(PREFIX),
+        ]
+        for name, n in sorted(self.counters.items()):
+            lines.append('{}_events_total{{{},event="{}"}} {}'.format(PREFIX, label, name, n))
+        lines += [
+            "# HELP {}_stage_seconds Time per song spent in each stage in the last run.".format(PREFIX),
+            "# TYPE {}_stage_seconds histogram".format(PREFIX),
+        ]
+        for name, histogram in sorted(self.histograms.items()):
+            lines += prometheus_histogram("stage_seconds", '{},stage="{}"'.format(label, name), histogram)
+        if self.requests:
+            lines += [
+                "# HELP {}_request_seconds Latency of each API request in the last run.".format(PREFIX),
+                "# TYPE {}_request_seconds histogram".format(PREFIX),
+            ]
+        for api, histogram in sorted(self.requests.items()):
+            lines += prometheus_histogram("request_seconds", '{},api="{}"'.format(label, api), histogram)
+        lines += [
+            "# HELP {}_run_duration_seconds Length of the last run.".format(PREFIX),
+            "# TYPE {}_run_duration_seconds gauge".format(PREFIX),
+            "{}_run_duration_seconds{{{}}} {}".format(PREFIX, label, round(self.clock() - self.started, 3)),
+            "# HELP {}_last_run_timestamp_seconds When the last run finished.".format(PREFIX),
+            "# TYPE {}_last_run_timestamp_seconds gauge".format(PREFIX),
+            "{}_last_run_timestamp_seconds{{{}}} {}".format(PREFIX, label, round(self.clock(), 3)),
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        write_atomic(path, json.dumps(self.summary(), indent=2) + "\n")
+
+    def write_prometheus(self, path):
+        # The textfile collector may read at any moment, so never leave a half written file
+        write_atomic(path, self.prometheus())
+
+
+def report_lines(histograms):
+    lines = []
+    for name, histogram in sorted(histograms.items()):
+        s = histogram.summary()
+        lines.append("  {:<10} {:>6} x, total {:.2f} s, median {:.0f} ms, p95 {:.0f} ms".format(
+            name, s["count"], s["total"], s["p50"] * 1000, s["p95"] * 1000))
+    return lines
+
+
+def prometheus_histogram(name, labels, histogram):
+    lines = []
+    for bound, n in histogram.cumulative():
+        lines.append('{}_{}_bucket{{{},le="{}"}} {}'.format(PREFIX, name, labels, bound, n))
+    lines.append("{}_{}_sum{{{}}} {}".format(PREFIX, name, labels, round(histogram.total, 6)))
+    lines.append("{}_{}_count{{{}}} {}".format(PREFIX, name, labels, len(histogram.samples)))
+    return lines
+
+
+def write_atomic(path, content):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
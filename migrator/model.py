@@ -0,0 +1,285 @@
+"""
+Compact document model for holding many parsed songs in memory at once.
+
+The classes in migrator.parser are built by pyparsing parse actions: every
+instance has its own __dict__, prose sections keep the ParseResults they were
+made from, and Stanza.get_line splits the sahityam again on every call. The
+classes here have the same attributes and methods but use __slots__, keep only
+plain strings and tuples, intern the header and category values that repeat
+across a corpus, and index a stanza's lines once on first use.
+
+    song = model.compact(wikiparser.parse_song(text, "scanner"))
+    song.set_old_filename(filename)
+    print(song.to_new())
+
+The attribute names are the same as in migrator.parser, so rendering
+(render, to_new, write_to) is the parser classes' own code.
+"""
+import sys
+from array import array
+
+import migrator.parser as wikiparser
+from migrator.parser import form_title
+
+
+class Stanza:
+    __slots__ = ("sahityam", "words", "translation", "appendix", "lines")
+
+    def __init__(self, sahityam, words, translation, appendix=()):
+        self.sahityam = sahityam
+        self.words = words
+        self.translation = translation
+        self.appendix = tuple(appendix)
+        # (start, end) of every line of sahityam, flattened; built by get_line
+        self.lines = None
+
+    @classmethod
+    def from_parsed(cls, stanza):
+        return cls(str(stanza.sahityam), str(stanza.words), str(stanza.translation), stanza.appendix)
+
+    def append(self, line):
+        self.appendix += (line,)
+
+    def index_lines(self):
+        lines = array("I")
+        start = 0
+        for line in self.sahityam.splitlines(keepends=True):
+            # the same line breaks splitlines() drops, \r\n and \x1c included
+            lines.append(start)
+            lines.append(start + len(line.splitlines()[0]))
+            start += len(line)
+        self.lines = lines
+        return lines
+
+    def get_line(self, index):
+        lines = self.lines if self.lines is not None else self.index_lines()
+        count = len(lines) // 2
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("line index out of range")
+        return self.sahityam[lines[2 * index]:lines[2 * index + 1]]
+
+    def is_translated(self):
+        return bool(self.translation.strip())
+
+    def __repr__(self):
+        return "<Stanza>:" + str({name: getattr(self, name) for name in self.__slots__[:4]})
+
+    def __getstate__(self):
+        # The line index is cheap to rebuild; don't ship it to worker processes
+        return (self.sahityam, self.words, self.translation, self.appendix)
+
+    def __setstate__(self, state):
+        self.sahityam, self.words, self.translation, self.appendix = state
+        self.lines = None
+
+    render = wikiparser.Stanza.render
+    to_new = wikiparser.Stanza.to_new
+
+
+class StanzaList:
+    __slots__ = ("stanzas",)
+
+    def __init__(self, stanzas):
+        self.stanzas = tuple(stanzas)
+
+    @classmethod
+    def from_parsed(cls, stanza_list):
+        return cls(Stanza.from_parsed(s) for s in stanza_list.stanzas)
+
+    def append(self, index, line):
+        self.stanzas[index].append(line)
+
+    def get_line(self, stanza, index):
+        return self.stanzas[stanza].get_line(index)
+
+    def is_translated(self):
+        return any(s.is_translated() for s in self.stanzas)
+
+    def __repr__(self):
+        return "<StanzaList>:" + repr(list(self.stanzas))
+
+    render = wikiparser.StanzaList.render
+    to_new = wikiparser.StanzaList.to_new
+
+
+class LyricSection:
+    __slots__ = ("header", "stanza_list")
+
+    def __init__(self, header, stanza_list):
+        self.header = header
+        self.stanza_list = stanza_list
+
+    @classmethod
+    def from_parsed(cls, section):
+        return cls(sys.intern(str(section.header)), StanzaList.from_parsed(section.stanza_list))
+
+    def __repr__(self):
+        return str({"header": self.header, "stanza_list": self.stanza_list})
+
+    def append(self, stanza, line):
+        self.stanza_list.append(stanza, line)
+
+    def get_line(self, stanza, index):
+        return self.stanza_list.get_line(stanza, index)
+
+    def is_translated(self):
+        return self.stanza_list.is_translated()
+
+    render = wikiparser.LyricSection.render
+    to_new = wikiparser.LyricSection.to_new
+
+
+class LyricSectionList:
+    __slots__ = ("sections",)
+
+    def __init__(self, sections):
+        self.sections = tuple(sections)
+
+    @classmethod
+    def from_parsed(cls, section_list):
+        return cls(LyricSection.from_parsed(s) for s in section_list.sections)
+
+    def __repr__(self):
+        return ",".join(repr(s) for s in self.sections)
+
+    def append(self, section, stanza, line):
+        self.sections[section].append(stanza, line)
+
+    def get_line(self, section, stanza, index):
+        return self.sections[section].get_line(stanza, index)
+
+    def is_translated(self):
+        return any(sec.is_translated() for sec in self.sections)
+
+    render = wikiparser.LyricSectionList.render
+    to_new = wikiparser.LyricSectionList.to_new
+
+
+class ProseSection:
+    __slots__ = ("header", "content")
+
+    def __init__(self, header, content):
+        self.header = header
+        self.content = tuple(content)
+
+    @classmethod
+    def from_parsed(cls, section):
+        return cls(sys.intern(str(section.header)), (str(p) for p in section.content))
+
+    def __repr__(self):
+        return "\nheader: {}, content: {}".format(self.header, list(self.content))
+
+    render = wikiparser.ProseSection.render
+    to_new = wikiparser.ProseSection.to_new
+
+
+class ProseSectionList:
+    __slots__ = ("sections",)
+
+    def __init__(self, sections):
+        self.sections = tuple(sections)
+
+    @classmethod
+    def from_parsed(cls, section_list):
+        return cls(ProseSection.from_parsed(s) for s in section_list.sections)
+
+    def __repr__(self):
+        return ",".join(repr(s) for s in self.sections)
+
+    render = wikiparser.ProseSectionList.render
+    to_new = wikiparser.ProseSectionList.to_new
+
+
+class CategoryList:
+    __slots__ = ("categories", "raga", "tala", "composer", "language", "format", "title", "date")
+
+    def __init__(self, categories, title="", date=None):
+        self.categories = tuple(sys.intern(str(c)) for c in categories)
+        if len(self.categories) < 5:
+            raise ValueError("Too few categories: {}".format(list(self.categories)))
+        self.raga, self.tala, self.composer, self.language, self.format = self.categories[:5]
+        self.title = title
+        self.date = date
+
+    @classmethod
+    def from_parsed(cls, header):
+        compact = cls(header.categories, header.title, header.date)
+        # Keep corrections already applied to the parsed header
+        for name in ("raga", "tala", "composer", "language", "format"):
+            setattr(compact, name, getattr(header, name))
+        return compact
+
+    def set_title(self, title):
+        self.title = title
+
+    def set_date(self, date):
+        self.date = date
+
+    def __repr__(self):
+        return str({name: getattr(self, name) for name in self.__slots__})
+
+    front_matter = wikiparser.CategoryList.front_matter
+    render = wikiparser.CategoryList.render
+    to_new = wikiparser.CategoryList.to_new
+
+
+class Song:
+    __slots__ = ("header_area", "lyrics_area", "prose_area", "old_file", "new_file", "title", "date", "scripts", "is_draft")
+
+    def __init__(self, header_area, lyrics_area, prose_area, is_draft=False):
+        self.header_area = header_area
+        self.lyrics_area = lyrics_area
+        self.prose_area = prose_area
+        self.old_file = ""
+        self.new_file = ""
+        self.title = ""
+        self.date = None
+        self.scripts = ()
+        self.is_draft = is_draft
+
+    @classmethod
+    def from_parsed(cls, song):
+        compact = cls(CategoryList.from_parsed(song.header_area), LyricSectionList.from_parsed(song.lyrics_area),
+                      ProseSectionList.from_parsed(song.prose_area), bool(song.is_draft))
+        compact.old_file = song.old_file
+        compact.new_file = song.new_file
+        compact.title = song.title
+        compact.date = song.date
+        compact.scripts = song.scripts
+        return compact
+
+    def set_old_filename(self, filename):
+        self.old_file = filename
+        self.new_file = self.old_file.replace('_', '-').lower()[:-4]
+        self.form_title()
+
+    def form_title(self):
+        self.title = form_title(self.new_file, self.lyrics_area.get_line(0, 0, 0))
+
+    def set_date(self, date):
+        """Front matter date as YYYY-MM-DD. Without one to_new uses today's, and its output changes daily."""
+        self.date = date
+
+    def set_scripts(self, scripts):
+        self.scripts = tuple(scripts)
+
+    def is_translated(self):
+        return self.lyrics_area.is_translated()
+
+    def __repr__(self):
+        return "\n".join("{}: {}".format(name, getattr(self, name)) for name in self.__slots__)
+
+    render = wikiparser.Song.render
+    write_to = wikiparser.Song.write_to
+    to_new = wikiparser.Song.to_new
+
+
+def compact(song):
+    """The compact model of a migrator.parser Song, from either parser engine."""
+    return Song.from_parsed(song)
+
+
+def parse_song(text, engine="scanner"):
+    return compact(wikiparser.parse_song(text, engine))
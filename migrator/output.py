@@ -0,0 +1,85 @@
+"""
+Writing converted files so that re-runs only touch what actually changed.
+
+A file that already holds exactly the new content is left alone, so its
+mtime stays put and Hugo and git see no change. Everything else is written
+to a temporary file in the same directory and renamed over the old one, so
+an interrupted run never leaves a half-written page behind.
+
+The content can come as chunks (see migrator.parser.Song.render): they are
+compared with the file as they arrive, and once they differ, the matching
+part is copied over from the old file and the rest written as it comes, so
+the page is never held in memory whole.
+"""
+import os
+import tempfile
+
+WRITTEN = "written"
+UNCHANGED = "unchanged"
+SKIPPED = "skipped"
+
+# mkstemp creates files as 0600; give new files the mode open() would have
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+# Block size for copying the unchanged start of a file
+COPY_SIZE = 64 * 1024
+
+
+def write_if_changed(path, content):
+    """
+    Write content, a string or an iterable of strings, to path unless it
+    already holds exactly that. Returns WRITTEN or UNCHANGED.
+    """
+    chunks = iter([content] if isinstance(content, str) else content)
+    try:
+        old = open(path, "rb")
+    except FileNotFoundError:
+        return replace(path, None, 0, b"", chunks)
+
+    with old:
+        same, data = 0, b""
+        for chunk in chunks:
+            data = chunk.encode()
+            if old.read(len(data)) != data:
+                break
+            same += len(data)
+            data = b""
+        else:
+            if not old.read(1):
+                return UNCHANGED
+        old.seek(0)
+        return replace(path, old, same, data, chunks)
+
+
+def replace(path, old, same, data, chunks):
+    """Replace path with the first same bytes of old, then data, then the remaining chunks."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while same > 0:
+                block = old.read(min(same, COPY_SIZE))
+                f.write(block)
+                same -= len(block)
+            f.write(data)
+            for chunk in chunks:
+                f.write(chunk.encode())
+        os.chmod(tmp, 0o666 & ~UMASK)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return WRITTEN
+
+
+class OutputStats:
+    def __init__(self):
+        self.counts = {WRITTEN: 0, UNCHANGED: 0, SKIPPED: 0}
+
+    def record(self, outcome):
+        self.counts[outcome] += 1
+
+    def report(self):
+        return "Output: {} written, {} unchanged, {} skipped".format(
+            self.counts[WRITTEN], self.counts[UNCHANGED], self.counts[SKIPPED])
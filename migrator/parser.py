@@ -6,6 +6,8 @@ import sys
 from pyparsing import *
 from pprint import pprint
 
+from migrator.translit import re_sup_marker, transliterate_lyrics
+
 
 # ====================== StanzaList ======================
 
@@ -38,12 +40,18 @@ stanza_list = ZeroOrMore(stanza)
 
 TEMPL_STANZA = """\
 {{{{<stanza>}}}}
-{}-details-
+{}{}-details-
 {}-meaning-
 {}{{{{</stanza>}}}}
 {}
 """
 
+# The sahityam in another script, after the HK one (see Song.set_scripts)
+TEMPL_VARIANT = """\
+{{{{<variant script="{}">}}}}
+{}{{{{</variant>}}}}
+"""
+
 re_numeric = re.compile(r'^\d+\.\s*')
 def paras(text):
     clean = lambda p: re_numeric.sub("", p.strip() + "\n")
@@ -70,6 +78,61 @@ def replace_sup(text):
     result = pat_sup.transform_string(text)
     return result
 
+# ---- Markup rewriting: compiled once at import, one pass per text ----
+
+# Same matches as replace_sup(): <sup>N</sup>word or word<sup>N</sup> -> word[N]
+re_sup = r"<sup>(?P<bad_num>[0-9]+)</sup>(?P<bad_word>[A-Za-z]+)|(?P<good_word>[A-Za-z]+)<sup>(?P<good_num>[0-9]+)</sup>"
+
+def compile_rewriter(literals, sup=False):
+    """
+    Build a function applying replace_sup() (if sup) and then the literal
+    replacements, in order, as a single regex pass over the text.
+
+    The patterns never overlap, so one leftmost scan gives the same result as
+    the chained str.replace() calls, provided no replacement creates a match
+    for a later one. Where it can, list the combined form as its own literal.
+    """
+    alternatives = [re_sup] if sup else []
+    alternatives += [re.escape(old) for old in literals]
+    pattern = re.compile("|".join(alternatives))
+
+    def replace(m):
+        new = literals.get(m.group())
+        if new is not None:
+            return new
+        if m.group("bad_num") is not None:
+            return "{}[{}]".format(m.group("bad_word"), m.group("bad_num"))
+        return "{}[{}]".format(m.group("good_word"), m.group("good_num"))
+
+    return lambda text: pattern.sub(replace, text)
+
+rewrite_sahityam = compile_rewriter({'\n': '   \n'}, sup=True)
+rewrite_words = compile_rewriter({
+    '((': '![',
+    '))': ')',
+    ' "': '](means "',
+    '\n': '   \n',
+}, sup=True)
+rewrite_prose = compile_rewriter({
+    '<sup>': '{{<sup ',
+    '</sup>': '>}}',
+    '**': '  * ',
+    # "</sup>" -> ">}}" completes a preceding "<lipi" / "</lipi" for the later passes
+    '<lipi</sup>': '{{<lipi>}}}}',
+    '</lipi</sup>': '{{</lipi>}}}}',
+    '<lipi>': '{{<lipi>}}',
+    '</lipi>': '{{</lipi>}}',
+    '\\t': ' ',
+})
+
+# ---- Script variants of the sahityam ----
+
+def render_variants(sahityam, scripts):
+    """The sahityam in each of scripts, without the footnote markers, which refer to the HK text."""
+    text = re_sup_marker.sub("", sahityam)
+    return "".join(TEMPL_VARIANT.format(script, rewrite_sahityam(transliterate_lyrics(text, script)))
+                   for script in scripts)
+
 class Stanza:
     def __init__(self, tokens):
         token = tokens[0] # Since Group() was used in stanza grammar def
@@ -99,21 +162,20 @@ class Stanza:
         }])
 
 
-    def to_new(self):
+    def render(self, more=(), scripts=()):
+        """
+        Yield the stanza as markdown, with the sahityam also in each of
+        scripts and the lines in more after its appendix.
+        """
         if len(paras(self.sahityam)) > 1 and len(paras(self.words)) > 1:
-            # Convert into a StanzaList
-            stanlist = StanzaList.from_text(self.sahityam, self.words, self.translation)
-            return stanlist.to_new()
-
-        self.sahityam = replace_sup(self.sahityam)
-        self.sahityam = self.sahityam.replace('\n', '   \n')
-        ## replace('<sup>', '[').replace('</sup>', ']') \
-        self.words = replace_sup(self.words)
-        self.words = self.words.replace('((', '![') \
-            .replace('))', ')').replace(' "', '](means "') \
-            .replace('\n', '   \n')  if self.words else ""
-            ##.replace('<sup>', '[').replace('</sup>', ']') \
-        return TEMPL_STANZA.format(self.sahityam, self.words, self.translation, "\n".join(self.appendix))
+            # Render as a StanzaList, which has no appendix
+            yield from StanzaList.from_text(self.sahityam, self.words, self.translation).render(scripts=scripts)
+            return
+        yield TEMPL_STANZA.format(rewrite_sahityam(self.sahityam), render_variants(self.sahityam, scripts),
+                                  rewrite_words(self.words), self.translation, "\n".join([*self.appendix, *more]))
+
+    def to_new(self):
+        return "".join(self.render())
 
 class AsLister:
     def __init__(self, mylist):
@@ -138,8 +200,15 @@ class StanzaList:
     def __repr__(self):
         return "<StanzaList>:" + repr(self.stanzas)
 
+    def render(self, more=(), scripts=()):
+        """Yield the stanzas as markdown, with the lines in more after the first one's appendix."""
+        for idx, s in enumerate(self.stanzas):
+            yield from s.render(more if idx == 0 else (), scripts)
+        if more and not self.stanzas:
+            raise IndexError("no stanza to add {} to".format(list(more)))
+
     def to_new(self):
-        return "".join([s.to_new() for s in self.stanzas])
+        return "".join(self.render())
 
     @classmethod
     def from_text(cls, sahityam, words, translation):
@@ -162,10 +231,8 @@ lyric_section_list = OneOrMore(lyric_section)
 
 # --- LyricSectionList: Object Representation ----
 
-TEMPL_LYRICSECTION = """\
-### {}
-{}
-"""
+# Hugo's summary break, rendered after the first stanza of the lyrics
+MORE = ("<!--more-->",)
 
 class LyricSection:
     def __init__(self, tokens):
@@ -185,8 +252,13 @@ class LyricSection:
     def is_translated(self):
         return self.stanza_list.is_translated()
 
+    def render(self, more=(), scripts=()):
+        yield "### {}\n".format(self.header)
+        yield from self.stanza_list.render(more, scripts)
+        yield "\n"
+
     def to_new(self):
-        return TEMPL_LYRICSECTION.format(self.header, self.stanza_list.to_new())
+        return "".join(self.render())
 
 
 class LyricSectionList:
@@ -205,9 +277,12 @@ class LyricSectionList:
     def is_translated(self):
         return any(sec.is_translated() for sec in self.sections)
 
+    def render(self, scripts=()):
+        for idx, s in enumerate(self.sections):
+            yield from s.render(MORE if idx == 0 else (), scripts)
+
     def to_new(self):
-        self.append(0, 0, "<!--more-->")
-        return "".join([s.to_new() for s in self.sections])
+        return "".join(self.render())
 
 lyric_section.set_parse_action(LyricSection)
 lyric_section_list.set_parse_action(LyricSectionList)
@@ -222,11 +297,6 @@ prose_section = prose_header + Group(SkipTo(prose_header) | SkipTo(category))("p
 prose_section_list = OneOrMore(prose_section)
 
 # --- ProseSection: Object Representation ----
-TEMPL_PROSESECTION = """\
-## {}
-{}
-"""
-
 class ProseSection:
     def __init__(self, tokens):
         self.header = tokens.header
@@ -236,14 +306,14 @@ class ProseSection:
         ##return "%s: %s" % (self.header, self.prose_content)
         return "\n" + ", ".join(["{}: {}".format(str(k), str(v)) for k, v in self.__dict__.items()])
 
+    def render(self):
+        yield "## {}\n".format(self.header)
+        for idx, p in enumerate(self.content):
+            yield "\n" + rewrite_prose(p) if idx else rewrite_prose(p)
+        yield "\n"
+
     def to_new(self):
-        content = "\n".join([p.replace('<sup>', '{{<sup ') \
-                           .replace('</sup>', '>}}') \
-                           .replace('**', '  * ') \
-                           .replace('<lipi>', '{{<lipi>}}') \
-                           .replace('</lipi>', '{{</lipi>}}') \
-                           .replace('\\t', ' ') for p in self.content])
-        return TEMPL_PROSESECTION.format(self.header, content)
+        return "".join(self.render())
 
 class ProseSectionList:
     def __init__(self, tokens):
@@ -252,8 +322,12 @@ class ProseSectionList:
     def __repr__(self):
         return ",".join([repr(s) for s in self.sections])
 
+    def render(self):
+        for s in self.sections:
+            yield from s.render()
+
     def to_new(self):
-        return "".join([s.to_new() for s in self.sections])
+        return "".join(self.render())
 
 prose_section.set_parse_action(ProseSection)
 prose_section_list.set_parse_action(ProseSectionList)
@@ -302,17 +376,21 @@ class CategoryList:
         self.language = self.categories[3]
         self.format = self.categories[4]
         self.title = ""
+        self.date = None
 
     def set_title(self, title):
         self.title = title
 
+    def set_date(self, date):
+        self.date = date
+
     def __repr__(self):
         return str(self.__dict__)
 
-    def to_new(self):
+    def front_matter(self, title, date):
         return TEMPL_HEADER.format(**{
-            "title": self.title,
-            "date": datetime.datetime.now().strftime("%Y-%m-%d"),
+            "title": title,
+            "date": date or datetime.datetime.now().strftime("%Y-%m-%d"),
             "raga": self.raga,
             "tala": self.tala,
             "composer": self.composer,
@@ -320,17 +398,18 @@ class CategoryList:
             "composition": self.format,
         })
 
+    def render(self):
+        yield self.front_matter(self.title, self.date)
+
+    def to_new(self):
+        return "".join(self.render())
+
 category_list.set_parse_action(CategoryList)
 
 # ====================== Song ======================
 pat_draft = Optional(Literal("{{draft}}"))
 song = pat_draft("is_draft") + Literal("==Lyrics==").suppress() + lyric_section_list("lyrics_area") + prose_section_list("prose_area") + category_list("header_area") + notoc
 
-TEMPL_SONG ="""\
-{header_area}
-{lyrics_area}{prose_area}
-"""
-
 class Song:
     def __init__(self, tokens):
         parsed = tokens.as_dict()
@@ -340,6 +419,8 @@ class Song:
         self.old_file = ""
         self.new_file = ""
         self.title = ""
+        self.date = None
+        self.scripts = ()
         self.is_draft = parsed.get("is_draft")
 
     def set_old_filename(self, filename):
@@ -351,19 +432,37 @@ class Song:
         first_line = self.lyrics_area.get_line(0, 0, 0)
         self.title = form_title(self.new_file, first_line)
 
+    def set_date(self, date):
+        """Front matter date as YYYY-MM-DD. Without one to_new uses today's, and its output changes daily."""
+        self.date = date
+
+    def set_scripts(self, scripts):
+        """Scripts (migrator.translit.SCRIPTS) to add each stanza's sahityam in, after the HK."""
+        self.scripts = tuple(scripts)
+
     def is_translated(self):
         return self.lyrics_area.is_translated()
 
     def __repr__(self):
         return "\n".join(["{}: {}".format(k, v) for k, v in self.__dict__.items()])
 
+    def render(self):
+        """
+        Yield the converted page in chunks. Nothing in the song is changed, so
+        it renders the same every time, from any thread.
+        """
+        yield self.header_area.front_matter(self.title, self.date)
+        yield "\n"
+        yield from self.lyrics_area.render(self.scripts)
+        yield from self.prose_area.render()
+        yield "\n"
+
+    def write_to(self, out):
+        for chunk in self.render():
+            out.write(chunk)
+
     def to_new(self):
-        self.header_area.set_title(self.title)
-        return TEMPL_SONG.format(**{
-            "header_area": self.header_area.to_new(),
-            "lyrics_area": self.lyrics_area.to_new(),
-            "prose_area": self.prose_area.to_new(),
-        })
+        return "".join(self.render())
 
 song.set_parse_action(Song)
 
@@ -557,12 +656,23 @@ def test_combined(data):
     obj_stanza = result.as_list()[0]
     print(obj_stanza.to_new())
 
-def parse_and_convert(file_path):
+ENGINES = ("pyparsing", "scanner")
+
+def parse_song(text, engine="pyparsing"):
+    if engine == "scanner":
+        # Imported here since migrator.scanner builds on the classes above
+        from migrator.scanner import parse_song as scan_song
+        return scan_song(text)
+    if engine != "pyparsing":
+        raise ValueError("Unknown parser engine: {}".format(engine))
+    result = song.parse_string(text)
+    return result.as_list()[0]
+
+def parse_and_convert(file_path, engine="pyparsing"):
     filename = file_path.rsplit("/")[-1]
     with open(file_path) as f:
         old = f.read()
-        result = song.parse_string(old)
-        obj_song = result.as_list()[0]
+        obj_song = parse_song(old, engine)
         obj_song.set_old_filename(filename)
 
         return obj_song
@@ -0,0 +1,150 @@
+"""
+Per-rule profiling for the pyparsing grammars in migrator.parser and rendition.parser.
+
+Attaches pyparsing debug actions to every named element reachable from a
+grammar's root and records, per element, how often it was tried, matched,
+failed (i.e. made the parser backtrack) or served from the packrat cache, and
+the cumulative time spent inside it.
+
+    profiler = GrammarProfiler(wikiparser.song, vars(wikiparser))
+    with profiler:
+        for path in paths:
+            wikiparser.parse_and_convert(path)
+            print(profiler.report_file(path))
+    print(profiler.report_run())
+"""
+import argparse
+import time
+
+from pyparsing import ParserElement
+
+
+class RuleStats:
+    def __init__(self):
+        self.calls = 0
+        self.matches = 0
+        self.backtracks = 0
+        self.cache_hits = 0
+        self.time = 0.0
+
+    def add(self, other):
+        self.calls += other.calls
+        self.matches += other.matches
+        self.backtracks += other.backtracks
+        self.cache_hits += other.cache_hits
+        self.time += other.time
+
+
+class GrammarProfiler:
+    def __init__(self, root, namespace):
+        self.root = root
+        # id(expr) -> (expr, name); ParserElement overloads ==, so key on identity
+        self.elements = self.find_names(root, namespace)
+        self.file_stats = {}
+        self.run_stats = {}
+        self.files = 0
+        self.stack = []
+        self.saved = {}
+
+    @staticmethod
+    def find_names(root, namespace):
+        """
+        Label every element reachable from root: by its module-level variable
+        name, or else by its results name. Results names are needed because
+        expr("name") returns a copy, so e.g. the lyric_section_list inside
+        song is not the module-level object. Unnamed sub-expressions are skipped.
+        """
+        by_id = {id(v): k for k, v in namespace.items() if isinstance(v, ParserElement)}
+        root.streamline()
+        elements = {}
+        todo = [root]
+        while todo:
+            expr = todo.pop()
+            if id(expr) in elements:
+                continue
+            elements[id(expr)] = (expr, by_id.get(id(expr)) or expr.resultsName)
+            todo.extend(expr.recurse())
+        return {k: (expr, name) for k, (expr, name) in elements.items() if name}
+
+    # ---- debug actions ----
+
+    def on_try(self, instring, loc, expr, cache_hit=False):
+        self.stack.append(time.perf_counter())
+
+    def on_match(self, instring, start, end, expr, tokens, cache_hit=False):
+        self.finish(expr, cache_hit).matches += 1
+
+    def on_fail(self, instring, loc, expr, exc, cache_hit=False):
+        self.finish(expr, cache_hit).backtracks += 1
+
+    def finish(self, expr, cache_hit):
+        stats = self.file_stats.setdefault(self.elements[id(expr)][1], RuleStats())
+        stats.calls += 1
+        stats.time += time.perf_counter() - self.stack.pop()
+        if cache_hit:
+            stats.cache_hits += 1
+        return stats
+
+    def start(self):
+        for expr, _ in self.elements.values():
+            self.saved[id(expr)] = (expr, expr.debug, expr.debugActions)
+            expr.set_debug_actions(self.on_try, self.on_match, self.on_fail)
+
+    def stop(self):
+        for expr, debug, actions in self.saved.values():
+            expr.debugActions = actions
+            expr.debug = debug
+        self.saved = {}
+        self.stack = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---- reports ----
+
+    def end_file(self):
+        """Fold the current file's numbers into the run totals and start afresh."""
+        stats = self.file_stats
+        for name, s in stats.items():
+            self.run_stats.setdefault(name, RuleStats()).add(s)
+        self.file_stats = {}
+        self.stack = []
+        self.files += 1
+        return stats
+
+    def report_file(self, title):
+        return self.format("Grammar profile for {}".format(title), self.end_file())
+
+    def report_run(self):
+        return self.format("Grammar profile for run ({} files)".format(self.files), self.run_stats)
+
+    @staticmethod
+    def format(title, stats):
+        lines = [
+            title,
+            "{:<28} {:>9} {:>9} {:>11} {:>11} {:>11}".format(
+                "rule", "calls", "matches", "backtracks", "cache hits", "time (ms)"),
+        ]
+        for name, s in sorted(stats.items(), key=lambda kv: kv[1].time, reverse=True):
+            lines.append("{:<28} {:>9} {:>9} {:>11} {:>11} {:>11.3f}".format(
+                name, s.calls, s.matches, s.backtracks, s.cache_hits, s.time * 1000))
+        return "\n".join(lines)
+
+
+def enable_packrat(cache_size):
+    """Turn on pyparsing's packrat memoization with a FIFO cache of cache_size entries."""
+    if cache_size < 1:
+        raise ValueError("Packrat cache size must be positive: {}".format(cache_size))
+    ParserElement.enable_packrat(cache_size_limit=cache_size)
+
+
+def packrat_size(value):
+    """argparse type of --packrat: a positive cache size."""
+    size = int(value)
+    if size < 1:
+        raise argparse.ArgumentTypeError("packrat cache size must be positive: {}".format(value))
+    return size
@@ -0,0 +1,257 @@
+"""
+Single-pass scanner for the sahityam MediaWiki song format.
+
+Builds the same Song / LyricSectionList / StanzaList / ProseSectionList /
+CategoryList objects as the pyparsing ``song`` grammar in migrator.parser, but
+walks the text once with a cursor instead of re-scanning the rest of the
+document for every ``SkipTo`` alternative.
+
+The scanner mirrors the grammar exactly, quirks included: tabs are expanded
+before scanning, whitespace is skipped in front of every element, and the
+``SkipTo`` alternations search the whole remaining document (not just the
+current stanza), in the same order the grammar tries them.
+"""
+import re
+
+from pyparsing import ParseException
+
+from migrator.parser import (
+    CategoryList,
+    LyricSection,
+    LyricSectionList,
+    ProseSection,
+    ProseSectionList,
+    Song,
+    Stanza,
+    StanzaList,
+)
+
+# --- Token classes (pyparsing defaults: whitespace is " \n\t\r", alphanums is ASCII) ---
+re_ws = re.compile(r"[ \n\t\r]*")
+re_number = re.compile(r"[0-9]+")
+re_section_header = re.compile(r"===[ \n\t\r]*([A-Za-z0-9][A-Za-z0-9 ]*)[ \n\t\r]*===")
+re_prose_header = re.compile(r"==[ \n\t\r]*([A-Za-z0-9]+)[ \n\t\r]*==")
+re_category = re.compile(r"\[\[Category:[ \n\t\r]*([A-Za-z0-9][A-Za-z0-9 ]*)[ \n\t\r]*\]\]")
+
+re_details = re.compile(re.escape("-details-"))
+re_meaning = re.compile(re.escape("-meaning-"))
+re_stanza_end = re.compile(re.escape("</stanza>"))
+
+
+class Tokens(list):
+    """
+    Minimal stand-in for pyparsing's ParseResults, so the scanner can hand its
+    results to the same constructors the grammar's parse actions use.
+    """
+
+    def __init__(self, items=(), **named):
+        super().__init__(items)
+        self.named = named
+
+    def get(self, key, default=None):
+        return self.named.get(key, default)
+
+    def __getattr__(self, key):
+        if key == "named":
+            raise AttributeError(key)
+        return self.named.get(key, "")
+
+    def as_list(self):
+        return list(self)
+
+    def as_dict(self):
+        return dict(self.named)
+
+
+class Scanner:
+    def __init__(self, text):
+        # parse_string() expands tabs before parsing, so do the same
+        self.text = text.expandtabs()
+        self.pos = 0
+        # pattern -> (searched_from, match); see find()
+        self.found = {}
+
+    def fail(self, expected):
+        raise ParseException(self.text, self.pos, "Expected {}".format(expected))
+
+    def skip_ws(self):
+        self.pos = re_ws.match(self.text, self.pos).end()
+
+    def literal(self, lit):
+        self.skip_ws()
+        if self.text.startswith(lit, self.pos):
+            self.pos += len(lit)
+            return True
+        return False
+
+    def expect(self, lit):
+        if not self.literal(lit):
+            self.fail(repr(lit))
+
+    def match(self, pattern):
+        self.skip_ws()
+        m = pattern.match(self.text, self.pos)
+        if m:
+            self.pos = m.end()
+        return m
+
+    def find(self, pattern):
+        """
+        Next match of pattern at or after pos, or None.
+
+        The cursor only moves forward (apart from short local rewinds), so a
+        previous search is reused as long as it started at or before pos and
+        its hit, if any, is not behind pos. Each pattern is therefore searched
+        through the document about once instead of once per stanza.
+        """
+        cached = self.found.get(pattern)
+        if cached is not None:
+            start, m = cached
+            if start <= self.pos and (m is None or m.start() >= self.pos):
+                return m
+        m = pattern.search(self.text, self.pos)
+        self.found[pattern] = (self.pos, m)
+        return m
+
+    def skip_to(self, *patterns):
+        """SkipTo(a) | SkipTo(b) | ...: text up to the first pattern found anywhere ahead."""
+        self.skip_ws()
+        for pattern in patterns:
+            m = self.find(pattern)
+            if m:
+                skipped = self.text[self.pos : m.start()]
+                self.pos = m.start()
+                return skipped
+        return None
+
+    # ---- StanzaList ----
+
+    def stanza_start(self):
+        if self.literal("<stanza>"):
+            return True
+        if not (self.literal("<stanza") and self.literal("num=")):
+            return False
+        self.literal('"')
+        self.match(re_number)
+        self.literal('"')
+        return self.literal(">")
+
+    def stanza(self):
+        start = self.pos
+        if not self.stanza_start():
+            self.pos = start
+            return None
+
+        token = Tokens()
+        sahityam = self.skip_to(re_details, re_meaning, re_stanza_end)
+        if sahityam is None:
+            self.pos = start
+            return None
+        token.named["sahityam"] = sahityam
+
+        optional = self.pos
+        if self.literal("-details-"):
+            words = self.skip_to(re_meaning, re_stanza_end)
+            if words is None:
+                self.pos = optional
+            else:
+                token.named["words"] = words
+
+        optional = self.pos
+        if self.literal("-meaning-"):
+            translation = self.skip_to(re_stanza_end)
+            if translation is None:
+                self.pos = optional
+            else:
+                token.named["translation"] = translation
+
+        if not self.literal("</stanza>"):
+            self.pos = start
+            return None
+        return Stanza(Tokens([token]))
+
+    def stanza_list(self):
+        stanzas = []
+        while True:
+            stanza = self.stanza()
+            if stanza is None:
+                return StanzaList(Tokens(stanzas))
+            stanzas.append(stanza)
+
+    # ---- LyricSectionList ----
+
+    def lyric_section(self):
+        start = self.pos
+        m = self.match(re_section_header)
+        if not m:
+            self.pos = start
+            return None
+        return LyricSection(Tokens([Tokens([m.group(1), self.stanza_list()])]))
+
+    def lyric_section_list(self):
+        sections = []
+        while True:
+            section = self.lyric_section()
+            if section is None:
+                break
+            sections.append(section)
+        if not sections:
+            self.fail("'==='")
+        return LyricSectionList(Tokens(sections))
+
+    # ---- ProseSectionList ----
+
+    def prose_section(self):
+        start = self.pos
+        m = self.match(re_prose_header)
+        if not m:
+            self.pos = start
+            return None
+        content = self.skip_to(re_prose_header, re_category)
+        if content is None:
+            self.pos = start
+            return None
+        return ProseSection(Tokens(header=m.group(1), prose_content=[content]))
+
+    def prose_section_list(self):
+        sections = []
+        while True:
+            section = self.prose_section()
+            if section is None:
+                break
+            sections.append(section)
+        if not sections:
+            self.fail("'=='")
+        return ProseSectionList(Tokens(sections))
+
+    # ---- CategoryList ----
+
+    def category_list(self):
+        categories = []
+        while True:
+            start = self.pos
+            m = self.match(re_category)
+            if not m:
+                self.pos = start
+                break
+            categories.append(m.group(1))
+        if not categories:
+            self.fail("'[[Category:'")
+        return CategoryList(Tokens(categories))
+
+    # ---- Song ----
+
+    def song(self):
+        named = {}
+        if self.literal("{{draft}}"):
+            named["is_draft"] = "{{draft}}"
+        self.expect("==Lyrics==")
+        named["lyrics_area"] = self.lyric_section_list()
+        named["prose_area"] = self.prose_section_list()
+        named["header_area"] = self.category_list()
+        self.expect("__NOTOC__")
+        return Song(Tokens(**named))
+
+
+def parse_song(text):
+    return Scanner(text).song()
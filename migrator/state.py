@@ -0,0 +1,290 @@
+"""
+SQLite store for run state of both managers: which songs completed or failed
+(with error type, message, source hash, output path and timestamp) and the
+field corrections.
+
+The database runs in WAL mode with a busy timeout, so several processes can
+record results at once. Song results are kept in memory and written in one
+short transaction per batch_size results, or once the oldest has waited
+max_age seconds, and on close(). No write transaction stays open between
+batches (or across the managers' prompts) to lock the others out; the
+managers close the store in a finally block, so an interrupted run keeps
+its results, and a crash loses at most the last batch, whose songs are
+simply migrated again on the next run. Corrections are committed straight
+away since they cost the operator typing.
+
+SongList and FieldMap in the managers keep working as before; song_list()
+and field_map() return drop-in replacements backed by this store.
+
+    python -m migrator.state state.db --manager migrator --status failed --error-type ParseException
+"""
+import argparse
+import csv
+import datetime
+import hashlib
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    manager TEXT NOT NULL,
+    song TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error_type TEXT,
+    error TEXT,
+    source_hash TEXT,
+    output_path TEXT,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    updated_at TEXT NOT NULL,
+    source_revision TEXT,
+    PRIMARY KEY (manager, song)
+);
+CREATE INDEX IF NOT EXISTS songs_by_status ON songs (manager, status, error_type);
+CREATE TABLE IF NOT EXISTS corrections (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+COMPLETED = "completed"
+FAILED = "failed"
+# Renditions the rendition manager could not pick on its own
+REVIEW = "review"
+# Migrated songs whose source changed since (see migrator.sync)
+STALE = "stale"
+# Migrated songs whose source is gone
+REMOVED = "removed"
+STATUSES = [COMPLETED, FAILED, REVIEW, STALE, REMOVED]
+
+
+def now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class StateStore:
+    def __init__(self, path, batch_size=100, max_age=5):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_age = max_age
+        # (query, parameters) of the song results not written yet
+        self.pending = []
+        # (manager, song) -> status of those, which status() answers from
+        self.pending_status = {}
+        self.pending_since = None
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(songs)")]
+        if "source_revision" not in columns:
+            # Databases from before sync
+            self.conn.execute("ALTER TABLE songs ADD COLUMN source_revision TEXT")
+
+    # ---- songs ----
+
+    def set_status(self, manager, song, status, error_type=None, error=None, source=None, output_path=None,
+                   source_hash=None, source_revision=None):
+        """
+        Record a song's result. source is the input file, hashed for later
+        comparison; songs read from a dump pass the hash of their text instead.
+        source_revision is whatever tells cheaply that the source changed,
+        such as the file's mtime.
+        """
+        if source:
+            source_hash = file_hash(source)
+        self.write(
+            (manager, song), status,
+            """INSERT INTO songs (manager, song, status, error_type, error, source_hash, output_path, updated_at,
+                source_revision)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (manager, song) DO UPDATE SET
+                status = excluded.status, error_type = excluded.error_type, error = excluded.error,
+                source_hash = coalesce(excluded.source_hash, source_hash),
+                output_path = coalesce(excluded.output_path, output_path),
+                source_revision = coalesce(excluded.source_revision, source_revision),
+                attempts = attempts + 1, updated_at = excluded.updated_at""",
+            (manager, song, status, error_type, error, source_hash, output_path, now(), source_revision),
+        )
+
+    def write(self, key, status, query, params):
+        self.pending.append((query, params))
+        self.pending_status[key] = status
+        if self.pending_since is None:
+            self.pending_since = time.monotonic()
+        if len(self.pending) >= self.batch_size or time.monotonic() - self.pending_since >= self.max_age:
+            self.commit()
+
+    def status(self, manager, song):
+        if (manager, song) in self.pending_status:
+            return self.pending_status[manager, song]
+        row = self.conn.execute("SELECT status FROM songs WHERE manager = ? AND song = ?", (manager, song)).fetchone()
+        return row[0] if row else None
+
+    def source_state(self, manager, song):
+        """(status, source hash, source revision) of a song, or None if it was never recorded."""
+        if (manager, song) in self.pending_status:
+            self.commit()
+        query = "SELECT status, source_hash, source_revision FROM songs WHERE manager = ? AND song = ?"
+        return self.conn.execute(query, (manager, song)).fetchone()
+
+    def mark(self, manager, song, status, source_revision=None):
+        """Change a recorded song's status (and revision, if given) without counting an attempt."""
+        if self.status(manager, song) is None:
+            return
+        self.write(
+            (manager, song), status,
+            """UPDATE songs SET status = ?, source_revision = coalesce(?, source_revision), updated_at = ?
+            WHERE manager = ? AND song = ?""",
+            (status, source_revision, now(), manager, song),
+        )
+
+    def song_names(self, manager, status):
+        self.commit()
+        query = "SELECT song FROM songs WHERE manager = ? AND status = ? ORDER BY song"
+        return [row[0] for row in self.conn.execute(query, (manager, status))]
+
+    def count(self, manager, status):
+        self.commit()
+        query = "SELECT count(*) FROM songs WHERE manager = ? AND status = ?"
+        return self.conn.execute(query, (manager, status)).fetchone()[0]
+
+    def songs(self, manager=None, status=None, error_type=None):
+        """
+        Rows of (manager, song, status, error_type, error, source_hash,
+        output_path, attempts, updated_at, source_revision).
+        """
+        self.commit()
+        clauses, params = [], []
+        for column, value in (("manager", manager), ("status", status), ("error_type", error_type)):
+            if value is not None:
+                clauses.append("{} = ?".format(column))
+                params.append(value)
+        query = "SELECT * FROM songs" + (" WHERE " + " AND ".join(clauses) if clauses else "") + " ORDER BY updated_at"
+        return self.conn.execute(query, params).fetchall()
+
+    # ---- corrections ----
+
+    def get_correction(self, key):
+        row = self.conn.execute("SELECT value FROM corrections WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def corrections(self):
+        return self.conn.execute("SELECT key, value FROM corrections").fetchall()
+
+    def add_correction(self, key, value):
+        self.conn.execute(
+            "INSERT OR IGNORE INTO corrections (key, value, updated_at) VALUES (?, ?, ?)", (key, value, now()))
+        self.commit()
+
+    # ---- importing the old text files ----
+
+    def import_song_list(self, manager, status, filepath):
+        with open(filepath) as f:
+            for song in f.read().splitlines():
+                if song and self.status(manager, song) is None:
+                    self.set_status(manager, song, status)
+        self.commit()
+
+    def import_corrections(self, filepath):
+        with open(filepath, newline='') as csvfile:
+            rows = [(key, value, now()) for key, value in (row for row in csv.reader(csvfile) if len(row) == 2)]
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO corrections (key, value, updated_at) VALUES (?, ?, ?)", rows)
+
+    # ---- transactions ----
+
+    def commit(self):
+        """Write the pending song results, in one transaction."""
+        if self.pending:
+            with self.conn:
+                for query, params in self.pending:
+                    self.conn.execute(query, params)
+            self.pending = []
+            self.pending_status = {}
+            self.pending_since = None
+        self.conn.commit()
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    def song_list(self, manager, status):
+        return StoredSongList(self, manager, status)
+
+    def field_map(self):
+        return StoredFieldMap(self)
+
+
+class StoredSongList:
+    """SongList interface over a StateStore: the songs of one manager with one status."""
+
+    def __init__(self, store, manager, status):
+        self.store = store
+        self.manager = manager
+        self.name = status
+
+    def __contains__(self, song):
+        return self.store.status(self.manager, song) == self.name
+
+    def append(self, song, **details):
+        self.store.set_status(self.manager, song, self.name, **details)
+
+    def __len__(self):
+        return self.store.count(self.manager, self.name)
+
+
+class StoredFieldMap:
+    """FieldMap interface over the corrections table of a StateStore."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __contains__(self, key):
+        return self.store.get_correction(key) is not None
+
+    def get(self, key):
+        return self.store.get_correction(key)
+
+    def items(self):
+        return self.store.corrections()
+
+    def append(self, key, value):
+        self.store.add_correction(key, value)
+
+
+def main():
+    argpar = argparse.ArgumentParser(description="Query or seed the migration state database.")
+    argpar.add_argument('database', help='Path to the state database')
+    argpar.add_argument('-m', '--manager', help='Only songs of this manager (migrator or rendition)')
+    argpar.add_argument('--status', choices=STATUSES, help='Only songs with this status')
+    argpar.add_argument('--error-type', help='Only songs that failed with this exception type')
+    argpar.add_argument('--import-completed', metavar='FILE', help='Import a completed.txt for --manager')
+    argpar.add_argument('--import-failed', metavar='FILE', help='Import a failed.txt for --manager')
+    argpar.add_argument('--import-corrections', metavar='FILE', help='Import a corrections.csv')
+    args = argpar.parse_args()
+
+    store = StateStore(args.database)
+    if (args.import_completed or args.import_failed) and not args.manager:
+        argpar.error("--import-completed/--import-failed need --manager")
+    if args.import_completed:
+        store.import_song_list(args.manager, COMPLETED, args.import_completed)
+    if args.import_failed:
+        store.import_song_list(args.manager, FAILED, args.import_failed)
+    if args.import_corrections:
+        store.import_corrections(args.import_corrections)
+
+    for manager, song, status, error_type, error, _, output_path, attempts, updated_at, _ in \
+            store.songs(args.manager, args.status, args.error_type):
+        details = error_type + ": " + error if error_type else output_path or ""
+        print("{}\t{}\t{}\t{}\t{}\t{}".format(updated_at, manager, song, status, attempts, details))
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
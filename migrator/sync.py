@@ -0,0 +1,116 @@
+"""
+Incremental sync of the wiki songs into the Hugo tree.
+
+The state store remembers, for every song migrated, the hash of the source
+it was converted from and its revision (the wiki file's mtime). A sync run
+reads the whole source, wiki files or a dump, and passes on only the songs
+that are new, whose source changed since their last successful conversion,
+or whose last attempt failed (retried); songs migrated before but no longer
+in the source are reported as removed. A nightly run over the whole corpus
+thus only converts the handful of songs edited that day:
+
+    python -m migrator.manager --state state.db --sync [--dump pages.xml.bz2]
+
+Wiki files whose mtime did not move are not even read. If the mtime moved
+but the content is the same, only the new mtime is recorded. Dump pages are
+compared by the hash of their text, which is at hand anyway.
+
+A changed song is marked STALE before it is migrated again, so the managers
+no longer count it as completed; should that fail, the next sync tries it
+again like a new one.
+"""
+import hashlib
+import os
+
+from migrator.state import COMPLETED, FAILED, REMOVED, STALE, file_hash
+
+ADDED = "added"
+CHANGED = "changed"
+RETRIED = "retried"
+UNCHANGED = "unchanged"
+
+
+def file_revision(path):
+    return str(os.stat(path).st_mtime_ns)
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class Sync:
+    def __init__(self, store, root, manager="migrator"):
+        self.store = store
+        self.root = root
+        self.manager = manager
+        self.seen = set()
+        self.counts = {ADDED: 0, CHANGED: 0, RETRIED: 0, UNCHANGED: 0, REMOVED: 0}
+        self.added = []
+        self.changed = []
+        self.retried = []
+        self.removed = []
+
+    def classify(self, song, text=None):
+        """ADDED, CHANGED, RETRIED or UNCHANGED for a song read from text, or else from its file under root."""
+        state = self.store.source_state(self.manager, song)
+        if state is not None and state[0] == FAILED:
+            return RETRIED
+        if state is None or state[0] not in (COMPLETED, STALE):
+            return ADDED
+        status, old_hash, old_revision = state
+        if status == STALE:
+            # Changed in an earlier sync that never got to migrate it
+            return CHANGED
+        if text is not None:
+            return UNCHANGED if text_hash(text) == old_hash else CHANGED
+
+        path = os.path.join(self.root, song)
+        revision = file_revision(path)
+        if revision == old_revision:
+            return UNCHANGED
+        if file_hash(path) == old_hash:
+            self.store.mark(self.manager, song, COMPLETED, revision)
+            return UNCHANGED
+        return CHANGED
+
+    def filter(self, sources):
+        """Yield the (song, text, date) sources that need migrating, in order."""
+        for song, text, date in sources:
+            self.seen.add(song)
+            kind = self.classify(song, text)
+            self.counts[kind] += 1
+            if kind == UNCHANGED:
+                continue
+            if kind == CHANGED:
+                self.store.mark(self.manager, song, STALE)
+                self.changed.append(song)
+            elif kind == RETRIED:
+                self.retried.append(song)
+            else:
+                self.added.append(song)
+            yield song, text, date
+
+    def finish(self):
+        """
+        Mark migrated songs (completed, or stale and not migrated again yet)
+        that were not in the source as REMOVED, once it was read to the end.
+        Returns them.
+        """
+        for status in (COMPLETED, STALE):
+            for song in self.store.song_names(self.manager, status):
+                if song not in self.seen:
+                    self.store.mark(self.manager, song, REMOVED)
+                    self.removed.append(song)
+        self.removed.sort()
+        self.counts[REMOVED] = len(self.removed)
+        self.store.commit()
+        return self.removed
+
+    def report(self):
+        lines = ["Sync: {} added, {} changed, {} retried, {} unchanged, {} removed".format(
+            self.counts[ADDED], self.counts[CHANGED], self.counts[RETRIED], self.counts[UNCHANGED],
+            self.counts[REMOVED])]
+        for label, songs in (("Changed", self.changed), ("Retried", self.retried), ("Removed", self.removed)):
+            if songs:
+                lines.append("{}: {}".format(label, ", ".join(songs)))
+        return "\n".join(lines)
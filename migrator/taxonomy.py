@@ -0,0 +1,252 @@
+"""
+Taxonomy indexes for the Hugo site, kept up to date as songs are migrated.
+
+Hugo works out the rAga, tAla, composer, language and composition
+taxonomies by reading every page on every build. The migrator already has
+those values in each song's CategoryList, so it records them here instead,
+one song at a time, and writes them as Hugo data files the site templates
+read through site.Data:
+
+    data/rAga.json         {"bEgaDa": {"count": 2, "songs": [{"page": ..., "title": ...}, ...]}, ...}
+    data/tAla.json         likewise for tAla, composer.json, language.json, composition.json
+    data/counts.json       {"songs": 1234, "rAga": {"bEgaDa": 2, ...}, ...}
+    data/songs.json        {"nadopasanace": {"title": ..., "source": ..., "rAga": ..., ...}, ...}
+
+songs.json is also the index's own record of what is in it, so updating a
+song or dropping one only touches that song's entries: nothing is rescanned.
+Only the files of taxonomies whose values changed are written out again.
+
+A new index is seeded once from the front matter of the pages already on
+the site (--rebuild; the migrator does it when it finds no songs.json), with
+the wiki file of each page taken from the state database or completed.txt.
+
+    python -m migrator.taxonomy data/ [--remove PAGE ...]
+    python -m migrator.taxonomy data/ --rebuild content/sahityam/ [--state state.db | --completed completed.txt]
+"""
+import argparse
+import json
+import os
+
+from migrator.output import WRITTEN, write_if_changed
+from migrator.state import COMPLETED, StateStore
+
+# (attribute of CategoryList, front matter key and data file name)
+TAXONOMIES = [
+    ("raga", "rAga"),
+    ("tala", "tAla"),
+    ("composer", "composer"),
+    ("language", "language"),
+    ("format", "composition"),
+]
+
+FILE_SONGS = "songs.json"
+FILE_COUNTS = "counts.json"
+
+
+def dumps(data):
+    return json.dumps(data, indent=1, sort_keys=True, ensure_ascii=False) + "\n"
+
+
+def page_name(source):
+    """The page a wiki file is migrated to unless renamed at the prompt (see Song.set_old_filename)."""
+    return source.replace('_', '-').lower()[:-4]
+
+
+def completed_sources(store=None, songs=()):
+    """
+    {page: wiki file} of the songs the migrator completed. The state database
+    records the page each one went to; for completed.txt (songs) the default
+    name is assumed.
+    """
+    sources = {page_name(song): song for song in songs}
+    if store:
+        for row in store.songs("migrator", COMPLETED):
+            song, output_path = row[1], row[6]
+            page = os.path.splitext(os.path.basename(output_path))[0] if output_path else page_name(song)
+            sources[page] = song
+    return sources
+
+
+def read_front_matter(path):
+    """The "key: value" lines between the --- lines at the top of a page."""
+    fields = {}
+    with open(path) as f:
+        if f.readline().rstrip("\n") != "---":
+            return fields
+        for line in f:
+            line = line.rstrip("\n")
+            if line == "---":
+                break
+            key, sep, value = line.partition(":")
+            if sep:
+                fields[key.strip()] = value.strip()
+    return fields
+
+
+class TaxonomyIndex:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self.path(FILE_SONGS)) as f:
+                self.songs = json.load(f)
+        except FileNotFoundError:
+            self.songs = {}
+        # No index yet: it needs seeding from the pages already there (rebuild)
+        self.new = not os.path.exists(self.path(FILE_SONGS))
+        # key -> value -> {page: title}, rebuilt from songs.json rather than the pages
+        self.terms = {key: {} for _, key in TAXONOMIES}
+        self.pages = {}
+        for page, entry in self.songs.items():
+            self.link(page, entry)
+        # Taxonomies changed since the last save, FILE_SONGS for songs.json and
+        # counts.json alone; all of them if a file is missing
+        self.dirty = {key for _, key in TAXONOMIES if not os.path.exists(self.path(key + ".json"))}
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def link(self, page, entry):
+        for _, key in TAXONOMIES:
+            self.terms[key].setdefault(entry[key], {})[page] = entry["title"]
+        if entry.get("source"):
+            self.pages[entry["source"]] = page
+
+    def unlink(self, page):
+        entry = self.songs.pop(page)
+        for _, key in TAXONOMIES:
+            pages = self.terms[key][entry[key]]
+            del pages[page]
+            if not pages:
+                del self.terms[key][entry[key]]
+        if self.pages.get(entry.get("source")) == page:
+            del self.pages[entry["source"]]
+        return entry
+
+    def changed(self, page, old, new):
+        """Mark what differs between two entries of page (None for none)."""
+        if old == new:
+            return
+        self.dirty.add(FILE_SONGS)
+        for _, key in TAXONOMIES:
+            # The title is listed under every value
+            if not old or not new or old[key] != new[key] or old["title"] != new["title"]:
+                self.dirty.add(key)
+
+    def add(self, page, song, source=None):
+        """
+        Index the migrated song under page (its file name without .md),
+        replacing what was indexed for that page before, and for the page
+        source was migrated to before, if it went to another one.
+        """
+        header = song.header_area
+        entry = {key: getattr(header, attribute) for attribute, key in TAXONOMIES}
+        entry["title"] = song.title
+        if source:
+            entry["source"] = source
+        old_page = self.pages.get(source)
+        if old_page is not None and old_page != page:
+            self.changed(old_page, self.unlink(old_page), None)
+        old = self.unlink(page) if page in self.songs else None
+        self.songs[page] = entry
+        self.link(page, entry)
+        self.changed(page, old, entry)
+
+    def remove(self, page=None, source=None):
+        """Drop a page, or the page source was migrated to. Returns whether there was one."""
+        if page is None:
+            page = self.pages.get(source)
+        if page not in self.songs:
+            return False
+        self.changed(page, self.unlink(page), None)
+        return True
+
+    def rebuild(self, content_dir, sources=None):
+        """
+        Replace the index with the pages in content_dir, read from their front
+        matter. sources is {page: wiki file} (see completed_sources). Returns
+        the pages without the taxonomy fields, which are left out.
+        """
+        sources = sources or {}
+        self.songs = {}
+        self.terms = {key: {} for _, key in TAXONOMIES}
+        self.pages = {}
+        skipped = []
+        for name in sorted(os.listdir(content_dir)):
+            page, ext = os.path.splitext(name)
+            if ext != ".md" or page.startswith("_"):
+                continue
+            fields = read_front_matter(os.path.join(content_dir, name))
+            if not all(key in fields for _, key in TAXONOMIES):
+                skipped.append(page)
+                continue
+            entry = {key: fields[key] for _, key in TAXONOMIES}
+            entry["title"] = fields.get("title", "")
+            if page in sources:
+                entry["source"] = sources[page]
+            self.songs[page] = entry
+            self.link(page, entry)
+        self.dirty = {FILE_SONGS} | {key for _, key in TAXONOMIES}
+        self.new = False
+        return skipped
+
+    def counts(self):
+        counts = {key: {value: len(pages) for value, pages in self.terms[key].items()} for _, key in TAXONOMIES}
+        counts["songs"] = len(self.songs)
+        return counts
+
+    def taxonomy(self, key):
+        return {
+            value: {
+                "count": len(pages),
+                "songs": [{"page": page, "title": title} for page, title in sorted(pages.items(), key=lambda p: (p[1], p[0]))],
+            }
+            for value, pages in self.terms[key].items()
+        }
+
+    def save(self):
+        """Write the data files that may have changed. Returns how many did."""
+        if not self.dirty:
+            return 0
+        files = [(FILE_SONGS, self.songs), (FILE_COUNTS, self.counts())]
+        files += [(key + ".json", self.taxonomy(key)) for _, key in TAXONOMIES if key in self.dirty]
+        self.dirty = set()
+        return sum(write_if_changed(self.path(name), dumps(data)) == WRITTEN for name, data in files)
+
+    def report(self):
+        return "Taxonomy: {} songs, {}".format(len(self.songs), ", ".join(
+            "{} {}".format(len(self.terms[key]), key) for _, key in TAXONOMIES))
+
+
+def main():
+    argpar = argparse.ArgumentParser(description="Show or edit the taxonomy data files.")
+    argpar.add_argument('directory', help='Hugo data directory holding the index')
+    argpar.add_argument('--remove', nargs='+', metavar='PAGE', default=[], help='Drop these pages from the index')
+    argpar.add_argument('--rebuild', metavar='CONTENT_DIR', help='Index the pages in CONTENT_DIR from their front matter, replacing the index')
+    sources = argpar.add_mutually_exclusive_group()
+    sources.add_argument('--state', metavar='DB', help='With --rebuild: the state database, for the wiki file of each page')
+    sources.add_argument('--completed', metavar='FILE', help='With --rebuild: completed.txt, for the wiki file of each page')
+    args = argpar.parse_args()
+
+    index = TaxonomyIndex(args.directory)
+    if args.rebuild:
+        if args.state:
+            store = StateStore(args.state)
+            pages = completed_sources(store)
+            store.close()
+        elif args.completed:
+            with open(args.completed) as f:
+                pages = completed_sources(songs=f.read().splitlines())
+        else:
+            pages = {}
+        for page in index.rebuild(args.rebuild, pages):
+            print("{} has no taxonomy front matter, left out".format(page))
+    for page in args.remove:
+        if not index.remove(page):
+            print("{} is not in the index".format(page))
+    if args.rebuild or args.remove:
+        print("{} data files updated".format(index.save()))
+    print(index.report())
+
+if __name__ == '__main__':
+    main()
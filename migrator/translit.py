@@ -0,0 +1,339 @@
+"""
+Transliteration between Harvard-Kyoto, IAST and the Devanagari, Telugu and
+Tamil scripts.
+
+The lyrics on the wiki are in Harvard-Kyoto (nAdOpAsanacE zaGkara), with
+the short/long e and o of the South Indian languages told apart: e, o are
+short and E, O long. IAST follows ISO 15919 where the two differ, so that
+distinction survives: ē, ō for E, O, l̥ for the vocalic lR, and ḷ for the
+retroflex L (ళ, ळ, ள). Tamil has no letters for aspirated and voiced
+stops, so converting to Tamil loses them, and converting from it reads
+every stop as unvoiced.
+
+Every source scheme is read with a longest-match trie of its letters
+(so "kh" is one letter, not k + h), compiled once into a single regular
+expression, and the letters are written out in the target scheme, adding
+the vowel signs and viramas the Indic scripts need. Anything that is not a
+letter (spaces, digits, punctuation, English) is passed through as is.
+
+The wiki's lyrics carry footnote markers (<sup>1</sup>) and other markup;
+transliterate_lyrics() converts the text around the markup and leaves the
+markup itself as it is.
+
+    python -m migrator.translit -f hk -t telugu "nAdOpAsanacE zaGkara"
+    python -m migrator.translit -t iast < song.txt
+"""
+import argparse
+import functools
+import re
+import sys
+import unicodedata
+
+# What a letter of a scheme reads as
+CONSONANT, VOWEL, SIGN, VIRAMA, MARK, OTHER = range(6)
+
+# The letters, by their Harvard-Kyoto names
+VOWELS = ["a", "A", "i", "I", "u", "U", "R", "RR", "lR", "lRR", "e", "E", "ai", "o", "O", "au"]
+CONSONANTS = [
+    "k", "kh", "g", "gh", "G",
+    "c", "ch", "j", "jh", "J",
+    "T", "Th", "D", "Dh", "N",
+    "t", "th", "d", "dh", "n",
+    "p", "ph", "b", "bh", "m",
+    "y", "r", "l", "v", "z", "S", "s", "h", "L",
+]
+MARKS = ["M", "H"]
+
+
+class Scheme:
+    """
+    A way of writing the letters: a romanization, where every letter is
+    written out, or a script, where a consonant carries an "a" unless a vowel
+    sign or a virama follows it.
+    """
+
+    def __init__(self, name, vowels, consonants, marks, signs=None, virama=None, readings=None, capitals=False):
+        self.name = name
+        self.vowels = dict(zip(VOWELS, vowels.split()))
+        self.consonants = dict(zip(CONSONANTS, consonants.split()))
+        self.marks = dict(zip(MARKS, marks.split()))
+        self.roman = signs is None
+        # The vowel signs, "a" having none
+        self.signs = dict(zip(VOWELS, [""] + signs.split())) if signs else None
+        self.virama = virama
+        # Other spellings that are read but never written, such as w for v
+        self.readings = readings or {}
+        # Whether capitalized letters read the same (Tyāgarāja); HK is case sensitive
+        self.capitals = capitals
+
+    def letters(self):
+        """{text: (kind, letter)} of everything a text in this scheme is read as."""
+        letters = {}
+        tables = [(CONSONANT, self.consonants), (VOWEL, self.vowels), (MARK, self.marks)]
+        if not self.roman:
+            tables.append((SIGN, {k: v for k, v in self.signs.items() if v}))
+        for kind, table in tables:
+            for letter, text in table.items():
+                # Tamil writes some letters as others plus a sign (ரு, ம்), which
+                # are read as those; otherwise the first letter written the same wins
+                if self.roman or len(text) == 1:
+                    letters.setdefault(text, (kind, letter))
+        if self.virama:
+            letters[self.virama] = (VIRAMA, None)
+        for text, letter in self.readings.items():
+            kind = CONSONANT if letter in self.consonants else MARK if letter in self.marks else VOWEL
+            letters[text] = (kind, letter)
+        if self.capitals:
+            for text, value in list(letters.items()):
+                capital = text[0].upper() + text[1:]
+                if value[0] != MARK and capital != text:
+                    letters.setdefault(capital, value)
+        return letters
+
+    def write(self, kind, letter):
+        if kind == CONSONANT:
+            return self.consonants[letter]
+        if kind == VOWEL:
+            return self.vowels[letter]
+        if kind == SIGN:
+            return self.vowels[letter] if self.roman else self.signs[letter]
+        if kind == MARK:
+            return self.marks[letter]
+        return "" if self.roman else self.virama
+
+
+HK = Scheme(
+    "hk",
+    "a A i I u U R RR lR lRR e E ai o O au",
+    " ".join(CONSONANTS),
+    "M H",
+    readings={"w": "v"},
+)
+IAST = Scheme(
+    "iast",
+    "a ā i ī u ū ṛ ṝ l̥ l̥̄ e ē ai o ō au",
+    "k kh g gh ṅ c ch j jh ñ ṭ ṭh ḍ ḍh ṇ t th d dh n p ph b bh m y r l v ś ṣ s h ḷ",
+    "ṃ ḥ",
+    readings={"ṁ": "M", "r̥": "R", "r̥̄": "RR"},
+    capitals=True,
+)
+DEVANAGARI = Scheme(
+    "devanagari",
+    "अ आ इ ई उ ऊ ऋ ॠ ऌ ॡ ऎ ए ऐ ऒ ओ औ",
+    "क ख ग घ ङ च छ ज झ ञ ट ठ ड ढ ण त थ द ध न प फ ब भ म य र ल व श ष स ह ळ",
+    "ं ः",
+    signs="ा ि ी ु ू ृ ॄ ॢ ॣ ॆ े ै ॊ ो ौ",
+    virama="्",
+)
+TELUGU = Scheme(
+    "telugu",
+    "అ ఆ ఇ ఈ ఉ ఊ ఋ ౠ ఌ ౡ ఎ ఏ ఐ ఒ ఓ ఔ",
+    "క ఖ గ ఘ ఙ చ ఛ జ ఝ ఞ ట ఠ డ ఢ ణ త థ ద ధ న ప ఫ బ భ మ య ర ల వ శ ష స హ ళ",
+    "ం ః",
+    signs="ా ి ీ ు ూ ృ ౄ ౢ ౣ ె ే ై ొ ో ౌ",
+    virama="్",
+)
+TAMIL = Scheme(
+    "tamil",
+    "அ ஆ இ ஈ உ ஊ ரு ரூ லு லூ எ ஏ ஐ ஒ ஓ ஔ",
+    "க க க க ங ச ச ஜ ஜ ஞ ட ட ட ட ண த த த த ந ப ப ப ப ம ய ர ல வ ஶ ஷ ஸ ஹ ள",
+    "ம் ஃ",
+    signs="ா ி ீ ு ூ ்ரு ்ரூ ்லு ்லூ ெ ே ை ொ ோ ௌ",
+    virama="்",
+    readings={"ன": "n", "ற": "r", "ழ": "L"},
+)
+
+re_word = re.compile(r"[^ \n\t\r]+")
+re_sup_marker = re.compile(r"<sup>[0-9]+</sup>")
+# HTML tags, wiki links, templates and entities, which are not lyrics
+re_markup = re.compile(r"(<[^<>]*>|\[\[.*?\]\]|\{\{.*?\}\}|&#?[A-Za-z0-9]+;)", re.S)
+# Words remembered per Transliterator before it starts over
+MAX_WORDS = 100000
+
+SCHEMES = {scheme.name: scheme for scheme in (HK, IAST, DEVANAGARI, TELUGU, TAMIL)}
+SCRIPTS = [name for name, scheme in SCHEMES.items() if not scheme.roman]
+
+
+class Trie:
+    """Longest-match lookup of a set of strings, compiled into a regular expression."""
+
+    def __init__(self, keys):
+        self.root = {}
+        for key in keys:
+            node = self.root
+            for char in key:
+                node = node.setdefault(char, {})
+            node[""] = None
+
+    def pattern(self, node=None):
+        """
+        The trie as a regular expression: one branch per child, so the regex
+        engine walks the trie, and the longer match is tried first wherever a
+        key is also the prefix of longer ones.
+        """
+        node = self.root if node is None else node
+        branches = [re.escape(char) + self.pattern(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:{})".format("|".join(branches))
+        return "(?:{})?".format(body) if "" in node else body
+
+    def first_chars(self):
+        return [char for char in self.root if char]
+
+    def compile(self):
+        """A regex matching the longest key at a position, else a run of text no key starts in."""
+        others = "[^{}]+".format("".join(re.escape(c) for c in self.first_chars()))
+        return re.compile("{}|{}|.".format(self.pattern(), others), re.S)
+
+
+class Transliterator:
+    """A compiled conversion of text from one scheme to another; call it on the text."""
+
+    def __init__(self, source, target):
+        self.source = SCHEMES[source]
+        self.target = SCHEMES[target]
+        self.letters = self.source.letters()
+        self.regex = Trie(self.letters).compile()
+        # Between two romanizations or two scripts every letter maps to one
+        # string, vowel signs and viramas included, and a single regex
+        # substitution does the whole conversion
+        self.direct = None
+        if self.source.roman == self.target.roman:
+            self.direct = {text: self.target.write(kind, letter) for text, (kind, letter) in self.letters.items()}
+        # word -> converted word
+        self.words = {}
+
+    def read(self, text):
+        """Yield (kind, letter, text) for text, with the script's inherent "a"s made explicit."""
+        letters = self.letters
+        inherent = False
+        for m in self.regex.finditer(text):
+            found = m.group()
+            kind, letter = letters.get(found, (OTHER, None))
+            if inherent:
+                inherent = False
+                if kind == SIGN:
+                    yield VOWEL, letter, found
+                    continue
+                if kind == VIRAMA:
+                    continue
+                yield VOWEL, "a", ""
+            if kind == CONSONANT and not self.source.roman:
+                inherent = True
+            elif kind == SIGN:
+                kind = VOWEL
+            elif kind == VIRAMA:
+                continue
+            yield kind, letter, found
+        if inherent:
+            yield VOWEL, "a", ""
+
+    def __call__(self, text):
+        return re_word.sub(self.word, text)
+
+    def word(self, m):
+        # Whitespace ends every letter, so the words of a text convert on
+        # their own, and the lyrics repeat a small vocabulary
+        word = m.group()
+        converted = self.words.get(word)
+        if converted is None:
+            if len(self.words) >= MAX_WORDS:
+                self.words.clear()
+            converted = self.words[word] = self.convert(word)
+        return converted
+
+    def convert(self, text):
+        if self.direct is not None:
+            direct = self.direct
+            return self.regex.sub(lambda m: direct.get(m.group(), m.group()), text)
+
+        target = self.target
+        out = []
+        write = out.append
+        # A consonant was written with neither a vowel sign nor a virama yet
+        bare = False
+        for kind, letter, found in self.read(text):
+            if kind == OTHER:
+                if bare:
+                    write(target.virama)
+                    bare = False
+                write(found)
+            elif target.roman:
+                write(target.write(kind, letter))
+            elif kind == CONSONANT:
+                if bare:
+                    write(target.virama)
+                write(target.consonants[letter])
+                bare = True
+            elif kind == VOWEL:
+                write(target.signs[letter] if bare else target.vowels[letter])
+                bare = False
+            else:
+                write(target.marks[letter])
+                bare = False
+        if bare:
+            write(target.virama)
+        return "".join(out)
+
+
+@functools.lru_cache(maxsize=None)
+def transliterator(source, target):
+    return Transliterator(source, target)
+
+
+def transliterate(text, source, target):
+    if source == "iast":
+        text = unicodedata.normalize("NFC", text)
+    return transliterator(source, target)(text)
+
+
+def transliterate_lyrics(text, script):
+    """HK text in script, with the markup in it left as it is."""
+    parts = re_markup.split(text)
+    # Captured markup is at the odd indexes
+    parts[::2] = [transliterate(part, "hk", script) if part else part for part in parts[::2]]
+    return "".join(parts)
+
+
+def detect(text):
+    """The scheme text is most likely in: the script of its first Indic letter, IAST, or else HK."""
+    for char in text:
+        if char < "\u0080":
+            continue
+        if "ऀ" <= char <= "ॿ":
+            return "devanagari"
+        if "ఀ" <= char <= "౿":
+            return "telugu"
+        if "஀" <= char <= "௿":
+            return "tamil"
+        return "iast"
+    return "hk"
+
+
+def normalize(value):
+    """
+    A category value in Harvard-Kyoto, the way the site spells them
+    (tyAgarAja), whether it was typed in HK, IAST or an Indic script.
+    HK and plain ASCII values are left as they are.
+    """
+    source = detect(value)
+    if source == "hk":
+        return value
+    if source == "iast":
+        value = value.lower()
+    return transliterate(value, source, "hk")
+
+
+def main():
+    argpar = argparse.ArgumentParser(description="Transliterate text between HK, IAST and Indic scripts.")
+    argpar.add_argument('text', nargs='*', help='Text to convert (default: standard input)')
+    argpar.add_argument('-f', '--source', choices=sorted(SCHEMES), help='Scheme of the text (default: detected)')
+    argpar.add_argument('-t', '--target', choices=sorted(SCHEMES), required=True, help='Scheme to convert to')
+    args = argpar.parse_args()
+
+    text = " ".join(args.text) if args.text else sys.stdin.read()
+    print(transliterate(text, args.source or detect(text), args.target), end="" if not args.text else "\n")
+
+if __name__ == '__main__':
+    main()
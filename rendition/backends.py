@@ -0,0 +1,142 @@
+"""
+Search backends for YouTubeClient: what actually answers its HTTP requests.
+
+A backend is anything with get(url, params, timeout) returning a response
+(status_code, headers, text and json()) and close(), which is the part of
+requests.Session the client uses. Three are provided:
+
+LiveBackend     the YouTube Data API over a pooled requests.Session
+RecordingBackend  passes through to another backend and saves every
+                successful response as a fixture file
+ReplayBackend   answers from fixture files (or made-up results for queries
+                without one), optionally slowed down and failing at a given
+                rate, for testing and load-testing without network or quota
+
+Search fixtures are named like the search cache entries, by the normalized
+query and result count, so fixtures recorded on one machine replay on
+another. Video detail fixtures (durations) are named by the video ids.
+"""
+import hashlib
+import json
+import os
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rendition.cache import query_key
+
+
+class LiveBackend(requests.Session):
+    def __init__(self, pool_size=4):
+        super().__init__()
+        self.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+
+class Response:
+    """The parts of requests.Response that YouTubeClient looks at."""
+
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self.data = data if data is not None else {}
+        self.headers = headers or {}
+        self.text = json.dumps(self.data)
+
+    def json(self):
+        return self.data
+
+
+def fixture_path(fixtures, params):
+    if "q" in params:
+        return os.path.join(fixtures, query_key(params["q"], params["maxResults"]) + ".json")
+    return os.path.join(fixtures, hashlib.sha256(params["id"].encode()).hexdigest() + ".json")
+
+
+class RecordingBackend:
+    def __init__(self, fixtures, backend=None):
+        self.fixtures = fixtures
+        self.backend = backend or LiveBackend()
+        self.recorded = 0
+        os.makedirs(fixtures, exist_ok=True)
+
+    def get(self, url, params, timeout):
+        response = self.backend.get(url, params=params, timeout=timeout)
+        if response.status_code == 200:
+            # The API key stays out of the fixture
+            fixture = {"params": {k: v for k, v in params.items() if k != "key"}, "body": response.json()}
+            with open(fixture_path(self.fixtures, params), "w") as f:
+                json.dump(fixture, f, indent=1)
+            self.recorded += 1
+        return response
+
+    def close(self):
+        self.backend.close()
+
+
+def stub_durations(ids):
+    """Made-up but stable durations, between one and twenty minutes."""
+    items = []
+    for video_id in ids.split(","):
+        seconds = 60 + int(hashlib.sha256(video_id.encode()).hexdigest(), 16) % (19 * 60)
+        items.append({"id": video_id, "contentDetails": {"duration": "PT{}M{}S".format(seconds // 60, seconds % 60)}})
+    return {"items": items}
+
+
+def stub_results(query, max_results):
+    """Made-up but stable search results for query."""
+    items = []
+    for idx in range(max_results):
+        video_id = hashlib.sha256("{}\n{}".format(query, idx).encode()).hexdigest()[:11]
+        items.append({
+            "id": {"videoId": video_id},
+            "snippet": {"title": "{} ({})".format(query, idx + 1), "channelTitle": "Stub channel {}".format(idx % 3),
+                        "publishedAt": "2020-01-01T00:00:00Z"},
+        })
+    return {"items": items}
+
+
+class ReplayBackend:
+    """
+    Answers from the fixtures in the fixtures directory, if any. Queries
+    without a fixture get stub_results, or a 404 when stub is False.
+
+    Each request takes latency seconds (jittered by +/-50%), and with
+    probability error_rate fails instead, as a 503, a 429 or a timeout.
+    """
+
+    def __init__(self, fixtures=None, latency=0.0, error_rate=0.0, stub=True, seed=None, sleep=time.sleep):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.error_rate = error_rate
+        self.stub = stub
+        self.random = random.Random(seed)
+        self.sleep = sleep
+        self.requests = 0
+        self.failures = 0
+
+    def get(self, url, params, timeout):
+        self.requests += 1
+        if self.latency:
+            self.sleep(self.latency * self.random.uniform(0.5, 1.5))
+        if self.random.random() < self.error_rate:
+            self.failures += 1
+            error = self.random.choice(("503", "429", "timeout"))
+            if error == "timeout":
+                raise requests.Timeout("Injected timeout")
+            return Response(int(error), {"error": "Injected failure"})
+
+        if self.fixtures:
+            try:
+                with open(fixture_path(self.fixtures, params)) as f:
+                    return Response(200, json.load(f)["body"])
+            except FileNotFoundError:
+                pass
+        if not self.stub:
+            return Response(404, {"error": "No fixture for '{}'".format(params.get("q") or params["id"])})
+        if "q" in params:
+            return Response(200, stub_results(params["q"], params["maxResults"]))
+        return Response(200, stub_durations(params["id"]))
+
+    def close(self):
+        pass
@@ -0,0 +1,75 @@
+"""
+On-disk cache of YouTube search results, so rerunning the rendition manager
+over songs it already searched costs no API quota (each search is 100 units).
+
+Entries are small JSON files named by the SHA-256 of the normalized query
+(lowercased, whitespace collapsed), the number of results asked for and
+whether video durations were looked up. An entry older than ttl seconds
+counts as a miss and is searched again. Size bounds and eviction are those
+of migrator.dircache, as for the parse cache.
+"""
+import hashlib
+import json
+import os
+import time
+
+from migrator.dircache import DirectoryCache
+
+DEFAULT_TTL = 30 * 24 * 60 * 60
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+def query_key(query, max_results, durations=False):
+    key = "{}\n{}".format(normalize_query(query), max_results)
+    if durations:
+        # Results without durations would leave the ranker nothing to penalize
+        key += "\ndurations"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class SearchCache(DirectoryCache):
+    SUFFIX = ".json"
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES, clock=time.time):
+        super().__init__(path, max_bytes)
+        self.ttl = ttl
+        self.clock = clock
+        self.expired = 0
+        self.evict()
+
+    def entry(self, query, max_results, durations=False):
+        return os.path.join(self.path, query_key(query, max_results, durations) + self.SUFFIX)
+
+    def get(self, query, max_results=5, durations=False):
+        """The cached results for query, or None if there are none or they are older than the TTL."""
+        path = self.entry(query, max_results, durations)
+        try:
+            with open(path) as f:
+                cached = json.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except ValueError:
+            # Truncated entry: search again
+            self.remove(path)
+            self.misses += 1
+            return None
+        if self.clock() - cached["fetched_at"] > self.ttl:
+            self.expired += 1
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return cached["results"]
+
+    def put(self, query, results, max_results=5, durations=False):
+        cached = {"query": normalize_query(query), "fetched_at": self.clock(), "results": results}
+        self.write(self.entry(query, max_results, durations), lambda f: json.dump(cached, f))
+
+    def report(self):
+        return "Search cache: {} hits, {} misses ({} expired, {:.0%} hit rate), {} evicted".format(
+            self.hits, self.misses, self.expired, self.hit_rate(), self.evicted)
@@ -3,11 +3,22 @@ import csv
 import os.path
 import sys
 import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import rendition.parser as parser
 import rendition.youtube as youtube
+from rendition.backends import LiveBackend, RecordingBackend, ReplayBackend
+from rendition.cache import SearchCache
+from rendition.ranking import Ranker, read_channels
+from rendition.scan import scan
+from migrator.metrics import Metrics, timed
+from migrator.output import SKIPPED, OutputStats, write_if_changed
+from migrator.profiler import GrammarProfiler, enable_packrat, packrat_size
+from migrator.state import COMPLETED, FAILED, REVIEW, StateStore
 
 FILE_COMPLETED = "/Users/srikanth/Code/sahityam/renditions/completed.txt"
 FILE_FAILED = "/Users/srikanth/Code/sahityam/renditions/failed.txt"
+FILE_REVIEW = "/Users/srikanth/Code/sahityam/renditions/review.txt"
 PATH_INPUT = "/Users/srikanth/Code/sahityam/renditions/input/"
 PATH_CONVERTED = "/Users/srikanth/Code/sahityam/renditions/output/"
 
@@ -23,7 +34,8 @@ class SongList:
     def __contains__(self, song):
         return song in self.songs
 
-    def append(self, song):
+    def append(self, song, **details):
+        # details (error, output path, ...) are only kept by the StateStore lists
         if song in self.songs: return
         with open(self.file, 'a') as f:
             f.write(song + "\n")
@@ -52,46 +64,268 @@ def get_queue(args):
     return queue
 
 
-def write_file(name, content):
-    with open(os.path.join(PATH_CONVERTED, "{}".format(name)), "w") as f:
-        f.write(content)
+def write_file(name, content, stats=None):
+    path = os.path.join(PATH_CONVERTED, "{}".format(name))
+    # Songs found by --scan can sit in subdirectories
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    outcome = write_if_changed(path, content)
+    if stats:
+        stats.record(outcome)
+    return path
+
+def prepare(song, grammar_profile=None, engine="splitter"):
+    """Parse a song and build its search query, which is None if the song already has renditions."""
+    try:
+        parsed_song = parser.parse(PATH_INPUT + song, engine)[0]
+    finally:
+        if grammar_profile:
+            print(grammar_profile.report_file(song))
+    if parsed_song.is_valid():
+        return parsed_song, None
+    return parsed_song, "{} {}".format(song_title(song), parsed_song.raga())
+
+def song_title(song):
+    return os.path.basename(song).replace("-", " ").replace(".md", "")
+
+def auto_pick(song, parsed_song, videos, ranker):
+    """The id of the video ranker accepts for the song, or None if it needs a human."""
+    video, ranked = ranker.pick(song_title(song), parsed_song.raga().strip(), videos)
+    for candidate in ranked:
+        print("  {:.0%} {} Channel: {}".format(candidate.score, candidate.video["title"], candidate.video["channel"]))
+    if video is None:
+        return None
+    print("Picked {}".format(video["video_url"]))
+    return youtube.parse_id(video["video_url"])
+
+class SearchAhead:
+    """
+    Runs the searches of up to depth upcoming songs on a thread pool while the
+    operator picks a rendition for the current one. With depth 0 searches run
+    inline when their result is asked for, as before. Results come with the
+    seconds the search itself took, waiting in the pool not included.
+    """
+    def __init__(self, client, depth):
+        self.client = client
+        self.pool = ThreadPoolExecutor(max_workers=depth, thread_name_prefix="search") if depth else None
+
+    def submit(self, query):
+        return self.pool.submit(timed, self.client.search, query) if self.pool else None
+
+    def result(self, query, future):
+        return future.result() if future else timed(self.client.search, query)
+
+    def close(self, cancel=False):
+        if self.pool:
+            self.pool.shutdown(wait=not cancel, cancel_futures=cancel)
+
+def process(queue, completed, failed, client, stats, prefetch=0, grammar_profile=None, ranker=None, review=None,
+            engine="splitter", metrics=None):
+    """
+    Add a picked rendition to every song in queue. Songs up to prefetch ahead
+    of the current one are parsed and searched already; they are still handled
+    one at a time in queue order, so completed keeps the queue order.
+
+    With a ranker, renditions are picked without asking, and songs without a
+    clear winner are added to review instead.
+    """
+    metrics = metrics or Metrics("rendition")
+    searches = SearchAhead(client, prefetch)
+    songs = iter(queue)
+    # (song, parsed song, query, search future, parse error) of the songs ahead, in queue order
+    window = deque()
+
+    def fill():
+        while len(window) <= prefetch:
+            song = next(songs, None)
+            if song is None:
+                return
+            if song in completed:
+                window.append((song, None, None, None, None))
+                continue
+            try:
+                with metrics.stage(song, "parse"):
+                    parsed_song, query = prepare(song, grammar_profile, engine)
+            except Exception as e:
+                window.append((song, None, None, None, e))
+                continue
+            window.append((song, parsed_song, query, searches.submit(query) if query else None, None))
+
+    cancelled = True
+    try:
+        fill()
+        while window:
+            song, parsed_song, query, future, error = window.popleft()
+            fill()
+            if not parsed_song and not error:
+                print("Skipping {} since it's already processed.".format(song))
+                stats.record(SKIPPED)
+                continue
+
+            try:
+                print("\nProcessing", song)
+                if error:
+                    raise error
+                if not query:
+                    print("The song {} has valid renditions. Skipping".format(song))
+                    completed.append(song, source=PATH_INPUT + song)
+                    stats.record(SKIPPED)
+                    continue
+
+                print("Searching for '{}'".format(query))
+                try:
+                    videos, seconds = searches.result(query, future)
+                    metrics.observe(song, "search", seconds)
+                except youtube.NotCached:
+                    print("Skipping {} since its search is not cached".format(song))
+                    stats.record(SKIPPED)
+                    continue
+                with metrics.stage(song, "pick"):
+                    video_id = auto_pick(song, parsed_song, videos, ranker) if ranker else youtube.choose_rendition(videos)
+                if ranker and video_id is None:
+                    print("Leaving {} for review".format(song))
+                    review.append(song)
+                    stats.record(SKIPPED)
+                    metrics.count("review")
+                    continue
+                if not video_id:
+                    print("Skipping ()".format(song))
+                    stats.record(SKIPPED)
+                    continue
+                parsed_song.set_renditions("{{<youtube \"%s\" >}}\n" % (video_id,))
+                with metrics.stage(song, "render"):
+                    content = parsed_song.to_new()
+                with metrics.stage(song, "write"):
+                    path = write_file(song, content, stats)
+                completed.append(song, source=PATH_INPUT + song, output_path=path)
+                metrics.count("completed")
+            except Exception as e:
+                print("Failed converting or writing song {} due to {}".format(song, e))
+                failed.append(song, error_type=type(e).__name__, error=str(e))
+                metrics.count("failed")
+                traceback.print_exc()
+        cancelled = False
+    finally:
+        if cancelled:
+            # Interrupted (Ctrl-C at the prompt): drop the searches nobody will look at
+            print("Cancelling {} prefetched searches".format(sum(1 for entry in window if entry[3])))
+        searches.close(cancel=cancelled)
+
+BACKENDS = ("live", "record", "replay")
+
+def make_backend(args):
+    if args.backend == "record":
+        return RecordingBackend(args.fixtures, LiveBackend(max(4, args.prefetch)))
+    if args.backend == "replay":
+        return ReplayBackend(args.fixtures, args.stub_latency / 1000, args.stub_error_rate)
+    return LiveBackend(max(4, args.prefetch))
+
+def report_run(args, client, search_cache, stats, metrics):
+    client.close()
+    print(client.report())
+    metrics.add_latencies("youtube", client.latencies)
+    metrics.add_counts({"requests": len(client.latencies), "retried": client.retried})
+    if search_cache:
+        search_cache.close()
+        print(search_cache.report())
+        metrics.add_counts({"cache_hits": search_cache.hits, "cache_misses": search_cache.misses})
+    metrics.add_counts(stats.counts)
+    print(stats.report())
+    print(metrics.report())
+    if args.metrics:
+        metrics.write_json(args.metrics)
+    if args.prometheus:
+        metrics.write_prometheus(args.prometheus)
 
 def main():
     argpar = argparse.ArgumentParser(description="Process a file path.")
     argpar.add_argument('-f', '--file', required=False, help='Path to the input file')
     argpar.add_argument('-s', '--song', required=False, help='The song file to process')
+    argpar.add_argument('--scan', metavar='DIR', help='Process every page below DIR whose Renditions section has no video')
+    argpar.add_argument('-e', '--engine', choices=parser.ENGINES, default="splitter", help='Parser engine to use')
+    argpar.add_argument('-p', '--profile', action='store_true', help='Report per-rule grammar timings per song and per run (pyparsing engine)')
+    argpar.add_argument('--packrat', type=packrat_size, metavar='SIZE', help='Enable packrat memoization with a cache of SIZE entries')
+    argpar.add_argument('--timeout', type=float, default=10, metavar='SECONDS', help='Read timeout for YouTube searches (default 10)')
+    argpar.add_argument('--retries', type=int, default=4, help='Retries of a YouTube search after a timeout, 429 or 5xx (default 4)')
+    argpar.add_argument('--search-cache', metavar='DIR', help='Reuse YouTube search results cached in DIR')
+    argpar.add_argument('--search-ttl', type=float, default=30, metavar='DAYS', help='Search again once cached results are this old (default 30)')
+    argpar.add_argument('--search-cache-size', type=int, default=64, metavar='MB', help='Size cap of the search cache (default 64)')
+    argpar.add_argument('--offline', action='store_true', help='Only use cached search results; skip songs that have none')
+    argpar.add_argument('--prefetch', type=int, default=0, metavar='N', help='Search for the next N songs while a rendition is being picked')
+    argpar.add_argument('--backend', choices=BACKENDS, default="live", help='Search the API, search it and save fixtures, or replay fixtures offline')
+    argpar.add_argument('--fixtures', metavar='DIR', help='Fixture directory for --backend record/replay')
+    argpar.add_argument('--stub-latency', type=float, default=0, metavar='MS', help='Latency of each replayed search (default 0)')
+    argpar.add_argument('--stub-error-rate', type=float, default=0, metavar='RATE', help='Fraction of replayed searches that fail (default 0)')
+    argpar.add_argument('--auto', action='store_true', help='Pick renditions by score without asking; leave unclear ones for review')
+    argpar.add_argument('--threshold', type=float, default=0.8, help='Score from which --auto accepts a video (default 0.8)')
+    argpar.add_argument('--margin', type=float, default=0.1, help='Lead over the runner-up --auto needs to accept a video (default 0.1)')
+    argpar.add_argument('--allow-channels', metavar='FILE', help='Channels, one per line, whose videos score higher')
+    argpar.add_argument('--block-channels', metavar='FILE', help='Channels, one per line, whose videos are never picked')
+    argpar.add_argument('--min-duration', type=int, metavar='SECONDS', help='Score videos shorter than this lower (looks up durations)')
+    argpar.add_argument('--max-duration', type=int, metavar='SECONDS', help='Score videos longer than this lower (looks up durations)')
+    argpar.add_argument('--review', default=FILE_REVIEW, metavar='FILE', help='Where --auto lists the songs left for review')
+    argpar.add_argument('--state', metavar='DB', help='Keep completed/failed songs in this SQLite database instead of the text files')
+    argpar.add_argument('--metrics', metavar='FILE', help='Write per-song stage timings, counters and histograms of the run to FILE as JSON')
+    argpar.add_argument('--prometheus', metavar='FILE', help='Write the run metrics to FILE in the Prometheus textfile format')
     args = argpar.parse_args()
+    if args.scan and (args.file or args.song):
+        argpar.error("--scan replaces --file and --song")
+    if args.profile and args.engine != "pyparsing":
+        argpar.error("--profile needs --engine pyparsing")
+    if args.offline and not args.search_cache:
+        argpar.error("--offline needs --search-cache")
+    if args.prefetch < 0:
+        argpar.error("--prefetch cannot be negative")
+    if args.backend == "record" and not args.fixtures:
+        argpar.error("--backend record needs --fixtures")
 
-    completed = SongList("Completed", FILE_COMPLETED)
-    failed = SongList("Failed", FILE_FAILED)
-    queue = get_queue(args)
-    from pprint import pprint
-    for song in queue:
-        if song in completed:
-            print("Skipping {} since it's already processed.".format(song))
-            continue
+    if args.packrat is not None:
+        enable_packrat(args.packrat)
+    grammar_profile = GrammarProfiler(parser.pat_song, vars(parser)) if args.profile else None
+    if grammar_profile:
+        grammar_profile.start()
 
-        try:
-            print("\nProcessing", song)
-            parsed_song = parser.parse(PATH_INPUT + song)[0]
-            if parsed_song.is_valid():
-                print("The song {} has valid renditions. Skipping".format(song))
-                completed.append(song)
-                continue
-
-            query_exp = "{} {}".format(song.replace("-", " ").replace(".md", ""), parsed_song.raga())
-            print("Searching for '{}'".format(query_exp))
-            video_id = youtube.find_renditions(query_exp)
-            if not video_id:
-                print("Skipping ()".format(song))
-                continue
-            parsed_song.set_renditions("{{<youtube \"%s\" >}}\n" % (video_id,))
-            write_file(song, parsed_song.to_new())
-            completed.append(song)
-        except Exception as e:
-            print("Failed converting or writing song {} due to {}".format(song, e))
-            failed.append(song)
-            traceback.print_exc()
+    store = StateStore(args.state) if args.state else None
+    if store:
+        completed = store.song_list("rendition", COMPLETED)
+        failed = store.song_list("rendition", FAILED)
+    else:
+        completed = SongList("Completed", FILE_COMPLETED)
+        failed = SongList("Failed", FILE_FAILED)
+    ranker = review = None
+    if args.auto:
+        ranker = Ranker(read_channels(args.allow_channels), read_channels(args.block_channels), args.threshold,
+                        args.margin, args.min_duration, args.max_duration)
+        if store:
+            review = store.song_list("rendition", REVIEW)
+        else:
+            open(args.review, "a").close()
+            review = SongList("Review", args.review)
+    stats = OutputStats()
+    metrics = Metrics("rendition")
+    search_cache = None
+    if args.search_cache:
+        search_cache = SearchCache(args.search_cache, args.search_ttl * 24 * 60 * 60, args.search_cache_size * 1024 * 1024)
+    client = youtube.YouTubeClient(youtube.API_KEY, timeout=(3.05, args.timeout), retries=args.retries,
+                                   backend=make_backend(args), cache=search_cache, offline=args.offline,
+                                   durations=bool(args.auto and (args.min_duration or args.max_duration)))
+    if args.scan:
+        global PATH_INPUT
+        PATH_INPUT = os.path.join(args.scan, "")
+        queue = scan(args.scan)
+        print("Found {} pages without renditions in {}".format(len(queue), args.scan))
+    else:
+        queue = get_queue(args)
+    try:
+        process(queue, completed, failed, client, stats, args.prefetch, grammar_profile, ranker, review, args.engine,
+                metrics)
+    finally:
+        # Also after Ctrl-C at a prompt, so the results and metrics so far are kept
+        if store:
+            store.close()
+        report_run(args, client, search_cache, stats, metrics)
+    if grammar_profile:
+        grammar_profile.stop()
+        print(grammar_profile.report_run())
 
 if __name__ == '__main__':
     main()
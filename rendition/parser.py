@@ -34,7 +34,8 @@ class Song:
         return cls(parsed.get("head")[0], "".join(parsed.get("sahityam")), parsed.get("middle")[0][0], parsed.get("renditions"), "")
 
     def is_valid(self):
-        return "{{<youtube" in self.renditions
+        # renditions is the parsed one-item group until set_renditions replaces it with a string
+        return "{{<youtube" in "".join(self.renditions)
 
     def set_renditions(self, updated):
         self.renditions = updated
@@ -66,8 +67,18 @@ class Head:
         return cls(**kvp)
 
 
-def parse(file_path):
+ENGINES = ("splitter", "pyparsing")
+
+def parse_song(text, engine="splitter"):
+    if engine == "splitter":
+        # Imported here since rendition.splitter builds on the classes above
+        from rendition.splitter import parse_song as split_song
+        return split_song(text)
+    if engine != "pyparsing":
+        raise ValueError("Unknown parser engine: {}".format(engine))
+    return pat_song.parse_string(text)[0]
+
+def parse(file_path, engine="splitter"):
     with open(file_path) as f:
         text = f.read()
-        song = pat_song.parse_string(text)
-        return song
+        return [parse_song(text, engine)]
@@ -0,0 +1,91 @@
+"""
+Scoring of YouTube search results against the song they were searched for,
+so that clear matches can be accepted without asking the operator.
+
+A video's score is how much of the song title, and of the raga, shows up in
+its title: the share of the name's trigrams (after migrator.fuzzy.normalize,
+which also irons out spacing and transliteration differences) that the
+video title contains. The title counts for 70% and the raga for 30%. A
+channel on the allow list adds ALLOW_BONUS to that, so a perfect match from
+it scores above 1 and still ranks ahead of the same title from anyone else.
+A duration outside the accepted range, when durations are known, costs
+DURATION_PENALTY. Videos from a channel on the block list are dropped.
+
+The best video is accepted when it scores at least threshold and beats the
+runner-up by at least margin; anything else is left for review.
+"""
+from collections import namedtuple
+
+from migrator.fuzzy import normalize, trigrams
+
+TITLE_WEIGHT = 0.7
+RAGA_WEIGHT = 0.3
+ALLOW_BONUS = 0.15
+DURATION_PENALTY = 0.3
+
+Candidate = namedtuple("Candidate", ["score", "video"])
+
+
+def containment(name, text):
+    """Share of name's trigrams found in text, both normalized."""
+    normalized = normalize(name)
+    if not normalized:
+        return 0.0
+    # Padded trigrams only match at the very ends of text, so leave them out
+    name_grams = {g for g in trigrams(normalized) if " " not in g} or trigrams(normalized)
+    text_grams = trigrams(normalize(text))
+    return len(name_grams & text_grams) / len(name_grams)
+
+
+def read_channels(path):
+    if not path:
+        return set()
+    with open(path) as f:
+        return {line.strip().lower() for line in f if line.strip()}
+
+
+class Ranker:
+    def __init__(self, allow=(), block=(), threshold=0.8, margin=0.1, min_duration=None, max_duration=None):
+        self.allow = {c.lower() for c in allow}
+        self.block = {c.lower() for c in block}
+        self.threshold = threshold
+        self.margin = margin
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+
+    def score(self, title, raga, video):
+        """Score of video for the song, or None if its channel is blocked."""
+        channel = video["channel"].lower()
+        if channel in self.block:
+            return None
+        if raga:
+            match = TITLE_WEIGHT * containment(title, video["title"]) + RAGA_WEIGHT * containment(raga, video["title"])
+        else:
+            match = containment(title, video["title"])
+        score = min(1.0, match)
+        if channel in self.allow:
+            score += ALLOW_BONUS
+        duration = video.get("duration")
+        if duration is not None:
+            if (self.min_duration and duration < self.min_duration) or (self.max_duration and duration > self.max_duration):
+                score -= DURATION_PENALTY
+        return max(0.0, score)
+
+    def rank(self, title, raga, videos):
+        """Candidates for the song, best first, without blocked channels."""
+        ranked = []
+        for video in videos:
+            score = self.score(title, raga, video)
+            if score is not None:
+                ranked.append(Candidate(score, video))
+        ranked.sort(key=lambda c: c.score, reverse=True)
+        return ranked
+
+    def pick(self, title, raga, videos):
+        """Returns (the video to accept or None if it needs review, the ranked candidates)."""
+        ranked = self.rank(title, raga, videos)
+        if not ranked or ranked[0].score < self.threshold:
+            return None, ranked
+        if len(ranked) > 1 and ranked[0].score - ranked[1].score < self.margin:
+            return None, ranked
+        return ranked[0].video, ranked
@@ -0,0 +1,83 @@
+"""
+Finds the pages of a Hugo content tree that still need a rendition, without
+parsing them: a page needs one when its Renditions section has no
+``{{<youtube`` shortcode.
+
+Each page is memory-mapped and searched in place for the headers
+rendition.parser looks for: ``## Sahityam``, then ``## Variations`` (or else
+``## Commentary``), then ``## Renditions``, whose section ends at the next
+``##`` followed by a letter or digit. Then it checks for the shortcode
+between those two offsets. Pages without those headers are left out; the parser would reject
+them anyway. Files are checked on a thread pool, and the result is sorted,
+so a scan always gives the same queue.
+
+    python -m rendition.scan content/songs > queue.txt
+"""
+import argparse
+import mmap
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+SAHITYAM = b"## Sahityam"
+VARIATIONS = b"## Variations"
+COMMENTARY = b"## Commentary"
+RENDITIONS = b"## Renditions"
+YOUTUBE = b"{{<youtube"
+re_section_end = re.compile(rb"##[ \n\t\r]*[A-Za-z0-9]")
+
+
+def walk(root, suffix=".md"):
+    """Paths of all pages below root, relative to it."""
+    stack = [""]
+    while stack:
+        relative = stack.pop()
+        with os.scandir(os.path.join(root, relative)) as entries:
+            for entry in entries:
+                path = os.path.join(relative, entry.name)
+                if entry.is_dir():
+                    stack.append(path)
+                elif entry.name.endswith(suffix) and entry.is_file():
+                    yield path
+
+
+def needs_rendition(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as page:
+            sahityam = page.find(SAHITYAM)
+            if sahityam < 0:
+                return False
+            middle = page.find(VARIATIONS, sahityam)
+            if middle < 0:
+                middle = page.find(COMMENTARY, sahityam)
+            if middle < 0:
+                return False
+            start = page.find(RENDITIONS, middle)
+            if start < 0:
+                return False
+            start += len(RENDITIONS)
+            end = re_section_end.search(page, start)
+            return page.find(YOUTUBE, start, end.start() if end else len(page)) < 0
+
+
+def scan(root, jobs=None):
+    """Sorted paths, relative to root, of the pages that need a rendition."""
+    pages = sorted(walk(root))
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        flags = pool.map(needs_rendition, [os.path.join(root, page) for page in pages])
+        return [page for page, needed in zip(pages, flags) if needed]
+
+
+def main():
+    argpar = argparse.ArgumentParser(description="List the pages that still need a rendition.")
+    argpar.add_argument('root', help='Content directory to scan')
+    argpar.add_argument('-j', '--jobs', type=int, help='Threads to scan with (default: based on the CPU count)')
+    args = argpar.parse_args()
+    for page in scan(args.root, args.jobs):
+        print(page)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Single-pass section splitter for the Hugo song pages the rendition manager
+edits.
+
+Finds every ``##`` in the page once, notes which header each one starts, and
+answers "next header at or after offset" by bisecting those lists instead of
+re-scanning the rest of the page for every SkipTo in rendition.parser. The
+sections are kept as offsets and only sliced out (and the front matter only
+split into fields) when a Song attribute is first read.
+
+The splitter mirrors the pyparsing grammar exactly, quirks included: tabs
+are expanded first, whitespace is skipped in front of every element, a
+missing ``## Variations`` falls back to ``## Commentary`` anywhere after the
+Sahityam header, the renditions run to the next ``##`` followed by a letter
+or digit (or to the end), and anything after that is dropped.
+"""
+import re
+from bisect import bisect_left
+
+from pyparsing import ParseException
+
+from rendition.parser import Head, Song
+
+SAHITYAM = "## Sahityam"
+VARIATIONS = "## Variations"
+COMMENTARY = "## Commentary"
+RENDITIONS = "## Renditions"
+HEADERS = (SAHITYAM, VARIATIONS, COMMENTARY, RENDITIONS)
+
+# pyparsing defaults: whitespace is " \n\t\r", alphanums is ASCII
+re_ws = re.compile(r"[ \n\t\r]*")
+# Every "##", overlapping ones too, as in "###"
+re_hashes = re.compile(r"(?=##)")
+# Group(Literal("##") + Word(alphanums + " ")): the header that ends the renditions
+re_prose_header = re.compile(r"##[ \n\t\r]*[A-Za-z0-9]")
+
+
+class Sections:
+    """Offsets of every header in a page, collected in one pass."""
+
+    def __init__(self, text):
+        self.text = text
+        self.headers = {name: [] for name in HEADERS}
+        self.prose = []
+        for match in re_hashes.finditer(text):
+            pos = match.start()
+            for name in HEADERS:
+                if text.startswith(name, pos):
+                    self.headers[name].append(pos)
+            if re_prose_header.match(text, pos):
+                self.prose.append(pos)
+
+    @staticmethod
+    def first(positions, loc):
+        idx = bisect_left(positions, loc)
+        return positions[idx] if idx < len(positions) else -1
+
+    def find(self, name, loc):
+        """Offset of the first name header at or after loc, or -1."""
+        return self.first(self.headers[name], loc)
+
+    def find_prose(self, loc):
+        return self.first(self.prose, loc)
+
+    def skip_ws(self, loc):
+        return re_ws.match(self.text, loc).end()
+
+    def expect(self, name, loc):
+        found = self.find(name, loc)
+        if found < 0:
+            raise ParseException(self.text, loc, "Expected '{}'".format(name))
+        return found
+
+
+class SplitSong(Song):
+    """A rendition.parser.Song whose sections are sliced from the page on first use."""
+
+    def __init__(self, text):
+        sections = Sections(text.expandtabs())
+        start = sections.skip_ws(0)
+        sahityam_header = sections.expect(SAHITYAM, start)
+        sahityam_start = sections.skip_ws(sahityam_header + len(SAHITYAM))
+        sahityam_end = sections.find(VARIATIONS, sahityam_start)
+        if sahityam_end < 0:
+            sahityam_end = sections.expect(COMMENTARY, sahityam_start)
+        renditions_header = sections.expect(RENDITIONS, sahityam_end)
+        renditions_start = sections.skip_ws(renditions_header + len(RENDITIONS))
+        renditions_end = sections.find_prose(renditions_start)
+        if renditions_end < 0:
+            renditions_end = len(sections.text)
+
+        self.sections = sections
+        self.spans = {
+            "head": (start, sahityam_header),
+            "sahityam": (sahityam_start, sahityam_end),
+            "middle": (sahityam_end, renditions_header),
+        }
+        self.renditions_span = (renditions_start, renditions_end)
+        self.tail = ""
+
+    def __getattr__(self, name):
+        # Only called for attributes not set yet: slice them out once
+        if name in ("sections", "spans", "renditions_span"):
+            raise AttributeError(name)
+        if name in self.spans:
+            start, end = self.spans[name]
+            value = self.sections.text[start:end]
+        elif name == "renditions":
+            start, end = self.renditions_span
+            # The grammar hands renditions over as a one-item group
+            value = [self.sections.text[start:end]]
+        elif name == "obj_head":
+            value = Head.from_string(self.head)
+        else:
+            raise AttributeError(name)
+        setattr(self, name, value)
+        return value
+
+
+def parse_song(text):
+    return SplitSong(text)
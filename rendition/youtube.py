@@ -1,33 +1,139 @@
+import email.utils
+import os
+import random
+import re
+import time
+
 import requests
 from pyparsing import Literal, SkipTo, StringEnd, Group
 
+from rendition.backends import LiveBackend
+
 pat_videoid = Literal("https://www.youtube.com/watch?v=").suppress() + Group(SkipTo(StringEnd()))("video_id")
 
-def search_youtube(api_key, search_query):
+SEARCH_URL = "https://www.googleapis.com/youtube/v3/search"
+VIDEOS_URL = "https://www.googleapis.com/youtube/v3/videos"
+# Your YouTube Data API key
+API_KEY = os.environ.get("YOUTUBE_API_KEY", "")
+
+# Rate limited or a server side hiccup: worth asking again
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+re_duration = re.compile(r"P(?:(\d+)D)?T?(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?")
+
+def parse_duration(value):
+    """Seconds in an ISO 8601 duration such as PT1H4M13S, as the API reports them."""
+    match = re_duration.fullmatch(value or "")
+    if not match:
+        return None
+    days, hours, minutes, seconds = (int(g or 0) for g in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+class YouTubeError(Exception):
+    pass
+
+
+class NotCached(YouTubeError):
+    """Raised for a search missing from the cache when the client may not go online."""
+
+
+def retry_after(response):
+    """Seconds the server asked us to wait, from a Retry-After of seconds or an HTTP date, or None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return int(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class YouTubeClient:
     """
-    Searches YouTube for a given query and returns the top 5 matches.
+    Searches the YouTube Data API through a search backend (see
+    rendition.backends), by default one pooled keep-alive session, so a run
+    pays for the TLS handshake once instead of per song.
 
-    :param api_key: Your YouTube Data API key.
-    :param search_query: The search term.
-    :return: A list of dictionaries containing video details.
+    Timeouts, 429s and 5xx responses are retried up to retries times with
+    full-jitter exponential backoff (a random wait below backoff * 2**attempt,
+    capped at max_backoff), or as long as the server's Retry-After says.
+    Every request's latency is kept for report().
+
+    With a rendition.cache.SearchCache, searches are answered from it when
+    possible; offline=True answers only from it and raises NotCached otherwise.
+
+    durations=True looks up the length of the found videos too, with one more
+    request per search (1 quota unit), and adds it to each result in seconds.
     """
-    url = "https://www.googleapis.com/youtube/v3/search"
-
-    # Parameters for the API request
-    params = {
-        "part": "snippet",
-        "q": search_query,
-        "type": "video",
-        "maxResults": 5,
-        "key": api_key,
-    }
-
-    # Making the request to the YouTube API
-    response = requests.get(url, params=params)
-
-    if response.status_code == 200:
-        # Parse the JSON response
-        data = response.json()
+
+    def __init__(self, api_key, timeout=(3.05, 10), retries=4, backoff=0.5, max_backoff=30,
+                 backend=None, sleep=time.sleep, cache=None, offline=False, pool_size=4, durations=False):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.sleep = sleep
+        self.cache = cache
+        self.offline = offline
+        self.durations = durations
+        self.backend = backend or LiveBackend(pool_size)
+        self.latencies = []
+        self.retried = 0
+
+    def delay(self, attempt, response=None):
+        if response is not None:
+            wait = retry_after(response)
+            if wait is not None:
+                return min(wait, self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def get(self, url, params):
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                response = self.backend.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.latencies.append(time.perf_counter() - start)
+                if attempt == self.retries:
+                    raise YouTubeError("Giving up after {} attempts: {}".format(attempt + 1, e)) from e
+                response = None
+            else:
+                self.latencies.append(time.perf_counter() - start)
+                if response.status_code == 200:
+                    return response
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    raise YouTubeError("Error: {}, {}".format(response.status_code, response.text))
+            self.retried += 1
+            self.sleep(self.delay(attempt, response))
+
+    def search(self, search_query, max_results=5):
+        """
+        Searches YouTube for a given query and returns the top matches.
+
+        :param search_query: The search term.
+        :return: A list of dictionaries containing video details.
+        """
+        if self.cache:
+            results = self.cache.get(search_query, max_results, self.durations)
+            if results is not None:
+                return results
+        if self.offline:
+            raise NotCached("No cached results for '{}'".format(search_query))
+
+        params = {
+            "part": "snippet",
+            "q": search_query,
+            "type": "video",
+            "maxResults": max_results,
+            "key": self.api_key,
+        }
+        data = self.get(SEARCH_URL, params).json()
         results = []
         for item in data.get("items", []):
             video_details = {
@@ -37,18 +143,57 @@ def search_youtube(api_key, search_query):
                 "video_url": f"https://www.youtube.com/watch?v={item['id']['videoId']}"
             }
             results.append(video_details)
+        if self.durations and results:
+            self.add_durations(results)
+        if self.cache:
+            self.cache.put(search_query, results, max_results, self.durations)
         return results
-    else:
-        # Handle errors from the API
-        print(f"Error: {response.status_code}, {response.text}")
-        return []
 
-# Example usage
-def find_renditions(title) -> str:
-    # Replace 'YOUR_API_KEY' with your actual YouTube Data API key
-    API_KEY = ""
+    def add_durations(self, results):
+        ids = [parse_id(video["video_url"]) for video in results]
+        params = {"part": "contentDetails", "id": ",".join(ids), "key": self.api_key}
+        data = self.get(VIDEOS_URL, params).json()
+        durations = {item["id"]: parse_duration(item["contentDetails"]["duration"]) for item in data.get("items", [])}
+        for video_id, video in zip(ids, results):
+            video["duration"] = durations.get(video_id)
+
+    def report(self):
+        if not self.latencies:
+            return "YouTube: no requests"
+        latencies = sorted(self.latencies)
+        return "YouTube: {} requests, {} retried, latency median {:.0f} ms, p95 {:.0f} ms, max {:.0f} ms".format(
+            len(latencies), self.retried, latencies[len(latencies) // 2] * 1000,
+            latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, latencies[-1] * 1000)
+
+    def close(self):
+        self.backend.close()
+
+
+def search_youtube(api_key, search_query, client=None):
+    """
+    Searches YouTube for a given query and returns the top 5 matches.
+
+    :param api_key: Your YouTube Data API key.
+    :param search_query: The search term.
+    :param client: A YouTubeClient to reuse; a throwaway one is made otherwise.
+    :return: A list of dictionaries containing video details.
+    """
+    if client:
+        return client.search(search_query)
+    client = YouTubeClient(api_key)
+    try:
+        return client.search(search_query)
+    finally:
+        client.close()
+
+def find_renditions(title, client=None) -> str:
+    return choose_rendition(search_youtube(API_KEY, title, client))
 
-    videos = search_youtube(API_KEY, title)
+def choose_rendition(videos) -> str:
+    """Ask the operator to pick one of the searched videos. Returns its id, or "" to skip the song."""
+    if not videos:
+        print("No videos found")
+        return ""
     vid_ids: list[str] = []
 
     for idx, video in enumerate(videos):
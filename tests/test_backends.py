@@ -0,0 +1,57 @@
+import pytest
+
+import rendition.youtube as youtube
+from rendition.backends import RecordingBackend, ReplayBackend, Response, stub_results
+
+ITEM = {
+    "id": {"videoId": "abc123"},
+    "snippet": {"title": "Nadopasana - Begada", "channelTitle": "Sangeetha", "publishedAt": "2020-01-01T00:00:00Z"},
+}
+
+
+class Live:
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, url, params, timeout):
+        self.calls += 1
+        return Response(200, {"items": [ITEM]})
+
+    def close(self):
+        pass
+
+
+def test_record_then_replay(tmp_path):
+    fixtures = str(tmp_path / "fixtures")
+    recorder = RecordingBackend(fixtures, Live())
+    recorded = youtube.YouTubeClient("secret", backend=recorder).search("Nadopasana  Begada")
+    assert recorder.recorded == 1
+    assert "secret" not in next((tmp_path / "fixtures").iterdir()).read_text()
+
+    replay = ReplayBackend(fixtures, stub=False)
+    assert youtube.YouTubeClient("", backend=replay).search("nadopasana begada") == recorded
+    with pytest.raises(youtube.YouTubeError, match="404"):
+        youtube.YouTubeClient("", backend=replay).search("ennallu urake")
+
+
+def test_stub_results_are_stable():
+    client = youtube.YouTubeClient("", backend=ReplayBackend())
+    videos = client.search("ennallu urake todi")
+    assert len(videos) == 5
+    assert videos == client.search("ennallu urake todi")
+    assert stub_results("a", 3) != stub_results("b", 3)
+
+
+def test_injected_latency_and_errors():
+    sleeps = []
+    backend = ReplayBackend(latency=0.2, error_rate=0.5, seed=3, sleep=sleeps.append)
+    client = youtube.YouTubeClient("", backend=backend, retries=10, sleep=lambda seconds: None)
+    for idx in range(20):
+        assert len(client.search("song {}".format(idx))) == 5
+    assert backend.failures == client.retried > 0
+    assert backend.requests == 20 + backend.failures
+    assert all(0.1 <= s <= 0.3 for s in sleeps)
+
+    client = youtube.YouTubeClient("", backend=ReplayBackend(error_rate=1, seed=1), retries=2, sleep=lambda seconds: None)
+    with pytest.raises(youtube.YouTubeError, match="3 attempts|Error"):
+        client.search("song")
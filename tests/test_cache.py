@@ -0,0 +1,51 @@
+import os
+
+import migrator.cache as cache
+import migrator.parser as wikiparser
+
+
+def test_roundtrip_and_stats(tmp_path):
+    parse_cache = cache.ParseCache(str(tmp_path), "scanner")
+    assert parse_cache.get(wikiparser.data_song) is None
+    parse_cache.put(wikiparser.data_song, wikiparser.parse_song(wikiparser.data_song, "scanner"))
+
+    song = cache.ParseCache(str(tmp_path), "scanner").get(wikiparser.data_song)
+    song.set_old_filename("Nadopasanace.txt")
+    assert song.title == "nAdOpAsanacE"
+
+    parse_cache.record(True)
+    parse_cache.record(False)
+    assert parse_cache.report().startswith("Parse cache: 1 hits, 1 misses (50% hit rate)")
+
+
+def test_grammar_change_invalidates(tmp_path, monkeypatch):
+    parse_cache = cache.ParseCache(str(tmp_path), "scanner")
+    parse_cache.put("text", "parsed")
+    assert cache.ParseCache(str(tmp_path), "scanner").get("text") == "parsed"
+
+    monkeypatch.setattr(cache, "grammar_stamp", lambda engine: "changed grammar")
+    assert cache.ParseCache(str(tmp_path), "scanner").get("text") is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    parse_cache = cache.ParseCache(str(tmp_path), "scanner")
+    for i, text in enumerate(["a", "b", "c"]):
+        parse_cache.put(text, "x" * 1000)
+        os.utime(parse_cache.entry(text), (i, i))
+    parse_cache.get("a")  # touching "a" makes "b" the oldest
+
+    size = os.path.getsize(parse_cache.entry("a"))
+    small = cache.ParseCache(str(tmp_path), "scanner", max_bytes=2 * size)
+    assert small.evicted == 1
+    assert small.get("b") is None
+    assert small.get("a") == small.get("c") == "x" * 1000
+
+
+def test_stamp_ignores_rendering(monkeypatch):
+    stamp = cache.grammar_stamp("scanner")
+    monkeypatch.setattr(wikiparser, "TEMPL_STANZA", "changed template")
+    monkeypatch.setattr(wikiparser.Stanza, "to_new", lambda self: "changed")
+    assert cache.grammar_stamp("scanner") == stamp
+
+    monkeypatch.setattr(wikiparser, "song", wikiparser.song + wikiparser.notoc)
+    assert cache.grammar_stamp("scanner") != stamp
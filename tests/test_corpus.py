@@ -0,0 +1,23 @@
+import migrator.parser as wikiparser
+from benchmarks.corpus import make_corpus
+
+
+def test_corpus_shape_and_parsing():
+    corpus = make_corpus(5, seed=2, sections=4, stanzas=2, lines=3, sups=2, glosses=3, categories=7)
+    assert corpus == make_corpus(5, seed=2, sections=4, stanzas=2, lines=3, sups=2, glosses=3, categories=7)
+    for filename, text in corpus:
+        song = wikiparser.parse_song(text, "scanner")
+        sections = song.lyrics_area.sections
+        assert [len(sec.stanza_list.stanzas) for sec in sections] == [2, 2, 2, 2]
+        assert sections[3].header == "Charanam 2"
+        stanza = sections[0].stanza_list.stanzas[0]
+        assert len(stanza.sahityam.splitlines()) == 3
+        assert stanza.words.count("((") == 3
+        assert stanza.sahityam.count("<sup>") == 2
+        assert len(song.header_area.categories) == 7
+
+        expected = wikiparser.parse_song(text, "pyparsing")
+        for parsed in (song, expected):
+            parsed.set_old_filename(filename)
+            parsed.set_date("2024-01-01")
+        assert song.to_new() == expected.to_new()
@@ -0,0 +1,22 @@
+import os
+
+from migrator.dircache import DirectoryCache
+
+
+class TextCache(DirectoryCache):
+    SUFFIX = ".txt"
+
+
+def test_write_evict_and_clear(tmp_path):
+    text_cache = TextCache(str(tmp_path), max_bytes=10)
+    for idx, name in enumerate(["a", "b", "c"]):
+        text_cache.write(os.path.join(text_cache.path, name + ".txt"), lambda f: f.write("12345"))
+        os.utime(os.path.join(text_cache.path, name + ".txt"), (idx, idx))
+    (tmp_path / "STAMP").write_text("kept")
+
+    text_cache.close()
+    assert text_cache.evicted == 1
+    assert sorted(e.name for e in text_cache.entries()) == ["b.txt", "c.txt"]
+    text_cache.clear()
+    assert os.listdir(text_cache.path) == ["STAMP"]
+    assert text_cache.hit_rate() == 0
@@ -0,0 +1,64 @@
+import bz2
+import gzip
+from xml.sax.saxutils import escape
+
+import pytest
+
+import migrator.dump as dump
+import migrator.parser as wikiparser
+
+PAGE = """  <page>
+    <title>{title}</title>
+    <ns>{ns}</ns>
+    <id>1</id>{redirect}
+{revisions}
+  </page>
+"""
+REVISION = """    <revision>
+      <id>2</id>
+      <timestamp>2024-03-01T10:00:00Z</timestamp>
+      <text xml:space="preserve">{}</text>
+    </revision>"""
+
+
+def make_dump(pages):
+    body = ""
+    for title, ns, texts, redirect in pages:
+        revisions = "\n".join(REVISION.format(escape(text)) for text in texts)
+        body += PAGE.format(title=title, ns=ns, revisions=revisions,
+                            redirect='\n    <redirect title="Elsewhere" />' if redirect else "")
+    return ('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/" version="0.10" xml:lang="en">\n'
+            "  <siteinfo><sitename>Sahityam</sitename></siteinfo>\n" + body + "</mediawiki>\n")
+
+
+DUMP = make_dump([
+    ("Nadopasanace", "0", ["old revision", wikiparser.data_song], False),
+    ("Talk:Nadopasanace", "1", ["chatter"], False),
+    ("Nadopasana", "0", ["#REDIRECT [[Nadopasanace]]"], True),
+    ("Sri Raghuvara/Notes", "0", [""], False),
+])
+
+
+@pytest.mark.parametrize("suffix, opener", [(".xml", open), (".xml.gz", gzip.open), (".xml.bz2", bz2.open)])
+def test_iter_pages(tmp_path, suffix, opener):
+    path = str(tmp_path / ("dump" + suffix))
+    with opener(path, "wt", encoding="utf-8") as f:
+        f.write(DUMP)
+
+    pages = list(dump.iter_pages(path))
+    assert pages == [("Nadopasanace", wikiparser.data_song, "2024-03-01T10:00:00Z"),
+                     ("Sri Raghuvara/Notes", "", "2024-03-01T10:00:00Z")]
+    assert [title for title, _, _ in dump.iter_pages(path, namespaces=None)] == \
+        ["Nadopasanace", "Talk:Nadopasanace", "Sri Raghuvara/Notes"]
+    assert [(song, date) for song, _, date in dump.iter_songs(path)] == \
+        [("Nadopasanace.txt", "2024-03-01"), ("Sri_Raghuvara_Notes.txt", "2024-03-01")]
+
+
+def test_parsed_song_from_dump(tmp_path):
+    path = str(tmp_path / "dump.xml")
+    with open(path, "w") as f:
+        f.write(DUMP)
+    song, text, _ = next(dump.iter_songs(path))
+    parsed_song = wikiparser.parse_song(text, "scanner")
+    parsed_song.set_old_filename(song)
+    assert parsed_song.new_file == "nadopasanace"
@@ -0,0 +1,77 @@
+import pytest
+
+import migrator.manager as manager
+from migrator.fuzzy import FuzzyFieldMap, FuzzyIndex, normalize
+
+
+def test_normalize_spelling_variants():
+    assert normalize("Begada") == normalize("Begadha") == normalize("Beg ada") == normalize("BEGADA")
+    assert normalize("Shankarabharanam") == normalize("Sankarabharanam")
+    assert normalize("Rupakam") == normalize("Rupaka")
+
+
+def test_lookup_ranks_by_trigram_overlap():
+    index = FuzzyIndex([("Rupakam", "rUpaka"), ("Kalyani", "kalyANi"), ("Yamunakalyani", "yamunAkalyANi")])
+    assert index.lookup("Rupaka")[0] == (1.0, "Rupakam", "rUpaka")
+    matches = index.lookup("Kalyaani Raga")
+    assert matches[0].value == "kalyANi"
+    assert 0.5 < matches[0].score < 1
+    assert index.lookup("") == []
+
+
+@pytest.mark.parametrize("query, value", [
+    ("Begadha", "bEgaDa"), ("Beg ada", "bEgaDa"), ("begada", "bEgaDa"), ("BEGADA", "bEgaDa"), ("Rupaka", "rUpaka"),
+])
+def test_spelling_variants_resolve_at_the_default_threshold(query, value):
+    index = FuzzyIndex([("Begada", "bEgaDa"), ("Rupakam", "rUpaka"), ("Todi", "tODi")])
+    assert index.resolve(query, 0.85).value == value
+
+
+def test_values_alike_after_normalizing_are_told_apart_by_spelling():
+    index = FuzzyIndex([("Sama", "sAma"), ("Shama", "zyAma")])
+    assert index.resolve("sama", 0.85).value == "sAma"
+    assert index.resolve("SHAMA", 0.85).value == "zyAma"
+    # Both spellings stay in the index; a tie is not resolved
+    assert {m.value for m in index.lookup("Saama")} == {"sAma", "zyAma"}
+    index.add("SAMA", "sAmam")
+    assert index.resolve("Sama", 0.85) is None
+
+
+def test_resolves_only_from_the_same_field(tmp_path):
+    (tmp_path / "corrections.csv").write_text("Kannada,kannaDa\nBegada,bEgaDa\n")
+    corrections = manager.fuzzy_corrections(manager.FieldMap("Corrections", str(tmp_path / "corrections.csv")), 0.7)
+    # Not filed under a field yet: only ever a suggestion
+    assert corrections.resolve("raga", "Begadaa") is None
+    assert corrections.suggest("raga", "Begadaa")[0].value == "bEgaDa"
+
+    assert not manager.needs_correction("raga", "Begada", corrections)
+    assert not manager.needs_correction("language", "Kannada", corrections)
+    assert corrections.resolve("raga", "Begadaa").value == "bEgaDa"
+    # A language is no correction for a raga
+    assert corrections.resolve("raga", "Kanada") is None
+    assert "kannaDa" not in [m.value for m in corrections.suggest("raga", "Kanada")]
+
+
+def test_prompt_correction_auto_resolves_and_suggests(tmp_path, monkeypatch):
+    (tmp_path / "corrections.csv").write_text("Begada,bEgaDa\n")
+    field_map = manager.FieldMap("Corrections", str(tmp_path / "corrections.csv"))
+    corrections = manager.fuzzy_corrections(field_map, threshold=0.85)
+    assert isinstance(corrections, FuzzyFieldMap)
+
+    # Not filed under raga yet: offered, not taken
+    monkeypatch.setattr("builtins.input", lambda prompt: "1")
+    manager.prompt_correction("raga", "Raga", "Begadha", corrections)
+    assert corrections.get("Begadha") == "bEgaDa"
+
+    # Filed under raga now, and map_hk's Rupakam under tala: no questions asked
+    monkeypatch.setattr("builtins.input", lambda prompt: 1 / 0)
+    manager.prompt_correction("raga", "Raga", "BEGADA", corrections)
+    manager.prompt_correction("tala", "Tala", "Rupaka", corrections)
+    assert corrections.get("BEGADA") == "bEgaDa"
+    assert corrections.get("Rupaka") == "rUpaka"
+    assert (tmp_path / "corrections.csv").read_text().splitlines() == [
+        "Begada,bEgaDa",
+        "Begadha,bEgaDa",
+        "BEGADA,bEgaDa",
+        "Rupaka,rUpaka",
+    ]
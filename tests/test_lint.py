@@ -0,0 +1,128 @@
+import argparse
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import migrator.lint as lint
+import migrator.manager as manager
+import migrator.parser as wikiparser
+from migrator.state import FAILED, StateStore
+
+from tests.test_manager import SONGS, workspace  # noqa: F401
+from tests.test_scanner import CORPUS, MALFORMED, make_song, random_song
+
+STANZA = "===Pallavi===\n<stanza>\nabc\n</stanza>\n"
+
+
+def kinds(text):
+    return [(p.line, p.kind) for p in lint.validate(text)]
+
+
+def converts(text):
+    try:
+        song = wikiparser.parse_song(text, "scanner")
+        song.set_old_filename("Nadopasanace.txt")
+        song.to_new()
+        return True
+    except Exception:
+        return False
+
+
+@pytest.mark.parametrize("name", sorted(set(CORPUS) - {"no_stanzas", "details_later"}))
+def test_valid_songs_have_no_problems(name):
+    assert lint.validate(CORPUS[name]) == []
+
+
+def test_classifies_malformed_songs():
+    assert kinds(MALFORMED["no_lyrics"]) == [(1, lint.MISSING_LYRICS)]
+    assert kinds(MALFORMED["unclosed_stanza"]) == [(4, lint.UNCLOSED_STANZA)]
+    assert kinds(MALFORMED["no_notoc"]) == [(14, lint.MISSING_NOTOC)]
+    assert kinds(MALFORMED["no_prose"]) == [(7, lint.NO_PROSE)]
+    assert kinds(MALFORMED["stray_stanza_end"]) == [(7, lint.STRAY_STANZA_END)]
+    assert kinds(MALFORMED["no_sections"]) == [(2, lint.NO_SECTIONS)]
+    assert kinds(CORPUS["no_stanzas"]) == [(3, lint.EMPTY_FIRST_SECTION)]
+
+
+def test_reports_every_problem():
+    text = make_song(STANZA + "stray\n</stanza>\n", categories="[[Category:A]]\n[[Category:B]]\n")
+    assert kinds(text) == [
+        (7, lint.STRAY_TEXT), (8, lint.STRAY_STANZA_END), (11, lint.TOO_FEW_CATEGORIES), (13, lint.MISSING_NOTOC)]
+    text = make_song(STANZA, categories="[[Category:A]]\n[[Category:a-b]]\n__NOTOC__")
+    assert kinds(text) == [(9, lint.TOO_FEW_CATEGORIES), (10, lint.BAD_CATEGORY)]
+
+
+def test_stanza_running_on_is_only_a_warning():
+    # The grammar takes the next section into the unclosed stanza
+    text = make_song("===Pallavi===\n<stanza>\nabc\n===Charanam===\n<stanza>\ndef\n</stanza>\n")
+    assert kinds(text) == [(4, lint.STANZA_RUNS_ON)]
+    assert lint.fatal(lint.validate(text)) == []
+    assert converts(text)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_fatal_problems_are_the_ones_that_fail(seed):
+    rng = random.Random(seed)
+    text = random_song(rng)
+    snippets = ["<stanza>", "</stanza>", "==Lyrics==", "===X===", "==Y==", "[[Category:Z]]", "__NOTOC__", "junk"]
+    for _ in range(rng.randint(0, 2)):
+        m = rng.choice(list(lint.re_token.finditer(text)))
+        if rng.random() < 0.5:
+            text = text[:m.start()] + text[m.end():]
+        else:
+            text = text[:m.end()] + rng.choice(snippets) + text[m.end():]
+    assert bool(lint.fatal(lint.validate(text))) != converts(text)
+
+
+def test_tabs_in_names_are_spaces():
+    text = make_song("===Pal\tlavi===\n<stanza>\nabc\n</stanza>\n").replace("[[Category:Kriti]]", "[[Category:Krit\ti]]")
+    assert "Krit\ti" in text
+    assert lint.validate(text) == []
+    assert converts(text)
+
+
+def test_lint_all_reads_ahead_only_a_window():
+    read = []
+
+    def items():
+        for i in range(10):
+            read.append(i)
+            yield ("song{}".format(i), STANZA)
+
+    with ThreadPoolExecutor(2) as pool:
+        results = lint.lint_all(pool, lint.lint_text, items(), 4)
+        assert next(results)[0] == "song0"
+        assert len(read) == 4
+        assert [name for name, _ in results] == ["song{}".format(i) for i in range(1, 10)]
+
+
+def test_unclosed_category_link_in_prose_is_text():
+    text = make_song("===Pallavi===\n<stanza>\nrAma\n-details-\nsee [[Category:foo\n</stanza>\n",
+                     prose="==Notes==\nx\n")
+    assert converts(text)
+    assert lint.validate(text) == []
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_whitespace_in_tokens_is_judged_like_the_parser(seed):
+    rng = random.Random(seed)
+    text = random_song(rng)
+    for _ in range(rng.randint(1, 3)):
+        m = rng.choice(list(lint.re_token.finditer(text)))
+        pos = rng.randint(m.start(), m.end())
+        text = text[:pos] + rng.choice([" ", "\t", "\n", "\r", " \t", "\r\n", "\x0b"]) + text[pos:]
+    assert bool(lint.fatal(lint.validate(text))) != converts(text)
+
+
+def test_migrate_records_the_kind_of_problem(workspace):  # noqa: F811
+    (workspace / "songs" / "Broken_Song.txt").write_text(MALFORMED["unclosed_stanza"])
+    store = StateStore(str(workspace / "state.db"))
+    args = argparse.Namespace(skip_drafts=False, engine="scanner", jobs=2, packrat=None, date=None, scripts=[])
+    completed = store.song_list("migrator", "completed")
+    failed = store.song_list("migrator", FAILED)
+    corrections = manager.FieldMap("Corrections", str(workspace / "corrections.csv"))
+    manager.migrate_batch(SONGS, args, completed, failed, corrections)
+
+    rows = store.songs("migrator", FAILED)
+    assert [(row[1], row[3], row[4]) for row in rows] == [("Broken_Song.txt", "unclosed-stanza", "unclosed-stanza (line 4)")]
+    assert len(completed) == 3
@@ -0,0 +1,147 @@
+import argparse
+
+import pytest
+
+import migrator.manager as manager
+import migrator.parser as wikiparser
+from migrator.cache import ParseCache
+from migrator.metrics import Metrics
+from migrator.output import OutputStats
+
+SONGS = ["Nadopasanace.txt", "Broken_Song.txt", "Another_Song.txt", "Third_Song.txt"]
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    songs = tmp_path / "songs"
+    converted = tmp_path / "converted"
+    songs.mkdir()
+    converted.mkdir()
+    for name in SONGS:
+        text = "not a song" if name.startswith("Broken") else wikiparser.data_song
+        (songs / name).write_text(text)
+    (tmp_path / "completed.txt").write_text("")
+    (tmp_path / "failed.txt").write_text("")
+    (tmp_path / "corrections.csv").write_text("Begada,bEgaDa\nAdi,Adi\nTyagaraja,tyAgarAja\nTelugu,telugu\n")
+    monkeypatch.setattr(manager, "PATH_WIKISONGS", str(songs) + "/")
+    monkeypatch.setattr(manager, "PATH_CONVERTED", str(converted))
+    monkeypatch.setattr("builtins.input", lambda prompt: "kRti" if prompt.startswith("format") else "")
+    return tmp_path
+
+
+def run(workspace, jobs):
+    args = argparse.Namespace(skip_drafts=False, engine="scanner", jobs=jobs, packrat=None, date=None, scripts=[])
+    completed = manager.SongList("Completed", str(workspace / "completed.txt"))
+    failed = manager.SongList("Failed", str(workspace / "failed.txt"))
+    corrections = manager.FieldMap("Corrections", str(workspace / "corrections.csv"))
+    if jobs > 1:
+        manager.migrate_batch(SONGS, args, completed, failed, corrections)
+    else:
+        manager.migrate(SONGS, args, completed, failed, corrections)
+    converted = workspace / "converted"
+    return {
+        "completed": (workspace / "completed.txt").read_text(),
+        "failed": (workspace / "failed.txt").read_text(),
+        "corrections": (workspace / "corrections.csv").read_text(),
+        "files": {p.name: p.read_text() for p in sorted(converted.iterdir())},
+    }
+
+
+def test_batch_matches_sequential(workspace):
+    batch = run(workspace, jobs=3)
+    for path in (workspace / "converted").iterdir():
+        path.unlink()
+    for name in ("completed.txt", "failed.txt"):
+        (workspace / name).write_text("")
+    (workspace / "corrections.csv").write_text("Begada,bEgaDa\nAdi,Adi\nTyagaraja,tyAgarAja\nTelugu,telugu\n")
+    sequential = run(workspace, jobs=1)
+
+    assert batch == sequential
+    assert batch["completed"] == "Nadopasanace.txt\nAnother_Song.txt\nThird_Song.txt\n"
+    assert batch["failed"] == "Broken_Song.txt\n"
+    assert batch["corrections"].endswith("Kriti,kRti\n")
+    assert "composition: kRti" in batch["files"]["nadopasanace.md"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_pipeline_prompts_once_per_value(workspace, monkeypatch, jobs):
+    prompts = []
+    monkeypatch.setattr("builtins.input", lambda prompt: prompts.append(prompt) or "")
+    answers = workspace / "answers.csv"
+    answers.write_text("Kriti,kRti\n")
+    args = argparse.Namespace(skip_drafts=False, engine="scanner", jobs=jobs, packrat=None, date=None, scripts=[], answers=str(answers))
+    completed = manager.SongList("Completed", str(workspace / "completed.txt"))
+    failed = manager.SongList("Failed", str(workspace / "failed.txt"))
+    corrections = manager.FieldMap("Corrections", str(workspace / "corrections.csv"))
+    manager.migrate_pipeline(SONGS, args, completed, failed, corrections)
+
+    assert prompts == []
+    assert (workspace / "completed.txt").read_text() == "Nadopasanace.txt\nAnother_Song.txt\nThird_Song.txt\n"
+    assert (workspace / "failed.txt").read_text() == "Broken_Song.txt\n"
+    page = (workspace / "converted" / "another-song.md").read_text()
+    assert "rAga: bEgaDa" in page
+    assert "composition: kRti" in page
+
+
+def test_pipeline_without_answers_asks_each_value_once(workspace, monkeypatch):
+    prompts = []
+    monkeypatch.setattr("builtins.input", lambda prompt: prompts.append(prompt) or "kRti")
+    args = argparse.Namespace(skip_drafts=False, engine="scanner", jobs=1, packrat=None, date=None, scripts=[], answers=None)
+    completed = manager.SongList("Completed", str(workspace / "completed.txt"))
+    failed = manager.SongList("Failed", str(workspace / "failed.txt"))
+    corrections = manager.FieldMap("Corrections", str(workspace / "corrections.csv"))
+    manager.migrate_pipeline(SONGS, args, completed, failed, corrections)
+
+    assert prompts == ["format [Kriti]: "]
+
+
+def test_load_song_uses_cache(workspace):
+    parse_cache = ParseCache(str(workspace / "cache"), "scanner")
+    first, hit = manager.load_song("Nadopasanace.txt", "scanner", parse_cache)
+    assert not hit
+    second, hit = manager.load_song("Nadopasanace.txt", "scanner", parse_cache)
+    assert hit
+    assert second.new_file == first.new_file == "nadopasanace"
+    assert second.to_new() == first.to_new()
+
+
+def test_dump_sources_match_files(workspace):
+    args = argparse.Namespace(skip_drafts=False, engine="scanner", jobs=2, packrat=None, date=None, scripts=[])
+    texts = [(song, (workspace / "songs" / song).read_text(), "2024-03-01") for song in SONGS]
+    for song, _, _ in texts:
+        (workspace / "songs" / song).unlink()
+    completed = manager.SongList("Completed", str(workspace / "completed.txt"))
+    failed = manager.SongList("Failed", str(workspace / "failed.txt"))
+    corrections = manager.FieldMap("Corrections", str(workspace / "corrections.csv"))
+    manager.migrate_batch(iter(texts), args, completed, failed, corrections)
+
+    assert (workspace / "completed.txt").read_text() == "Nadopasanace.txt\nAnother_Song.txt\nThird_Song.txt\n"
+    assert (workspace / "failed.txt").read_text() == "Broken_Song.txt\n"
+    assert "date: 2024-03-01" in (workspace / "converted" / "nadopasanace.md").read_text()
+
+
+def test_rerun_leaves_unchanged_files_alone(workspace):
+    args = argparse.Namespace(skip_drafts=False, engine="scanner", jobs=1, packrat=None, date="2020-01-01", scripts=[])
+    corrections = manager.FieldMap("Corrections", str(workspace / "corrections.csv"))
+    for expected in ({"written": 3, "unchanged": 0}, {"written": 0, "unchanged": 3}):
+        completed = manager.SongList("Completed", str(workspace / "completed.txt"))
+        failed = manager.SongList("Failed", str(workspace / "failed.txt"))
+        stats = OutputStats()
+        manager.migrate(SONGS, args, completed, failed, corrections, stats=stats)
+        assert {k: stats.counts[k] for k in expected} == expected
+        (workspace / "completed.txt").write_text("")
+    assert "date: 2020-01-01" in (workspace / "converted" / "nadopasanace.md").read_text()
+
+
+def test_batch_records_stage_timings(workspace):
+    args = argparse.Namespace(skip_drafts=False, engine="scanner", jobs=2, packrat=None, date=None, scripts=[])
+    completed = manager.SongList("Completed", str(workspace / "completed.txt"))
+    failed = manager.SongList("Failed", str(workspace / "failed.txt"))
+    corrections = manager.FieldMap("Corrections", str(workspace / "corrections.csv"))
+    metrics = Metrics("migrator")
+    manager.migrate_batch(SONGS, args, completed, failed, corrections, metrics=metrics)
+
+    assert metrics.counters == {"completed": 3, "failed": 1}
+    # parsing and rendering ran in the workers
+    assert metrics.histograms["parse"].summary()["count"] == 3
+    assert set(metrics.songs["Nadopasanace.txt"]) == {"parse", "correct", "render", "write"}
@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+import migrator.parser as wikiparser
+
+
+# The chained str.replace() rewrites Stanza.to_new / ProseSection.to_new used to do
+def chained_sahityam(text):
+    return wikiparser.replace_sup(text).replace("\n", "   \n")
+
+
+def chained_words(text):
+    text = wikiparser.replace_sup(text)
+    return text.replace("((", "![").replace("))", ")").replace(' "', '](means "').replace("\n", "   \n") if text else ""
+
+
+def chained_prose(text):
+    return (
+        text.replace("<sup>", "{{<sup ")
+        .replace("</sup>", ">}}")
+        .replace("**", "  * ")
+        .replace("<lipi>", "{{<lipi>}}")
+        .replace("</lipi>", "{{</lipi>}}")
+        .replace("\\t", " ")
+    )
+
+
+def corpus():
+    song = wikiparser.parse_song(wikiparser.data_song)
+    texts = [wikiparser.data_song, wikiparser.data_combined, wikiparser.data_prose_section, ""]
+    for section in song.lyrics_area.sections:
+        for stanza in section.stanza_list.stanzas:
+            texts += [stanza.sahityam, stanza.words, stanza.translation]
+    texts += ["".join(section.content) for section in song.prose_area.sections]
+    return texts
+
+
+EDGE_CASES = [
+    "(((a))) )))",
+    '((x "y")) "z" ((" ',
+    "ab-cd<sup>1</sup> <sup>2</sup>ef<sup>3</sup>gh 4<sup>5</sup>",
+    "<sup>12</sup> <sup></sup> <sup>x</sup>y",
+    "<lipi</sup> </lipi</sup> <lipi</lipi</sup> <sup</sup>",
+    "*** **** \\t\\\\t \t",
+    "nAdO\tpAsanacE<sup>1</sup>\n\n",
+]
+
+TOKENS = ["a", "Zb", "1", "<sup>", "</sup>", "<lipi>", "</lipi>", "<lipi", "((", "))", "(", ")", " ", '"', "\n", "*", "\\", "t", "-"]
+
+
+def random_texts(count=300):
+    rng = random.Random(42)
+    return ["".join(rng.choice(TOKENS) for _ in range(rng.randint(0, 40))) for _ in range(count)]
+
+
+@pytest.mark.parametrize("text", corpus() + EDGE_CASES + random_texts())
+def test_rewriters_match_chained_replace(text):
+    assert wikiparser.rewrite_sahityam(text) == chained_sahityam(text)
+    assert wikiparser.rewrite_words(text) == chained_words(text)
+    assert wikiparser.rewrite_prose(text) == chained_prose(text)
@@ -0,0 +1,54 @@
+from migrator.metrics import Histogram, Metrics, timed
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value)
+    assert histogram.cumulative() == [(0.1, 2), (1, 3), ("+Inf", 4)]
+    assert histogram.summary()["max"] == 2
+    assert histogram.quantile(0.5) == 0.5
+
+
+def test_stages_are_recorded_per_song():
+    metrics = Metrics("migrator")
+    with metrics.stage("a.txt", "parse"):
+        pass
+    metrics.observe("a.txt", "render", 0.25)
+    metrics.observe("b.txt", "render", 0.5)
+    metrics.count("completed", 2)
+
+    summary = metrics.summary()
+    assert summary["counters"] == {"completed": 2}
+    assert summary["stages"]["render"]["count"] == 2
+    assert summary["stages"]["render"]["total"] == 0.75
+    assert [s["song"] for s in summary["songs"]] == ["a.txt", "b.txt"]
+    assert set(summary["songs"][0]) == {"song", "parse", "render"}
+
+
+def test_timed_returns_seconds():
+    result, seconds = timed(sorted, [2, 1])
+    assert result == [1, 2]
+    assert seconds >= 0
+
+
+def test_prometheus_textfile(tmp_path):
+    metrics = Metrics("rendition", clock=lambda: 100.0)
+    metrics.observe("a.md", "search", 0.02)
+    metrics.count("failed")
+    metrics.add_latencies("youtube", [0.2, 0.3])
+    path = tmp_path / "sahityam.prom"
+    metrics.write_prometheus(str(path))
+
+    text = path.read_text()
+    assert 'sahityam_events_total{manager="rendition",event="failed"} 1' in text
+    assert 'sahityam_stage_seconds_bucket{manager="rendition",stage="search",le="0.01"} 0' in text
+    assert 'sahityam_stage_seconds_bucket{manager="rendition",stage="search",le="0.025"} 1' in text
+    assert 'sahityam_stage_seconds_count{manager="rendition",stage="search"} 1' in text
+    assert "# TYPE sahityam_events_total counter" in text
+    assert 'sahityam_request_seconds_count{manager="rendition",api="youtube"} 2' in text
+    assert 'stage="youtube"' not in text and 'stage="request"' not in text
+    assert metrics.summary()["requests"]["youtube"]["count"] == 2
+    assert metrics.report().splitlines()[2] == "Requests:"
+    assert 'sahityam_last_run_timestamp_seconds{manager="rendition"} 100.0' in text
+    assert [p.name for p in tmp_path.iterdir()] == ["sahityam.prom"]
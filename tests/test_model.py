@@ -0,0 +1,65 @@
+import pickle
+
+import pytest
+
+import migrator.model as model
+import migrator.parser as wikiparser
+from benchmarks.corpus import make_corpus
+
+CORPUS = make_corpus(20, seed=4, sections=4, stanzas=2) + [("Nadopasanace.txt", wikiparser.data_song)]
+
+
+@pytest.mark.parametrize("engine", wikiparser.ENGINES)
+def test_renders_like_the_parser(engine):
+    for filename, text in CORPUS:
+        song = wikiparser.parse_song(text, engine)
+        song.set_old_filename(filename)
+        song.set_date("2024-01-01")
+        compact = model.parse_song(text, engine)
+        compact.set_old_filename(filename)
+        compact.set_date("2024-01-01")
+        assert compact.title == song.title
+        assert compact.to_new() == song.to_new()
+
+
+def test_to_new_can_be_repeated():
+    song = model.parse_song(wikiparser.data_song)
+    song.set_old_filename("Nadopasanace.txt")
+    song.set_date("2024-01-01")
+    first = song.to_new()
+    assert song.to_new() == first
+    assert first.count("<!--more-->") == 1
+
+
+def test_no_instance_dicts_or_parse_results():
+    song = model.compact(wikiparser.parse_song(wikiparser.data_song, "pyparsing"))
+    prose = song.prose_area.sections[0]
+    assert type(prose.content) is tuple
+    assert all(type(p) is str for p in prose.content)
+    for obj in (song, song.header_area, song.lyrics_area, song.lyrics_area.sections[0], prose,
+                song.lyrics_area.sections[0].stanza_list.stanzas[0]):
+        assert not hasattr(obj, "__dict__")
+
+
+def test_get_line_matches_splitlines():
+    stanza = model.Stanza("one\r\ntwo\n\nfour\x1cfive", "", "")
+    lines = stanza.sahityam.splitlines()
+    assert [stanza.get_line(i) for i in range(-len(lines), len(lines))] == lines + lines
+    with pytest.raises(IndexError):
+        stanza.get_line(len(lines))
+
+
+def test_pickles_without_line_index():
+    song = model.parse_song(wikiparser.data_song)
+    song.set_old_filename("Nadopasanace.txt")
+    stanza = song.lyrics_area.sections[0].stanza_list.stanzas[0]
+    assert stanza.lines is not None
+    copy = pickle.loads(pickle.dumps(song))
+    assert copy.lyrics_area.sections[0].stanza_list.stanzas[0].lines is None
+    assert copy.title == song.title
+
+
+def test_corrections_survive_compacting():
+    song = wikiparser.parse_song(wikiparser.data_song)
+    song.header_area.raga = "bEgaDa"
+    assert model.compact(song).header_area.raga == "bEgaDa"
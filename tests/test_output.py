@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+import migrator.output as output
+from migrator.output import SKIPPED, UNCHANGED, WRITTEN, OutputStats, write_if_changed
+
+
+def test_write_if_changed(tmp_path):
+    path = str(tmp_path / "song.md")
+    assert write_if_changed(path, "first") == WRITTEN
+    os.utime(path, (0, 0))
+    assert write_if_changed(path, "first") == UNCHANGED
+    assert os.path.getmtime(path) == 0
+    assert write_if_changed(path, "second") == WRITTEN
+    with open(path) as f:
+        assert f.read() == "second"
+    assert os.listdir(str(tmp_path)) == ["song.md"]
+
+
+@pytest.mark.parametrize("old, chunks", [
+    ("abcdef", ["abc", "def"]),
+    ("abcdef", ["abc", "dEf", "ghi"]),
+    ("abcdef", ["abc"]),
+    ("abc", ["abc", "def"]),
+    ("", ["", "x"]),
+    ("tēlugu", ["tē", "lugu!"]),
+])
+def test_write_if_changed_streams_chunks(tmp_path, monkeypatch, old, chunks):
+    monkeypatch.setattr(output, "COPY_SIZE", 2)
+    path = str(tmp_path / "song.md")
+    with open(path, "w") as f:
+        f.write(old)
+    expected = UNCHANGED if "".join(chunks) == old else WRITTEN
+    assert write_if_changed(path, iter(chunks)) == expected
+    with open(path) as f:
+        assert f.read() == "".join(chunks)
+    assert os.listdir(str(tmp_path)) == ["song.md"]
+
+
+def test_failed_render_leaves_the_old_file(tmp_path):
+    path = str(tmp_path / "song.md")
+    write_if_changed(path, "old")
+
+    def chunks():
+        yield "new"
+        raise ValueError("render failed")
+    with pytest.raises(ValueError):
+        write_if_changed(path, chunks())
+    with open(path) as f:
+        assert f.read() == "old"
+    assert os.listdir(str(tmp_path)) == ["song.md"]
+
+
+def test_report():
+    stats = OutputStats()
+    for outcome in (WRITTEN, WRITTEN, UNCHANGED, SKIPPED):
+        stats.record(outcome)
+    assert stats.report() == "Output: 2 written, 1 unchanged, 1 skipped"
@@ -0,0 +1,33 @@
+import argparse
+
+import pytest
+
+import migrator.parser as wikiparser
+from migrator.profiler import GrammarProfiler, enable_packrat, packrat_size
+
+
+def test_profiler_counts_rules_and_restores_grammar():
+    profiler = GrammarProfiler(wikiparser.song, vars(wikiparser))
+    with profiler:
+        wikiparser.parse_song(wikiparser.data_song)
+        report = profiler.report_file("data_song")
+    stats = profiler.run_stats
+    assert stats["stanza"].matches == 3
+    # the fourth attempt at the end of each section's stanza_list fails
+    assert stats["stanza"].backtracks == 3
+    assert stats["lyrics_area"].calls == 1
+    assert "prose_section" in report
+    assert "(1 files)" in profiler.report_run()
+    assert not wikiparser.stanza.debug
+    assert not profiler.stack
+
+
+def test_packrat_size_must_be_positive():
+    argpar = argparse.ArgumentParser()
+    argpar.add_argument('--packrat', type=packrat_size)
+    assert argpar.parse_args(['--packrat', '128']).packrat == 128
+    for bad in ('0', '-5'):
+        with pytest.raises(SystemExit):
+            argpar.parse_args(['--packrat', bad])
+    with pytest.raises(ValueError):
+        enable_packrat(0)
@@ -0,0 +1,54 @@
+from rendition.ranking import Ranker, containment
+from rendition.youtube import parse_duration
+
+
+def video(title, channel="Someone", duration=None):
+    return {"title": title, "channel": channel, "video_url": "https://www.youtube.com/watch?v=" + title[:5],
+            "duration": duration}
+
+
+def test_containment_ignores_spelling_noise():
+    assert containment("nAdOpAsanacE", "Nadopasanace - Begada | Live") == 1.0
+    assert containment("nadopasanace", "Naadhopaasanache") == 1.0
+    assert containment("nadopasanace", "Ennallu Urake - Todi") == 0.0
+    assert containment("", "anything") == 0.0
+
+
+def test_picks_clear_winner():
+    ranker = Ranker()
+    videos = [video("Ennallu Urake - Todi"), video("Nadopasanace | Begada | Sudha"), video("Nadopasana")]
+    picked, ranked = ranker.pick("nadopasanace", "begada", videos)
+    assert picked is videos[1]
+    assert [c.video for c in ranked] == [videos[1], videos[2], videos[0]]
+
+
+def test_close_runner_up_needs_review():
+    videos = [video("Nadopasanace Begada"), video("Nadopasanace Begada (live)")]
+    picked, ranked = Ranker().pick("nadopasanace", "begada", videos)
+    assert picked is None
+    assert len(ranked) == 2
+
+
+def test_channel_lists_and_durations():
+    videos = [video("Nadopasanace Begada", "Spam"), video("Nadopasanace Begada", "Sangeetha", 400)]
+    picked, ranked = Ranker(block=["spam"]).pick("nadopasanace", "begada", videos)
+    assert picked is videos[1]
+    assert len(ranked) == 1
+
+    ranker = Ranker(allow=["Sangeetha"], max_duration=300)
+    assert ranker.score("nadopasanace", "begada", videos[1]) == 1.0 + 0.15 - 0.3
+    assert ranker.score("nadopasanace", "begada", videos[0]) == 1.0
+
+
+def test_allow_list_breaks_a_tie_of_perfect_matches():
+    videos = [video("Nadopasanace - Begada", "Random uploader"), video("Nadopasanace | Begada", "Sangeetha")]
+    picked, ranked = Ranker(allow=["Sangeetha"]).pick("nadopasanace", "begada", videos)
+    assert picked is videos[1]
+    assert [c.score for c in ranked] == [1.15, 1.0]
+
+
+def test_parse_duration():
+    assert parse_duration("PT1H4M13S") == 3853
+    assert parse_duration("PT45S") == 45
+    assert parse_duration("P1DT1S") == 86401
+    assert parse_duration("bogus") is None
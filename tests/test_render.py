@@ -0,0 +1,71 @@
+import copy
+import io
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import migrator.model as model
+import migrator.parser as wikiparser
+
+
+def parsed(engine):
+    song = wikiparser.parse_song(wikiparser.data_song, engine)
+    song.set_old_filename("Nadopasanace.txt")
+    song.set_date("2024-01-01")
+    return song
+
+
+def state(song):
+    stanzas = [s for sec in song.lyrics_area.sections for s in sec.stanza_list.stanzas]
+    return ([(s.sahityam, s.words, s.translation, list(s.appendix)) for s in stanzas],
+            song.header_area.title, song.header_area.date)
+
+
+@pytest.mark.parametrize("engine", wikiparser.ENGINES)
+def test_rendering_leaves_the_song_alone(engine):
+    song = parsed(engine)
+    before = state(song)
+    first = song.to_new()
+    assert state(song) == before
+    assert song.to_new() == first
+    assert first.count("<!--more-->") == 1
+    assert "{{<stanza>}}" in first
+
+
+def test_render_chunks_join_to_the_page():
+    song = parsed("scanner")
+    out = io.StringIO()
+    song.write_to(out)
+    assert out.getvalue() == "".join(song.render()) == song.to_new()
+    assert len(list(song.render())) > 3
+
+
+def test_renders_in_parallel():
+    song = parsed("scanner")
+    expected = song.to_new()
+    with ThreadPoolExecutor(4) as pool:
+        assert set(pool.map(lambda _: song.to_new(), range(16))) == {expected}
+
+
+def test_compact_model_renders_with_the_same_code():
+    song = parsed("scanner")
+    compact = model.compact(copy.deepcopy(song))
+    assert list(compact.render()) == list(song.render())
+
+
+def test_scripts_add_sahityam_variants():
+    song = parsed("scanner")
+    plain = song.to_new()
+    song.set_scripts(["telugu", "tamil"])
+    page = song.to_new()
+    assert page.count('{{<variant script="telugu">}}') == page.count("{{<stanza>}}") > 0
+    assert '{{<variant script="tamil">}}\nநாதோபாஸநசே ஶங்கர   \n' in page
+    assert re.sub(r'\{\{<variant script="\w+">\}\}\n.*?\{\{</variant>\}\}\n', "", page, flags=re.S) == plain
+    assert model.compact(copy.deepcopy(song)).to_new() == page
+
+
+def test_variants_leave_markup_alone():
+    sahityam = "nAda<br/>rAma [[Link|rAma]] &nbsp;{{x}}<sup>2</sup>\n"
+    assert wikiparser.render_variants(sahityam, ["telugu"]) == wikiparser.TEMPL_VARIANT.format(
+        "telugu", "నాద<br/>రామ [[Link|rAma]] &nbsp;{{x}}   \n")
@@ -0,0 +1,150 @@
+import json
+import threading
+
+import pytest
+
+import rendition.manager as manager
+import rendition.youtube as youtube
+from migrator.metrics import Metrics
+
+SONG = """---
+title: "{title}"
+rAga: bEgaDa
+---
+
+## Sahityam
+
+{title} zaGkara
+
+## Commentary
+
+Some notes.
+
+## Renditions
+"""
+
+SONGS = ["first-song.md", "broken-song.md", "second-song.md", "third-song.md"]
+
+
+class Client:
+    """Search stand-in that records which queries were started."""
+
+    def __init__(self):
+        self.started = []
+        self.lock = threading.Lock()
+
+    def search(self, query):
+        with self.lock:
+            self.started.append(query)
+        if query.startswith("third"):
+            raise youtube.NotCached(query)
+        slug = query.split()[0]
+        return [{"title": query, "channel": "c", "published_at": "", "video_url": "https://www.youtube.com/watch?v=" + slug}]
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    songs = tmp_path / "input"
+    converted = tmp_path / "output"
+    songs.mkdir()
+    converted.mkdir()
+    for name in SONGS:
+        if name.startswith("broken"):
+            text = "no sections here"
+        else:
+            text = SONG.format(title=name[:-3])
+        (songs / name).write_text(text)
+    (tmp_path / "completed.txt").write_text("")
+    (tmp_path / "failed.txt").write_text("")
+    monkeypatch.setattr(manager, "PATH_INPUT", str(songs) + "/")
+    monkeypatch.setattr(manager, "PATH_CONVERTED", str(converted))
+    return tmp_path
+
+
+@pytest.mark.parametrize("prefetch", [0, 3])
+def test_process_in_queue_order(workspace, monkeypatch, prefetch):
+    client = Client()
+    started_at_prompt = []
+
+    def answer(prompt):
+        started_at_prompt.append(len(client.started))
+        return ""
+    monkeypatch.setattr("builtins.input", answer)
+
+    completed = manager.SongList("Completed", str(workspace / "completed.txt"))
+    failed = manager.SongList("Failed", str(workspace / "failed.txt"))
+    stats = manager.OutputStats()
+    manager.process(SONGS, completed, failed, client, stats, prefetch)
+
+    assert (workspace / "completed.txt").read_text() == "first-song.md\nsecond-song.md\n"
+    assert (workspace / "failed.txt").read_text() == "broken-song.md\n"
+    assert 'youtube "second' in (workspace / "output" / "second-song.md").read_text()
+    assert stats.report() == "Output: 2 written, 0 unchanged, 1 skipped"
+    if prefetch:
+        # all three searches were on their way before the first prompt
+        assert started_at_prompt[0] == 3
+    else:
+        assert started_at_prompt == [1, 2]
+
+
+def test_interrupt_cancels_pending_searches(workspace, monkeypatch):
+    def interrupt(prompt):
+        raise KeyboardInterrupt
+    monkeypatch.setattr("builtins.input", interrupt)
+    completed = manager.SongList("Completed", str(workspace / "completed.txt"))
+    failed = manager.SongList("Failed", str(workspace / "failed.txt"))
+    with pytest.raises(KeyboardInterrupt):
+        manager.process(SONGS, completed, failed, Client(), manager.OutputStats(), prefetch=2)
+    assert (workspace / "completed.txt").read_text() == ""
+
+
+def test_auto_pick_leaves_unclear_songs_for_review(workspace, monkeypatch):
+    class Ambiguous(Client):
+        def search(self, query):
+            if query.startswith("second"):
+                return [{"title": "Second Song", "channel": "c", "published_at": "", "video_url": u}
+                        for u in ("https://www.youtube.com/watch?v=a", "https://www.youtube.com/watch?v=b")]
+            return super().search(query)
+
+    def no_prompts(prompt):
+        raise AssertionError("prompted: " + prompt)
+    monkeypatch.setattr("builtins.input", no_prompts)
+    (workspace / "review.txt").write_text("")
+    completed = manager.SongList("Completed", str(workspace / "completed.txt"))
+    failed = manager.SongList("Failed", str(workspace / "failed.txt"))
+    review = manager.SongList("Review", str(workspace / "review.txt"))
+    ranker = manager.Ranker(threshold=0.5)
+    manager.process(SONGS, completed, failed, Ambiguous(), manager.OutputStats(), ranker=ranker, review=review)
+
+    assert (workspace / "completed.txt").read_text() == "first-song.md\n"
+    assert (workspace / "review.txt").read_text() == "second-song.md\n"
+    assert 'youtube "first' in (workspace / "output" / "first-song.md").read_text()
+
+
+def test_process_records_stage_timings(workspace, monkeypatch):
+    monkeypatch.setattr("builtins.input", lambda prompt: "")
+    completed = manager.SongList("Completed", str(workspace / "completed.txt"))
+    failed = manager.SongList("Failed", str(workspace / "failed.txt"))
+    metrics = Metrics("rendition")
+    manager.process(SONGS, completed, failed, Client(), manager.OutputStats(), prefetch=2, metrics=metrics)
+
+    assert metrics.counters == {"completed": 2, "failed": 1}
+    assert set(metrics.songs["first-song.md"]) == {"parse", "search", "pick", "render", "write"}
+    assert "search" not in metrics.songs["third-song.md"]
+
+
+def test_interrupted_run_still_writes_metrics(workspace, monkeypatch):
+    def interrupt(prompt):
+        raise KeyboardInterrupt
+    monkeypatch.setattr("builtins.input", interrupt)
+    monkeypatch.setattr("sys.argv", [
+        "manager", "--song", "first-song.md", "--backend", "replay", "--search-cache", str(workspace / "searches"),
+        "--state", str(workspace / "state.db"), "--metrics", str(workspace / "metrics.json"),
+        "--prometheus", str(workspace / "metrics.prom")])
+    with pytest.raises(KeyboardInterrupt):
+        manager.main()
+
+    summary = json.loads((workspace / "metrics.json").read_text())
+    assert summary["counters"]["requests"] == 1
+    assert summary["counters"]["cache_misses"] == 1
+    assert "sahityam_events_total" in (workspace / "metrics.prom").read_text()
@@ -0,0 +1,48 @@
+import os
+
+import rendition.parser as parser
+from rendition.scan import needs_rendition, scan
+
+PAGE = """---
+title: "x"
+rAga: bEgaDa
+---
+
+## Sahityam
+
+a
+
+## Commentary
+
+{commentary}
+
+## Renditions
+{renditions}
+## Notes
+
+{notes}
+"""
+
+PAGES = {
+    "needs.md": PAGE.format(commentary="", renditions="", notes=""),
+    "has-video.md": PAGE.format(commentary="", renditions='{{<youtube "abc" >}}', notes=""),
+    "video-elsewhere.md": PAGE.format(commentary='{{<youtube "c" >}}', renditions="", notes='{{<youtube "n" >}}'),
+    "sub/dir/nested.md": PAGE.format(commentary="", renditions="", notes=""),
+    "no-renditions.md": "## Sahityam\na\n## Commentary\n",
+    "empty.md": "",
+    "notes.txt": PAGE.format(commentary="", renditions="", notes=""),
+}
+
+
+def test_scan(tmp_path):
+    for name, text in PAGES.items():
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+    assert scan(str(tmp_path), jobs=2) == [
+        os.path.join("needs.md"), os.path.join("sub", "dir", "nested.md"), "video-elsewhere.md"]
+    # Agrees with the parser on every page it can parse
+    for name in ("needs.md", "has-video.md", "video-elsewhere.md"):
+        path = str(tmp_path / name)
+        assert needs_rendition(path) == (not parser.parse(path)[0].is_valid())
@@ -0,0 +1,149 @@
+import random
+
+import pytest
+from pyparsing import ParseException
+
+import migrator.parser as wikiparser
+
+CATEGORIES = """\
+[[Category:Begada]]
+[[Category:Adi]]
+[[Category:Tyagaraja]]
+[[Category:Telugu]]
+[[Category:Kriti]]
+__NOTOC__
+"""
+
+
+def make_song(lyrics, prose="==Renditions==\n\n", categories=CATEGORIES, draft=""):
+    return "{}\n==Lyrics==\n{}{}{}".format(draft, lyrics, prose, categories)
+
+
+CORPUS = {
+    "data_song": wikiparser.data_song,
+    "draft": "{{draft}}" + wikiparser.data_song,
+    "combined": make_song("===Pallavi===\n" + wikiparser.data_combined),
+    "numbered": make_song('===Pallavi===\n<stanza num="2">\nabc\n-details-\nx\n-meaning-\ny\n</stanza>\n'),
+    "numbered_unquoted": make_song("===Pallavi===\n<stanza num=3 >\nabc\n</stanza>\n"),
+    "no_details": make_song("===Pallavi===\n<stanza>\nabc\ndef\n-meaning-\nmeans\n</stanza>\n"),
+    "no_meaning": make_song("===Pallavi===\n<stanza>\nabc\n-details-\nwords\n</stanza>\n"),
+    "sahityam_only": make_song("===Pallavi===\n<stanza>\nabc\n</stanza>\n"),
+    "empty_parts": make_song("===Pallavi===\n<stanza>\n-details-\n-meaning-\n</stanza>\n"),
+    "no_stanzas": make_song("===Pallavi===\n===Charanam===\n<stanza>\na\n</stanza>\n"),
+    # SkipTo searches the whole document, so the first stanza swallows the second
+    "details_later": make_song(
+        "===Pallavi===\n<stanza>\nabc\n</stanza>\n<stanza>\ndef\n-details-\nw\n</stanza>\n"
+    ),
+    "header_spaces": make_song("=== Pallavi 2 ===\n<stanza>\nabc\n</stanza>\n"),
+    "tabs": make_song("===Pallavi===\n<stanza>\n\tabc\tdef\n-details-\n((a\t\"b\"))\n</stanza>\n"),
+    "prose_spaced_header": make_song(
+        "===Pallavi===\n<stanza>\nabc\n</stanza>\n", "== Notes ==\n* <sup>1</sup> **x\\t\n==Renditions==\n"
+    ),
+    "category_spaces": make_song(
+        "===Pallavi===\n<stanza>\nabc\n</stanza>\n",
+        categories="[[Category: Sri Ranjani ]]\n[[Category:Adi]]\n[[Category:Tyagaraja]]\n"
+        "[[Category:Telugu]]\n[[Category:Kriti]]\n[[Category:Extra]]\n__NOTOC__\ntrailing text",
+    ),
+    "bad_category_in_prose": make_song(
+        "===Pallavi===\n<stanza>\nabc\n</stanza>\n", "==Renditions==\n[[Category:Not-valid]]\n"
+    ),
+}
+
+MALFORMED = {
+    "no_lyrics": wikiparser.data_song.replace("==Lyrics==", ""),
+    "unclosed_stanza": make_song("===Pallavi===\n<stanza>\nabc\n"),
+    "no_notoc": make_song("===Pallavi===\n<stanza>\nabc\n</stanza>\n", categories=CATEGORIES[:-10]),
+    "no_prose": make_song("===Pallavi===\n<stanza>\nabc\n</stanza>\n", prose=""),
+    "stray_stanza_end": make_song("===Pallavi===\n<stanza>\nabc\n</stanza>\n</stanza>\n"),
+    "no_sections": make_song("<stanza>\nabc\n</stanza>\n"),
+    "empty": "",
+}
+
+
+def random_song(rng):
+    def line():
+        return " ".join(rng.choice(["nAda", "zaGkara", "rAma<sup>1</sup>", '((vEda "Veda"))', "O"]) for _ in range(4))
+
+    def stanza():
+        parts = ["\n".join(line() for _ in range(rng.randint(1, 3)))]
+        if rng.random() < 0.8:
+            parts.append("-details-\n" + line())
+        if rng.random() < 0.8:
+            parts.append("-meaning-\n" + line())
+        start = rng.choice(["<stanza>", '<stanza num="{}">'.format(rng.randint(1, 9))])
+        return "{}\n{}\n</stanza>\n".format(start, "\n".join(parts))
+
+    lyrics = "".join(
+        "==={}===\n{}\n".format(name, "".join(stanza() for _ in range(rng.randint(0, 3))))
+        for name in rng.sample(["Pallavi", "Anupallavi", "Charanam", "Charanam 2"], rng.randint(1, 4))
+    )
+    prose = "".join(
+        "=={}==\n* <sup>1</sup><lipi>{}</lipi>\n".format(name, line())
+        for name in rng.sample(["Variations", "References", "Commentary"], rng.randint(0, 3))
+    )
+    return make_song(lyrics, prose + "==Renditions==\n", draft=rng.choice(["", "{{draft}}"]))
+
+
+def snapshot(song):
+    """Everything the rest of the migrator reads from a parsed Song."""
+    return {
+        "is_draft": song.is_draft,
+        "categories": song.header_area.categories,
+        "lyrics": [
+            (sec.header, [(s.sahityam, s.words, s.translation) for s in sec.stanza_list.stanzas])
+            for sec in song.lyrics_area.sections
+        ],
+        "prose": [(sec.header, "\n".join(sec.content)) for sec in song.prose_area.sections],
+    }
+
+
+def convert(song):
+    """Title and rendered page, or the exception type when the song cannot be converted."""
+    try:
+        song.set_old_filename("Nadopasanace.txt")
+        return song.title, song.to_new()
+    except IndexError as e:
+        # e.g. the first section has no stanza to take the title from
+        return type(e)
+
+
+def assert_same(text):
+    expected = wikiparser.parse_song(text, "pyparsing")
+    actual = wikiparser.parse_song(text, "scanner")
+    assert snapshot(actual) == snapshot(expected)
+    assert convert(actual) == convert(expected)
+
+
+@pytest.mark.parametrize("name", sorted(CORPUS))
+def test_scanner_matches_grammar(name):
+    assert_same(CORPUS[name])
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_scanner_matches_grammar_random(seed):
+    assert_same(random_song(random.Random(seed)))
+
+
+@pytest.mark.parametrize("name", sorted(MALFORMED))
+def test_scanner_rejects_malformed(name):
+    with pytest.raises(ParseException):
+        wikiparser.parse_song(MALFORMED[name], "pyparsing")
+    with pytest.raises(ParseException):
+        wikiparser.parse_song(MALFORMED[name], "scanner")
+
+
+def test_scanner_too_few_categories():
+    text = make_song("===Pallavi===\n<stanza>\nabc\n</stanza>\n", categories="[[Category:Begada]]\n__NOTOC__\n")
+    with pytest.raises(ValueError):
+        wikiparser.parse_song(text, "pyparsing")
+    with pytest.raises(ValueError):
+        wikiparser.parse_song(text, "scanner")
+
+
+def test_parse_and_convert_engine(tmp_path):
+    path = tmp_path / "Nadopasanace.txt"
+    path.write_text(wikiparser.data_song)
+    for engine in wikiparser.ENGINES:
+        song = wikiparser.parse_and_convert(str(path), engine)
+        assert song.new_file == "nadopasanace"
+        assert song.title == "nAdOpAsanacE"
@@ -0,0 +1,31 @@
+import os
+
+from rendition.cache import SearchCache
+
+RESULTS = [{"title": "Nadopasana", "channel": "Sangeetha", "published_at": "2020", "video_url": "u"}]
+
+
+def test_normalized_roundtrip_and_ttl(tmp_path):
+    now = [1000.0]
+    search_cache = SearchCache(str(tmp_path), ttl=60, clock=lambda: now[0])
+    assert search_cache.get("nadopasanace begada") is None
+    search_cache.put("nadopasanace begada", RESULTS)
+    assert search_cache.get("  Nadopasanace   BEGADA ") == RESULTS
+    assert search_cache.get("nadopasanace begada", max_results=10) is None
+
+    now[0] += 61
+    assert SearchCache(str(tmp_path), ttl=60, clock=lambda: now[0]).get("nadopasanace begada") is None
+    assert search_cache.report().startswith("Search cache: 1 hits, 2 misses (0 expired")
+
+
+def test_evicts_least_recently_used(tmp_path):
+    search_cache = SearchCache(str(tmp_path), clock=lambda: 1000.0)
+    for idx, query in enumerate(["a", "b", "c"]):
+        search_cache.put(query, RESULTS)
+        os.utime(search_cache.entry(query, 5), (idx, idx))
+    size = os.path.getsize(search_cache.entry("a", 5))
+
+    search_cache = SearchCache(str(tmp_path), max_bytes=2 * size, clock=lambda: 1000.0)
+    assert search_cache.evicted == 1
+    assert search_cache.get("a") is None
+    assert search_cache.get("c") == RESULTS
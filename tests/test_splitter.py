@@ -0,0 +1,88 @@
+import random
+
+import pytest
+from pyparsing import ParseException
+
+import rendition.parser as parser
+
+HEAD = """---
+title: "nAdOpAsanacE"
+rAga: bEgaDa
+tALa: Adi
+---
+
+"""
+
+CORPUS = {
+    "basic": HEAD + "## Sahityam\n\nnAdOpAsanacE\n\n## Commentary\n\nNotes.\n\n## Renditions\n\n## Notes\n\nTail.\n",
+    "with_video": HEAD + '## Sahityam\nabc\n## Variations\nx\n## Renditions\n{{<youtube "abc" >}}\n',
+    "variations_and_commentary": HEAD + "## Sahityam\na\n## Commentary\nc\n## Variations\nv\n## Renditions\nr",
+    "renditions_to_end": HEAD + "## Sahityam\na\n## Commentary\n## Renditions\n\n  r1\n\n",
+    "triple_hash": HEAD + "## Sahityam\na\n## Commentary\n## Renditions\nr\n### Sub heading\nrest",
+    "hash_then_newline": HEAD + "## Sahityam\na\n## Commentary\n## Renditions\nr ##\nNext\n",
+    "hash_then_symbol": HEAD + "## Sahityam\na\n## Commentary\n## Renditions\nr ##- not a header\n## Real\n",
+    "tabs": HEAD.replace("rAga:", "rAga:\t") + "## Sahityam\n\ta\tb\n## Commentary\n\t## Renditions\n\tr\n",
+    "leading_space": "  \n" + HEAD + "## Sahityam\na\n## Commentary\n## Renditions\n",
+    "text_before_header": HEAD + "intro: text\n## Sahityam\na\n## Commentary\n## Renditions\n",
+    "empty_sahityam": HEAD + "## Sahityam## Commentary## Renditions",
+    "renditions_before_sahityam": "## Renditions\nold\n" + HEAD + "## Sahityam\na\n## Commentary\n## Renditions\nnew\n",
+}
+
+MALFORMED = {
+    "no_sahityam": HEAD + "## Commentary\n## Renditions\n",
+    "no_commentary": HEAD + "## Sahityam\na\n## Renditions\n",
+    "no_renditions": HEAD + "## Sahityam\na\n## Commentary\n",
+    "renditions_only_early": HEAD + "## Sahityam\n## Renditions\n## Commentary\n",
+    "empty": "",
+}
+
+
+def random_page(rng):
+    pieces = ["## Sahityam", "## Variations", "## Commentary", "## Renditions", "## Notes", "###", "##", "# x",
+              "rAga: tODi", "text", "\t", " ", "\n", "\n\n", '{{<youtube "id" >}}', "##\t7"]
+
+    def noise():
+        return "".join(rng.choice(pieces) for _ in range(rng.randint(0, 6)))
+
+    # Mostly the headers a page needs, in order, with noise around them
+    headers = ["## Sahityam", rng.choice(["## Variations", "## Commentary"]), "## Renditions"]
+    if rng.random() < 0.2:
+        headers = rng.sample(headers, len(headers))
+    return HEAD + noise() + "".join(header + noise() for header in headers)
+
+
+def snapshot(text, engine):
+    """What the rendition manager reads from a page, or the exception type."""
+    try:
+        song = parser.parse_song(text, engine)
+    except ParseException as e:
+        return type(e)
+    return song.raga(), song.is_valid(), song.to_new(), song.head, song.sahityam, song.middle, song.renditions
+
+
+def assert_same(text):
+    assert snapshot(text, "splitter") == snapshot(text, "pyparsing")
+
+
+@pytest.mark.parametrize("name", sorted(CORPUS))
+def test_splitter_matches_grammar(name):
+    assert_same(CORPUS[name])
+    assert not isinstance(snapshot(CORPUS[name], "splitter"), type)
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_splitter_matches_grammar_random(seed):
+    assert_same(random_page(random.Random(seed)))
+
+
+@pytest.mark.parametrize("name", sorted(MALFORMED))
+def test_splitter_rejects_malformed(name):
+    assert snapshot(MALFORMED[name], "splitter") is ParseException
+    assert snapshot(MALFORMED[name], "pyparsing") is ParseException
+
+
+def test_set_renditions():
+    song = parser.parse_song(CORPUS["basic"])
+    song.set_renditions('{{<youtube "abc" >}}\n')
+    assert song.is_valid()
+    assert '## Renditions\n{{<youtube "abc" >}}\n' in song.to_new()
@@ -0,0 +1,75 @@
+from migrator.state import COMPLETED, FAILED, StateStore
+
+
+def test_song_lists_and_queries(tmp_path):
+    source = tmp_path / "song.txt"
+    source.write_text("lyrics")
+    store = StateStore(str(tmp_path / "state.db"))
+    completed = store.song_list("migrator", COMPLETED)
+    failed = store.song_list("migrator", FAILED)
+
+    failed.append("a.txt", error_type="ParseException", error="Expected '=='")
+    failed.append("b.txt", error_type="ValueError", error="Too few categories")
+    completed.append("c.txt", source=str(source), output_path="/out/c.md")
+    assert "a.txt" in failed
+    assert "c.txt" in completed
+    assert len(failed) == 2
+
+    # a later success replaces the failure
+    completed.append("a.txt", source=str(source))
+    assert "a.txt" not in failed
+    assert [row[1] for row in store.songs("migrator", FAILED, "ParseException")] == []
+    assert [row[1] for row in store.songs("migrator", FAILED, "ValueError")] == ["b.txt"]
+    assert store.songs("migrator", COMPLETED)[0][5] is not None  # source hash
+    completed.append("d.txt", source_hash="abc123")
+    assert store.songs("migrator", COMPLETED)[-1][5] == "abc123"
+    assert store.songs("rendition") == []
+
+
+def test_batched_commits_and_resume(tmp_path):
+    path = str(tmp_path / "state.db")
+    store = StateStore(path, batch_size=2)
+    other = StateStore(path)
+    other.conn.execute("PRAGMA busy_timeout = 0")
+    completed = store.song_list("rendition", COMPLETED)
+
+    completed.append("a.md")
+    assert "a.md" in completed
+    assert "a.md" not in other.song_list("rendition", COMPLETED)
+    # Nothing is held open between batches to lock out another process
+    other.song_list("migrator", FAILED).append("b.txt")
+    other.commit()
+    completed.append("c.md")
+    assert "a.md" in other.song_list("rendition", COMPLETED)
+    completed.append("d.md")
+    store.close()
+
+    resumed = StateStore(path).song_list("rendition", COMPLETED)
+    assert len(resumed) == 3
+
+
+def test_old_results_are_written_without_a_full_batch(tmp_path, monkeypatch):
+    path = str(tmp_path / "state.db")
+    store = StateStore(path, max_age=5)
+    clock = [100.0]
+    monkeypatch.setattr("migrator.state.time.monotonic", lambda: clock[0])
+    store.set_status("migrator", "a.txt", COMPLETED)
+    clock[0] += 6
+    store.set_status("migrator", "b.txt", COMPLETED)
+    assert len(StateStore(path).song_list("migrator", COMPLETED)) == 2
+
+
+def test_corrections_and_import(tmp_path):
+    (tmp_path / "corrections.csv").write_text("Begada,bEgaDa\nbad row\n")
+    (tmp_path / "completed.txt").write_text("a.txt\nb.txt\n")
+    store = StateStore(str(tmp_path / "state.db"))
+    store.import_corrections(str(tmp_path / "corrections.csv"))
+    store.import_song_list("migrator", COMPLETED, str(tmp_path / "completed.txt"))
+
+    corrections = store.field_map()
+    assert corrections.get("Begada") == "bEgaDa"
+    corrections.append("Begada", "ignored")
+    corrections.append("Adi", "Adi")
+    assert corrections.get("Begada") == "bEgaDa"
+    assert "Adi" in corrections
+    assert len(store.song_list("migrator", COMPLETED)) == 2
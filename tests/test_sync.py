@@ -0,0 +1,74 @@
+import argparse
+import os
+
+import migrator.manager as manager
+import migrator.parser as wikiparser
+from migrator.state import COMPLETED, FAILED, REMOVED, STALE, StateStore
+from migrator.sync import Sync
+
+from tests.test_manager import workspace  # noqa: F401
+
+
+def sync_run(root, store):
+    args = argparse.Namespace(skip_drafts=False, engine="scanner", jobs=1, packrat=None, date=None, scripts=[])
+    sync = Sync(store, manager.PATH_WIKISONGS)
+    queue = sync.filter(map(manager.as_source, manager.wiki_songs()))
+    manager.migrate(queue, args, store.song_list("migrator", COMPLETED), store.song_list("migrator", FAILED),
+                    manager.FieldMap("Corrections", str(root / "corrections.csv")))
+    sync.finish()
+    return sync
+
+
+def test_sync_migrates_only_changes(workspace):  # noqa: F811
+    store = StateStore(str(workspace / "state.db"))
+    first = sync_run(workspace, store)
+    assert first.report() == "Sync: 4 added, 0 changed, 0 retried, 0 unchanged, 0 removed"
+
+    songs = workspace / "songs"
+    (songs / "Another_Song.txt").write_text(wikiparser.data_song.replace("Begada", "Todi"))
+    stat = os.stat(str(songs / "Third_Song.txt"))
+    os.utime(str(songs / "Third_Song.txt"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    (songs / "Nadopasanace.txt").unlink()
+    with open(str(workspace / "corrections.csv"), "a") as f:
+        f.write("Todi,tODi\n")
+
+    second = sync_run(workspace, store)
+    # Broken_Song failed the first time, so it is tried again
+    assert second.added == []
+    assert second.retried == ["Broken_Song.txt"]
+    assert second.changed == ["Another_Song.txt"]
+    assert second.removed == ["Nadopasanace.txt"]
+    assert second.report().startswith("Sync: 0 added, 1 changed, 1 retried, 1 unchanged, 1 removed")
+    assert "rAga: tODi" in (workspace / "converted" / "another-song.md").read_text()
+    assert store.source_state("migrator", "Nadopasanace.txt")[0] == REMOVED
+    assert store.source_state("migrator", "Another_Song.txt")[0] == COMPLETED
+
+    # The touched file had its new mtime recorded, so now nothing is even read
+    third = sync_run(workspace, store)
+    assert third.report() == "Sync: 0 added, 0 changed, 1 retried, 2 unchanged, 0 removed\nRetried: Broken_Song.txt"
+    store.close()
+
+
+def test_dump_sources_compare_text(workspace):  # noqa: F811
+    store = StateStore(str(workspace / "state.db"))
+    store.set_status("migrator", "A.txt", COMPLETED, source_hash=manager.text_hash("old"))
+    sync = Sync(store, manager.PATH_WIKISONGS)
+    queue = list(sync.filter([("A.txt", "new", None), ("B.txt", "b", None)]))
+    assert [song for song, _, _ in queue] == ["A.txt", "B.txt"]
+    assert (sync.added, sync.changed) == (["B.txt"], ["A.txt"])
+    assert "A.txt" not in store.song_list("migrator", COMPLETED)
+    store.close()
+
+
+def test_stale_song_gone_from_the_source_is_removed(workspace):  # noqa: F811
+    store = StateStore(str(workspace / "state.db"))
+    store.set_status("migrator", "A.txt", COMPLETED, source_hash=manager.text_hash("old"))
+    sync = Sync(store, manager.PATH_WIKISONGS)
+    list(sync.filter([("A.txt", "new", None)]))
+    assert store.source_state("migrator", "A.txt")[0] == STALE
+
+    sync = Sync(store, manager.PATH_WIKISONGS)
+    list(sync.filter([]))
+    assert sync.finish() == ["A.txt"]
+    assert store.source_state("migrator", "A.txt")[0] == REMOVED
+    store.close()
@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+
+import migrator.manager as manager
+import migrator.parser as wikiparser
+from migrator.state import COMPLETED, StateStore
+from migrator.taxonomy import TaxonomyIndex, completed_sources
+
+from tests.test_manager import SONGS, workspace  # noqa: F401
+
+
+def song(title, raga="Begada", composer="Tyagaraja"):
+    parsed = wikiparser.parse_song(wikiparser.data_song, "scanner")
+    parsed.title = title
+    parsed.header_area.raga = raga
+    parsed.header_area.composer = composer
+    return parsed
+
+
+def load(directory, name):
+    with open(os.path.join(directory, name)) as f:
+        return json.load(f)
+
+
+def test_add_update_and_remove(tmp_path):
+    index = TaxonomyIndex(str(tmp_path))
+    index.add("a", song("A"), "A.txt")
+    index.add("b", song("B", raga="Todi"), "B.txt")
+    index.add("c", song("C"), "C.txt")
+    index.save()
+    assert load(tmp_path, "rAga.json")["Begada"] == {
+        "count": 2, "songs": [{"page": "a", "title": "A"}, {"page": "c", "title": "C"}]}
+    assert load(tmp_path, "counts.json")["rAga"] == {"Begada": 2, "Todi": 1}
+    assert load(tmp_path, "counts.json")["songs"] == 3
+
+    # Reopened from songs.json alone: a song changes raga, another moves page, one goes
+    index = TaxonomyIndex(str(tmp_path))
+    index.add("a", song("A", raga="Todi"), "A.txt")
+    index.add("b2", song("B", raga="Todi"), "B.txt")
+    assert index.remove(source="C.txt")
+    assert not index.remove(page="missing")
+    index.save()
+    assert load(tmp_path, "rAga.json") == {"Todi": {"count": 2, "songs": [
+        {"page": "a", "title": "A"}, {"page": "b2", "title": "B"}]}}
+    assert sorted(load(tmp_path, "songs.json")) == ["a", "b2"]
+    assert load(tmp_path, "composer.json")["Tyagaraja"]["count"] == 2
+
+
+def test_save_only_touches_changed_taxonomies(tmp_path):
+    index = TaxonomyIndex(str(tmp_path))
+    index.add("a", song("A"), "A.txt")
+    assert index.save() == 7
+    for name in os.listdir(str(tmp_path)):
+        os.utime(str(tmp_path / name), (0, 0))
+
+    index = TaxonomyIndex(str(tmp_path))
+    assert index.save() == 0
+    index.add("a", song("A"), "A.txt")
+    assert index.dirty == set()
+    index.add("a", song("A", raga="Todi"), "A.txt")
+    assert index.save() == 3
+    changed = sorted(n for n in os.listdir(str(tmp_path)) if os.path.getmtime(str(tmp_path / n)) != 0)
+    assert changed == ["counts.json", "rAga.json", "songs.json"]
+
+
+def test_rebuild_from_the_pages_on_the_site(tmp_path):
+    content = tmp_path / "content"
+    content.mkdir()
+    for page, title in (("nadopasanace", "nAdOpAsanacE"), ("renamed", "Other: song")):
+        parsed = song(title)
+        parsed.header_area.raga = "bEgaDa"
+        (content / (page + ".md")).write_text(parsed.header_area.front_matter(title, "2024-01-01") + "lyrics\n")
+    (content / "_index.md").write_text("---\ntitle: Songs\n---\n")
+    (content / "notes.md").write_text("no front matter\n")
+
+    store = StateStore(str(tmp_path / "state.db"))
+    store.set_status("migrator", "Nadopasanace.txt", COMPLETED, output_path=str(content / "nadopasanace.md"))
+    store.set_status("migrator", "Other_Song.txt", COMPLETED, output_path=str(content / "renamed.md"))
+    assert completed_sources(songs=["Nadopasanace.txt"]) == {"nadopasanace": "Nadopasanace.txt"}
+
+    index = TaxonomyIndex(str(tmp_path / "data"))
+    assert index.new
+    assert index.rebuild(str(content), completed_sources(store)) == ["notes"]
+    index.save()
+    assert load(tmp_path / "data", "rAga.json")["bEgaDa"]["count"] == 2
+    assert load(tmp_path / "data", "songs.json")["renamed"]["title"] == "Other: song"
+    assert TaxonomyIndex(str(tmp_path / "data")).remove(source="Other_Song.txt")
+
+
+def test_migrate_indexes_completed_songs(workspace):  # noqa: F811
+    args = argparse.Namespace(skip_drafts=False, engine="scanner", jobs=1, packrat=None, date=None, scripts=[])
+    completed = manager.SongList("Completed", str(workspace / "completed.txt"))
+    failed = manager.SongList("Failed", str(workspace / "failed.txt"))
+    corrections = manager.FieldMap("Corrections", str(workspace / "corrections.csv"))
+    index = TaxonomyIndex(str(workspace / "data"))
+    manager.migrate(SONGS, args, completed, failed, corrections, taxonomy=index)
+    index.save()
+
+    songs = load(workspace / "data", "songs.json")
+    assert sorted(songs) == ["another-song", "nadopasanace", "third-song"]
+    assert songs["nadopasanace"]["rAga"] == "bEgaDa"
+    assert songs["nadopasanace"]["source"] == "Nadopasanace.txt"
+    assert load(workspace / "data", "composition.json")["kRti"]["count"] == 3
@@ -0,0 +1,78 @@
+import pytest
+
+import migrator.manager as manager
+import migrator.parser as wikiparser
+from migrator.translit import (
+    SCHEMES, SCRIPTS, Trie, detect, normalize, re_sup_marker, transliterate, transliterate_lyrics, transliterator)
+
+LINE = "nAdOpAsanacE zaGkara nArAyaNa vidhulu velasiri O manasA"
+
+
+def test_trie_matches_the_longest_key():
+    regex = Trie(["a", "ab", "abc", "b"]).compile()
+    assert [m.group() for m in regex.finditer("abcabxba")] == ["abc", "ab", "x", "b", "a"]
+    assert [m.group() for m in regex.finditer("xyz ab")] == ["xyz ", "ab"]
+
+
+@pytest.mark.parametrize("target, expected", [
+    ("iast", "nādōpāsanacē śaṅkara nārāyaṇa vidhulu velasiri ō manasā"),
+    ("devanagari", "नादोपासनचे शङ्कर नारायण विधुलु वॆलसिरि ओ मनसा"),
+    ("telugu", "నాదోపాసనచే శఙ్కర నారాయణ విధులు వెలసిరి ఓ మనసా"),
+    ("tamil", "நாதோபாஸநசே ஶங்கர நாராயண விதுலு வெலஸிரி ஓ மநஸா"),
+])
+def test_from_hk(target, expected):
+    assert transliterate(LINE, "hk", target) == expected
+
+
+@pytest.mark.parametrize("scheme", ["iast", "devanagari", "telugu"])
+def test_round_trip(scheme):
+    song = wikiparser.parse_song(wikiparser.data_song, "scanner")
+    sahityam = "".join(s.sahityam for sec in song.lyrics_area.sections for s in sec.stanza_list.stanzas)
+    text = re_sup_marker.sub("", sahityam).replace("w", "v")
+    assert transliterate(transliterate(text, "hk", scheme), scheme, "hk") == text
+
+
+def test_lyrics_markup_is_not_transliterated():
+    text = "rAma<sup>1</sup> [[Category:rAga]] {{lipi}} &amp; sItA"
+    assert transliterate_lyrics(text, "telugu") == "రామ<sup>1</sup> [[Category:rAga]] {{lipi}} &amp; సీతా"
+
+
+def test_clusters_marks_and_other_text():
+    assert transliterate("kRSNa saMgIta duHkha tyAgarAja", "hk", "telugu") == "కృష్ణ సంగీత దుఃఖ త్యాగరాజ"
+    assert transliterate("rAm, 12 (sItA)", "hk", "devanagari") == "राम्, 12 (सीता)"
+    assert transliterate("क्षमा", "devanagari", "telugu") == "క్షమా"
+    # Tamil has one letter for k, kh, g and gh
+    assert transliterate("gAna", "hk", "tamil") == "காந"
+    assert transliterate("கான", "tamil", "hk") == "kAna"
+
+
+def test_repeated_words_convert_the_same():
+    convert = transliterator("hk", "devanagari")
+    first = convert(LINE + "\n" + LINE)
+    assert convert(LINE + "\n" + LINE) == first
+    assert first == "\n".join([convert.convert(LINE)] * 2)
+
+
+def test_detect_and_normalize():
+    assert [detect(text) for text in ("kRti", "Kṛti", "कृति", "కృతి", "கிருதி")] == [
+        "hk", "iast", "devanagari", "telugu", "tamil"]
+    assert normalize("Tyāgarāja") == normalize("త్యాగరాజ") == normalize("त्यागराज") == "tyAgarAja"
+    assert normalize("Begada") == "Begada"
+
+
+def test_every_script_writes_every_letter():
+    for name in SCRIPTS:
+        scheme = SCHEMES[name]
+        assert len(scheme.vowels) == len(scheme.signs) == 16 and len(scheme.consonants) == 34, name
+
+
+def test_corrections_are_normalized(tmp_path):
+    song = wikiparser.parse_song(wikiparser.data_song, "scanner")
+    (tmp_path / "corrections.csv").write_text("")
+    corrections = manager.FieldMap("Corrections", str(tmp_path / "corrections.csv"))
+    for value, corrected in (("Begada", "bēgaḍa"), ("Adi", "Adi"), ("Tyagaraja", "త్యాగరాజ"),
+                             ("Telugu", "telugu"), ("Kriti", "kRti")):
+        corrections.append(value, corrected)
+    manager.apply_corrections(song, corrections)
+    header = song.header_area
+    assert (header.raga, header.composer, header.format) == ("bEgaDa", "tyAgarAja", "kRti")
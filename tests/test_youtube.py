@@ -0,0 +1,98 @@
+import pytest
+import requests
+
+import rendition.youtube as youtube
+from rendition.backends import Response
+from rendition.cache import SearchCache
+
+ITEM = {
+    "id": {"videoId": "abc123"},
+    "snippet": {"title": "Nadopasana - Begada", "channelTitle": "Sangeetha", "publishedAt": "2020-01-01T00:00:00Z"},
+}
+
+
+class Session:
+    """Backend handing out canned responses (or raises canned exceptions) in order."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def get(self, url, params, timeout):
+        self.calls.append((url, params, timeout))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def close(self):
+        pass
+
+
+def make_client(session, retries=4):
+    sleeps = []
+    client = youtube.YouTubeClient("key", retries=retries, backend=session, sleep=sleeps.append)
+    return client, sleeps
+
+
+def test_search_reuses_session():
+    session = Session(Response(200, {"items": [ITEM]}), Response(200, {"items": []}))
+    client, sleeps = make_client(session)
+    assert client.search("nadopasana begada")[0]["video_url"] == "https://www.youtube.com/watch?v=abc123"
+    assert youtube.search_youtube("key", "ennallu", client) == []
+    assert [params["q"] for _, params, _ in session.calls] == ["nadopasana begada", "ennallu"]
+    assert session.calls[0][2] == (3.05, 10)
+    assert sleeps == []
+    assert client.report().startswith("YouTube: 2 requests, 0 retried")
+
+
+def test_retries_honour_retry_after():
+    session = Session(Response(429, headers={"Retry-After": "7"}), requests.Timeout("slow"),
+                      Response(503), Response(200, {"items": [ITEM]}))
+    client, sleeps = make_client(session)
+    assert len(client.search("nadopasana")) == 1
+    assert sleeps[0] == 7
+    assert 0 <= sleeps[1] <= client.backoff * 2
+    assert 0 <= sleeps[2] <= client.backoff * 4
+    assert client.retried == 3
+    assert len(client.latencies) == 4
+
+    # A Retry-After of an hour is still only waited max_backoff
+    client, sleeps = make_client(Session(Response(429, headers={"Retry-After": "3600"}), Response(200, {"items": []})))
+    client.search("nadopasana")
+    assert sleeps == [client.max_backoff]
+
+
+def test_gives_up():
+    client, sleeps = make_client(Session(Response(500), Response(500)), retries=1)
+    with pytest.raises(youtube.YouTubeError, match="500"):
+        client.search("nadopasana")
+    assert len(sleeps) == 1
+
+    client, sleeps = make_client(Session(Response(403, {"error": "quota"})))
+    with pytest.raises(youtube.YouTubeError, match="403"):
+        client.search("nadopasana")
+    assert sleeps == []
+
+
+def test_cached_and_offline_searches(tmp_path):
+    search_cache = SearchCache(str(tmp_path))
+    session = Session(Response(200, {"items": [ITEM]}))
+    client = youtube.YouTubeClient("key", backend=session, cache=search_cache)
+    first = client.search("nadopasana begada")
+    assert client.search("Nadopasana  Begada") == first
+    assert len(session.calls) == 1
+
+    offline = youtube.YouTubeClient("key", backend=Session(), cache=search_cache, offline=True)
+    assert offline.search("nadopasana begada") == first
+    with pytest.raises(youtube.NotCached):
+        offline.search("ennallu urake")
+
+    # Results cached without durations are not reused when durations are wanted
+    videos = {"items": [{"id": "abc123", "contentDetails": {"duration": "PT5M2S"}}]}
+    session = Session(Response(200, {"items": [ITEM]}), Response(200, videos))
+    timed = youtube.YouTubeClient("key", backend=session, cache=search_cache, durations=True)
+    assert timed.search("nadopasana begada")[0]["duration"] == 302
+    assert timed.search("nadopasana begada")[0]["duration"] == 302
+    assert len(session.calls) == 2
+    assert client.search("nadopasana begada") == first